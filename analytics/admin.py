@@ -2,7 +2,7 @@
 from django.contrib import admin
 
 # Импортируем модель ProductivityStats из текущего приложения analytics
-from .models import ProductivityStats
+from .models import ProductivityStats, WeeklyStats, MonthlyStats
 
 
 # Создаем класс для настройки отображения статистики продуктивности в админке
@@ -67,4 +67,20 @@ class ProductivityStatsAdmin(admin.ModelAdmin):
 
 # Регистрируем модель ProductivityStats с настройками ProductivityStatsAdmin
 # Теперь статистика продуктивности будет отображаться в админке с защитой от изменений
-admin.site.register(ProductivityStats, ProductivityStatsAdmin)
\ No newline at end of file
+admin.site.register(ProductivityStats, ProductivityStatsAdmin)
+
+# Недельные и месячные сводки - только просмотр: их строит analytics/rollups.py
+class RollupStatsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'period_start', 'total_pomodoros_completed', 'total_tasks_completed', 'active_days')
+    list_filter = ('period_start',)
+    search_fields = ('user__username',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+admin.site.register(WeeklyStats, RollupStatsAdmin)
+admin.site.register(MonthlyStats, RollupStatsAdmin)
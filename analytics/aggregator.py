@@ -0,0 +1,195 @@
+# analytics/aggregator.py
+"""
+Инкрементальное обновление дневной статистики (ProductivityStats).
+
+Каждое событие (завершение сессии, завершение задачи) меняет строку
+пользователя за его день одним UPDATE с приращениями F('поле') + delta -
+без чтения строки в Python и без пересчета истории. Если строки за этот
+день еще нет, она создается сразу с приращениями; одновременное создание
+той же строки другим запросом (уникальность user + date) превращается
+в обычный UPDATE.
+
+Время по квадрантам лежит в JSON (ключ - номер квадранта 1-4, значение -
+секунды). Его приращение тоже выполняется внутри UPDATE функциями JSON
+самой СУБД (json_set в SQLite, jsonb_set в PostgreSQL); для остальных
+СУБД строка блокируется и JSON меняется в Python.
+
+Оценки focus_score / productivity_score здесь не считаются - только счетчики
+(оценки пересчитываются пакетно, см. analytics/scoring.py).
+"""
+from collections import Counter, defaultdict
+
+from django.db import IntegrityError, NotSupportedError, connections, transaction
+from django.db.models import F, Func, JSONField
+from django.db.models.functions import Now
+
+from pomodoro.models import user_tzinfo
+from tasks.quadrants import get_quadrant
+from .dashboard import invalidate_dashboard
+from .models import ProductivityStats
+
+# Номер квадранта "Важно, не срочно" - время в нем дублируется в quadrant_2_time
+QUADRANT_2 = 2
+# Статусы рабочей сессии, которые считаются прерыванием
+INTERRUPTED_STATUSES = ('interrupted', 'cancelled', 'abandoned')
+
+
+class JSONIncrement(Func):
+    """Выражение UPDATE: значение по ключу key в JSON-поле field увеличивается на delta"""
+    output_field = JSONField()
+
+    def __init__(self, expression, key, delta):
+        super().__init__(expression)
+        self.key, self.delta = str(key), int(delta)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        raise NotSupportedError('Приращение JSON в UPDATE не поддерживается этой СУБД')
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        column, params = compiler.compile(self.source_expressions[0])
+        path = f'$."{self.key}"'
+        return (
+            f"json_set(COALESCE({column}, '{{}}'), %s, COALESCE(json_extract({column}, %s), 0) + %s)",
+            (*params, path, *params, path, self.delta),
+        )
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        column, params = compiler.compile(self.source_expressions[0])
+        return (
+            f"jsonb_set(COALESCE({column}, '{{}}'::jsonb), %s::text[], "
+            f"to_jsonb(COALESCE(({column} ->> %s)::bigint, 0) + %s))",
+            (*params, [self.key], *params, self.key, self.delta),
+        )
+
+
+def _supports_json_increment(using):
+    return connections[using].vendor in ('sqlite', 'postgresql')
+
+
+def apply_deltas(user_id, day, counters=None, quadrant_seconds=None, using='default'):
+    """
+    Прибавляет к строке статистики пользователя за день day счетчики counters
+    ({поле: приращение}) и секунды по квадрантам quadrant_seconds ({номер: секунды}).
+    Строка создается, если ее еще нет.
+    """
+    counters = {field: delta for field, delta in (counters or {}).items() if delta}
+    quadrant_seconds = {str(key): seconds for key, seconds in (quadrant_seconds or {}).items() if seconds}
+    if not counters and not quadrant_seconds:
+        return
+    # Ответы панели аналитики пользователя устаревают вместе со строкой статистики
+    invalidate_dashboard([user_id])
+
+    stats = ProductivityStats.objects.using(using).filter(user_id=user_id, date=day)
+    # UPDATE не вызывает auto_now - время изменения (для пересчета сводок) ставим сами
+    updates = {field: F(field) + delta for field, delta in counters.items()}
+    updates['updated_at'] = Now()
+
+    with transaction.atomic(using=using):
+        if quadrant_seconds and not _supports_json_increment(using):
+            return _apply_locked(stats, user_id, day, counters, quadrant_seconds, using)
+
+        if quadrant_seconds:
+            expression = F('time_spent_per_quadrant')
+            for key, seconds in quadrant_seconds.items():
+                expression = JSONIncrement(expression, key, seconds)
+            updates['time_spent_per_quadrant'] = expression
+
+        if stats.update(**updates):
+            return
+        try:
+            # Точка сохранения: при гонке за создание строки откатывается только вставка
+            with transaction.atomic(using=using):
+                ProductivityStats.objects.using(using).create(
+                    user_id=user_id, date=day, time_spent_per_quadrant=quadrant_seconds, **counters
+                )
+                return
+        except IntegrityError:
+            pass
+        stats.update(**updates)
+
+
+def _apply_locked(stats, user_id, day, counters, quadrant_seconds, using):
+    """Запасной путь для СУБД без функций JSON в UPDATE: блокировка строки и изменение в Python"""
+    row = stats.select_for_update().first()
+    if row is None:
+        try:
+            with transaction.atomic(using=using):
+                ProductivityStats.objects.using(using).create(
+                    user_id=user_id, date=day, time_spent_per_quadrant=quadrant_seconds, **counters
+                )
+                return
+        except IntegrityError:
+            row = stats.select_for_update().get()
+
+    spent = dict(row.time_spent_per_quadrant or {})
+    for key, seconds in quadrant_seconds.items():
+        spent[key] = spent.get(key, 0) + seconds
+    stats.update(time_spent_per_quadrant=spent, updated_at=Now(),
+                 **{field: F(field) + delta for field, delta in counters.items()})
+
+
+def _quadrant_number(quadrant_id):
+    quadrant = get_quadrant(quadrant_id) if quadrant_id else None
+    return quadrant.priority_order if quadrant else None
+
+
+def session_deltas(session_type, status, duration_seconds, quadrant_id):
+    """Приращения статистики от одной завершенной сессии: (счетчики, секунды по квадрантам)"""
+    if session_type != 'work':
+        return {}, {}
+
+    counters = Counter()
+    quadrant_seconds = Counter()
+    if status == 'completed':
+        counters['total_pomodoros_completed'] += 1
+    elif status in INTERRUPTED_STATUSES:
+        counters['interruptions_count'] += 1
+
+    # Время работы учитывается и у прерванных сессий - оно все равно потрачено
+    number = _quadrant_number(quadrant_id)
+    if number and duration_seconds:
+        quadrant_seconds[number] += duration_seconds
+        if number == QUADRANT_2:
+            counters['quadrant_2_time'] += duration_seconds
+    return counters, quadrant_seconds
+
+
+def record_session(user_id, day, session_type, status, duration_seconds, quadrant_id):
+    """Учитывает в статистике дня day одну завершенную сессию"""
+    counters, quadrant_seconds = session_deltas(session_type, status, duration_seconds, quadrant_id)
+    apply_deltas(user_id, day, counters, quadrant_seconds)
+
+
+def record_sessions(user_id, sessions):
+    """
+    Учитывает пакет завершенных сессий пользователя: по одному UPDATE на день.
+    sessions - кортежи (день, тип, статус, длительность, id квадранта).
+    """
+    by_day = defaultdict(lambda: (Counter(), Counter()))
+    for day, session_type, status, duration_seconds, quadrant_id in sessions:
+        counters, quadrant_seconds = session_deltas(session_type, status, duration_seconds, quadrant_id)
+        by_day[day][0].update(counters)
+        by_day[day][1].update(quadrant_seconds)
+
+    for day, (counters, quadrant_seconds) in by_day.items():
+        apply_deltas(user_id, day, counters, quadrant_seconds)
+
+
+def task_deltas(completed_at, due_date, estimated_pomodoros, tzinfo):
+    """
+    Приращения статистики от завершенной задачи: (день, счетчики). День - дата
+    завершения в часовом поясе пользователя; в срок - задача без срока или
+    завершенная не позже срока.
+    """
+    return completed_at.astimezone(tzinfo).date(), {
+        'total_tasks_completed': 1,
+        'completed_on_time_tasks': int(due_date is None or completed_at <= due_date),
+        'planned_pomodoros': estimated_pomodoros,
+    }
+
+
+def record_task_completed(task):
+    """Учитывает завершение задачи в статистике дня завершения"""
+    day, counters = task_deltas(task.completed_at, task.due_date, task.estimated_pomodoros,
+                                user_tzinfo(task.user_id))
+    apply_deltas(task.user_id, day, counters)
@@ -0,0 +1,161 @@
+# analytics/dashboard.py
+"""
+Данные панели аналитики: ряды по дням, неделям и месяцам.
+
+Ряды читаются только из готовых агрегатов - дневной статистики
+(ProductivityStats) и недельных/месячных сводок (analytics/rollups.py);
+сырые сессии на пути запроса не читаются, и в базу запрос не пишет.
+Периоды, измененные после отметки сводок, досчитываются из дневных
+строк в памяти (read_rollups); сами сводки обновляет фоновая задача.
+
+Ответы кэшируются по пользователю, гранулярности и диапазону. Ключ
+содержит токен пользователя: когда меняется его статистика (новая сессия,
+завершенная задача, пересчет), токен удаляется, и все его ответы
+перестают находиться в кэше - как токены колонок в tasks/fragments.py.
+"""
+import uuid
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .rollups import (
+    add_totals, daily_totals, empty_totals, read_rollups, week_start, week_end, month_start, month_end,
+)
+
+DASHBOARD_CACHE_TIMEOUT = 60 * 60
+# Меняется вместе с форматом ответа
+DASHBOARD_VERSION = 1
+# Наибольший диапазон одного запроса
+MAX_RANGE_DAYS = 3 * 366
+# Диапазон по умолчанию (заканчивается сегодня)
+DEFAULT_RANGE_DAYS = {'day': 30, 'week': 7 * 12, 'month': 365}
+# Номера квадрантов в ответе (ключи time_spent_per_quadrant)
+QUADRANT_KEYS = ('1', '2', '3', '4')
+
+# Выравнивание диапазона по целым периодам: (начало периода дня, конец периода по его началу)
+PERIOD_BOUNDS = {
+    'day': (lambda day: day, lambda start: start),
+    'week': (week_start, week_end),
+    'month': (month_start, month_end),
+}
+
+
+def _token_key(user_id):
+    return f'analytics:token:{user_id}'
+
+
+def _response_key(user_id, token, granularity, start, end):
+    return f'analytics:series:v{DASHBOARD_VERSION}:{user_id}:{token}:{granularity}:{start}:{end}'
+
+
+def _user_token(user_id):
+    key = _token_key(user_id)
+    token = cache.get(key)
+    if token is None:
+        token = uuid.uuid4().hex
+        if not cache.add(key, token, None):
+            token = cache.get(key, token)
+    return token
+
+
+def invalidate_dashboard(user_ids):
+    """
+    Сбрасывает кэш ответов панели пользователей. Сбрасываем сразу и после
+    коммита: запрос, прочитавший статистику до коммита, мог успеть
+    сохранить ответ со старыми данными.
+    """
+    keys = [_token_key(user_id) for user_id in user_ids]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def parse_range(granularity, start, end, today):
+    """
+    Проверяет параметры запроса и выравнивает диапазон по целым периодам.
+    start / end - строки YYYY-MM-DD или None (по умолчанию - DEFAULT_RANGE_DAYS
+    до сегодня). Возвращает (start, end); при ошибке - ValueError с текстом.
+    """
+    if granularity not in PERIOD_BOUNDS:
+        raise ValueError('Неизвестная гранулярность: ожидается day, week или month')
+    try:
+        end = date.fromisoformat(end) if end else today
+        start = date.fromisoformat(start) if start else end - timedelta(days=DEFAULT_RANGE_DAYS[granularity] - 1)
+    except ValueError:
+        raise ValueError('Неверная дата: ожидается YYYY-MM-DD')
+    if start > end:
+        raise ValueError('Начало диапазона позже конца')
+
+    start_of, end_of = PERIOD_BOUNDS[granularity]
+    start, end = start_of(start), end_of(start_of(end))
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise ValueError(f'Диапазон больше {MAX_RANGE_DAYS} дней')
+    return start, end
+
+
+def _period_starts(granularity, start, end):
+    _, end_of = PERIOD_BOUNDS[granularity]
+    period = start
+    while period <= end:
+        yield period
+        period = end_of(period) + timedelta(days=1)
+
+
+def _ratio(numerator, denominator):
+    return round(numerator / denominator, 4) if denominator else None
+
+
+def _point(totals):
+    """Показатели одного периода (или всего диапазона) по суммам totals"""
+    spent = totals['time_spent_per_quadrant']
+    quadrant_seconds = {key: spent.get(key, 0) for key in QUADRANT_KEYS}
+    quadrant_total = sum(quadrant_seconds.values())
+    return {
+        'pomodoros': totals['total_pomodoros_completed'],
+        'tasks': totals['total_tasks_completed'],
+        'on_time_tasks': totals['completed_on_time_tasks'],
+        'planned_pomodoros': totals['planned_pomodoros'],
+        'interruptions': totals['interruptions_count'],
+        'active_days': totals['active_days'],
+        'quadrant_seconds': quadrant_seconds,
+        'quadrant_share': {key: _ratio(seconds, quadrant_total) for key, seconds in quadrant_seconds.items()},
+        'quadrant_2_share': _ratio(quadrant_seconds['2'], quadrant_total),
+        'on_time_ratio': _ratio(totals['completed_on_time_tasks'], totals['total_tasks_completed']),
+    }
+
+
+def _period_totals(user_id, granularity, start, end):
+    """Суммы агрегатов за периоды диапазона: {начало периода: totals}"""
+    if granularity == 'day':
+        return daily_totals(user_id, PERIOD_BOUNDS['day'][0], start, end)
+    return read_rollups(user_id, granularity, start, end)
+
+
+def build_series(user_id, granularity, start, end):
+    """Ряд показателей за каждый период [start, end] (периоды без активности - нулевые) и итоги"""
+    periods = _period_totals(user_id, granularity, start, end)
+    series, overall = [], empty_totals()
+    for period in _period_starts(granularity, start, end):
+        totals = periods.get(period)
+        if totals is None:
+            totals = empty_totals()
+        else:
+            add_totals(overall, totals, totals['active_days'])
+        series.append({'period_start': period.isoformat(), **_point(totals)})
+    return {
+        'granularity': granularity,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'series': series,
+        'totals': _point(overall),
+    }
+
+
+def dashboard_series(user_id, granularity, start, end):
+    """build_series через кэш ответов пользователя"""
+    key = _response_key(user_id, _user_token(user_id), granularity, start, end)
+    data = cache.get(key)
+    if data is None:
+        data = build_series(user_id, granularity, start, end)
+        cache.set(key, data, DASHBOARD_CACHE_TIMEOUT)
+    return data
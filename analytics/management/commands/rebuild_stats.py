@@ -0,0 +1,44 @@
+# analytics/management/commands/rebuild_stats.py
+import json
+import os
+
+from django.core.management.base import BaseCommand
+
+from analytics.rebuild import rebuild_stats, REBUILD_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает дневную статистику продуктивности из истории сессий и задач (параллельно)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=REBUILD_CHUNK_SIZE,
+                            help='Сколько пользователей пересчитывать одной группой')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Число процессов (по умолчанию - по числу ядер, 0 - без процессов)')
+        parser.add_argument('--checkpoint',
+                            help='Файл контрольной точки: с нее пересчет продолжается после прерывания')
+        parser.add_argument('--restart', action='store_true',
+                            help='Начать заново, не глядя на контрольную точку')
+
+    def handle(self, *args, **options):
+        checkpoint = options['checkpoint']
+        start_after = 0
+        if checkpoint and not options['restart'] and os.path.exists(checkpoint):
+            with open(checkpoint, encoding='utf-8') as stream:
+                start_after = json.load(stream)['last_user_id']
+            self.stdout.write(f'Продолжаем после пользователя {start_after}')
+
+        def on_progress(report):
+            if checkpoint:
+                with open(checkpoint, 'w', encoding='utf-8') as stream:
+                    json.dump({'last_user_id': report['checkpoint']}, stream)
+            self.stdout.write(
+                f"Пользователей: {report['users']}/{report['total_users']}, "
+                f"сессий: {report['sessions']} ({report['sessions_per_second']:.0f} в секунду)"
+            )
+
+        report = rebuild_stats(start_after, options['chunk_size'], options['workers'], on_progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"Статистика пересчитана: пользователей {report['users']}, сессий {report['sessions']} "
+            f"за {report['elapsed']:.1f} с"
+        ))
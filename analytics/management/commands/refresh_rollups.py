@@ -0,0 +1,23 @@
+# analytics/management/commands/refresh_rollups.py
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.rollups import refresh_rollups
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает недельные и месячные сводки за периоды, измененные после прошлого обновления'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Обновить сводки только этого пользователя (имя пользователя)')
+
+    def handle(self, *args, **options):
+        user_id = None
+        if options['user']:
+            try:
+                user_id = User.objects.get(username=options['user']).id
+            except User.DoesNotExist:
+                raise CommandError(f"Пользователь {options['user']} не найден")
+
+        refreshed = refresh_rollups(user_id)
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано периодов: {refreshed}'))
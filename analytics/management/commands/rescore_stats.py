@@ -0,0 +1,42 @@
+# analytics/management/commands/rescore_stats.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from analytics.rebuild import REBUILD_CHUNK_SIZE
+from analytics.scoring import rescore_stats, numpy_available
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает оценки фокуса и продуктивности в дневной статистике (для ночного запуска)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Пересчитать только последние N дней (по умолчанию - всю историю)')
+        parser.add_argument('--chunk-size', type=int, default=REBUILD_CHUNK_SIZE,
+                            help='Сколько пользователей обрабатывать одной группой')
+        parser.add_argument('--python', action='store_true',
+                            help='Считать на чистом Python, даже если установлен numpy')
+        parser.add_argument('--verify', action='store_true',
+                            help='Сверять расчет numpy с расчетом на чистом Python')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['days'] is not None:
+            since = timezone.localdate() - timedelta(days=options['days'])
+        use_numpy = numpy_available() and not options['python']
+        if options['verify'] and not use_numpy:
+            self.stdout.write(self.style.WARNING('numpy не используется - сверять не с чем'))
+
+        def on_progress(report):
+            self.stdout.write(f"Пользователей: {report['users']}, строк: {report['rows']}, "
+                              f"изменено: {report['updated']}")
+
+        report = rescore_stats(since, options['chunk_size'], use_numpy, options['verify'], on_progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"Оценки пересчитаны ({report['engine']}): строк {report['rows']}, изменено {report['updated']} "
+            f"за {report['elapsed']:.1f} с"
+        ))
+        if options['verify'] and use_numpy:
+            self.stdout.write(f"Наибольшее расхождение с расчетом на Python: {report['max_difference']}")
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productivitystats',
+            name='date',
+            field=models.DateField(verbose_name='Дата статистики'),
+        ),
+    ]
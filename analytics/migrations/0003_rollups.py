@@ -0,0 +1,94 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_stats_explicit_date'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateField(verbose_name='Начало периода')),
+                ('total_pomodoros_completed', models.PositiveIntegerField(default=0, verbose_name='Всего завершено Pomodoro')),
+                ('total_tasks_completed', models.PositiveIntegerField(default=0, verbose_name='Всего завершено задач')),
+                ('time_spent_per_quadrant', models.JSONField(default=dict, verbose_name='Время по квадрантам (JSON)')),
+                ('quadrant_2_time', models.PositiveIntegerField(default=0, verbose_name='Время для Квадранта 2 (сек)')),
+                ('planned_pomodoros', models.PositiveIntegerField(default=0, verbose_name='Запланировано Pomodoro')),
+                ('completed_on_time_tasks', models.PositiveIntegerField(default=0, verbose_name='Задачи выполненные в срок')),
+                ('interruptions_count', models.PositiveIntegerField(default=0, verbose_name='Количество прерываний')),
+                ('active_days', models.PositiveIntegerField(default=0, verbose_name='Дней с активностью')),
+            ],
+            options={
+                'verbose_name': 'Статистика за месяц',
+                'verbose_name_plural': 'Статистика за месяцы',
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False, verbose_name='Название')),
+                ('value', models.DateTimeField(verbose_name='Учтено до')),
+            ],
+            options={
+                'verbose_name': 'Отметка обновления сводок',
+                'verbose_name_plural': 'Отметки обновления сводок',
+            },
+        ),
+        migrations.CreateModel(
+            name='WeeklyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateField(verbose_name='Начало периода')),
+                ('total_pomodoros_completed', models.PositiveIntegerField(default=0, verbose_name='Всего завершено Pomodoro')),
+                ('total_tasks_completed', models.PositiveIntegerField(default=0, verbose_name='Всего завершено задач')),
+                ('time_spent_per_quadrant', models.JSONField(default=dict, verbose_name='Время по квадрантам (JSON)')),
+                ('quadrant_2_time', models.PositiveIntegerField(default=0, verbose_name='Время для Квадранта 2 (сек)')),
+                ('planned_pomodoros', models.PositiveIntegerField(default=0, verbose_name='Запланировано Pomodoro')),
+                ('completed_on_time_tasks', models.PositiveIntegerField(default=0, verbose_name='Задачи выполненные в срок')),
+                ('interruptions_count', models.PositiveIntegerField(default=0, verbose_name='Количество прерываний')),
+                ('active_days', models.PositiveIntegerField(default=0, verbose_name='Дней с активностью')),
+            ],
+            options={
+                'verbose_name': 'Статистика за неделю',
+                'verbose_name_plural': 'Статистика за недели',
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='productivitystats',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Обновлено'),
+        ),
+        migrations.AddIndex(
+            model_name='productivitystats',
+            index=models.Index(fields=['updated_at'], name='stats_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='monthlystats',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AddField(
+            model_name='weeklystats',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='monthlystats',
+            unique_together={('user', 'period_start')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='weeklystats',
+            unique_together={('user', 'period_start')},
+        ),
+    ]
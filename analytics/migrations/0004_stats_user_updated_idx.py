@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productivitystats',
+            index=models.Index(fields=['user', 'updated_at'], name='stats_user_updated_idx'),
+        ),
+    ]
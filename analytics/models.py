@@ -13,9 +13,9 @@ class ProductivityStats(models.Model):
     # on_delete=models.CASCADE - если пользователь удален, его статистика тоже удаляется
     user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Пользователь")
 
-    # Дата статистики (обычно текущая дата)
-    # auto_now_add=True - автоматически устанавливает текущую дату при создании объекта
-    date = models.DateField(auto_now_add=True, verbose_name="Дата статистики")
+    # Дата статистики - день в часовом поясе пользователя, к которому относятся события
+    # (задается явно: событие могло произойти не "сегодня", см. analytics/aggregator.py)
+    date = models.DateField(verbose_name="Дата статистики")
 
     # Общее количество завершенных Pomodoro сессий за день
     # default=0 - по умолчанию 0 завершенных сессий
@@ -52,6 +52,10 @@ class ProductivityStats(models.Model):
     # Количество прерываний во время работы
     interruptions_count = models.PositiveIntegerField(default=0, verbose_name="Количество прерываний")
 
+    # Время последнего изменения строки - по нему находятся недели и месяцы,
+    # которые нужно пересчитать в сводках (analytics/rollups.py)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
+
     # Класс Meta для дополнительных настроек модели
     class Meta:
         # Название модели в единственном числе для отображения в админке
@@ -64,7 +68,74 @@ class ProductivityStats(models.Model):
         # unique_together - гарантирует, что комбинация полей уникальна
         unique_together = ['user', 'date']
 
+        indexes = [
+            # Поиск строк, измененных после последнего обновления сводок
+            models.Index(fields=['updated_at'], name='stats_updated_idx'),
+            # То же для одного пользователя (обновление и чтение его сводок)
+            models.Index(fields=['user', 'updated_at'], name='stats_user_updated_idx'),
+        ]
+
     # Метод для строкового представления объекта
     def __str__(self):
         # Возвращаем строку с именем пользователя и датой статистики
-        return f"Статистика {self.user.username} за {self.date}"
\ No newline at end of file
+        return f"Статистика {self.user.username} за {self.date}"
+
+
+class RollupStats(models.Model):
+    """
+    Общие поля сводок за период (неделю или месяц) - суммы дневных строк
+    ProductivityStats. Сводки только читаются и пересчитываются целиком
+    по периоду (analytics/rollups.py).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Пользователь")
+    # Первый день периода: понедельник недели (ISO) или первое число месяца
+    period_start = models.DateField(verbose_name="Начало периода")
+    total_pomodoros_completed = models.PositiveIntegerField(default=0, verbose_name="Всего завершено Pomodoro")
+    total_tasks_completed = models.PositiveIntegerField(default=0, verbose_name="Всего завершено задач")
+    time_spent_per_quadrant = models.JSONField(default=dict, verbose_name="Время по квадрантам (JSON)")
+    quadrant_2_time = models.PositiveIntegerField(default=0, verbose_name="Время для Квадранта 2 (сек)")
+    planned_pomodoros = models.PositiveIntegerField(default=0, verbose_name="Запланировано Pomodoro")
+    completed_on_time_tasks = models.PositiveIntegerField(default=0, verbose_name="Задачи выполненные в срок")
+    interruptions_count = models.PositiveIntegerField(default=0, verbose_name="Количество прерываний")
+    # Сколько дней с активностью вошло в период
+    active_days = models.PositiveIntegerField(default=0, verbose_name="Дней с активностью")
+
+    class Meta:
+        abstract = True
+        unique_together = ['user', 'period_start']
+
+    def __str__(self):
+        return f"Статистика {self.user_id} с {self.period_start}"
+
+
+class WeeklyStats(RollupStats):
+    """Сводка за ISO-неделю (с понедельника по воскресенье)"""
+
+    class Meta(RollupStats.Meta):
+        verbose_name = "Статистика за неделю"
+        verbose_name_plural = "Статистика за недели"
+
+
+class MonthlyStats(RollupStats):
+    """Сводка за календарный месяц"""
+
+    class Meta(RollupStats.Meta):
+        verbose_name = "Статистика за месяц"
+        verbose_name_plural = "Статистика за месяцы"
+
+
+class RollupWatermark(models.Model):
+    """
+    Отметка обновления сводок: дневные строки, измененные до value, уже учтены
+    в недельных и месячных сводках. Общая отметка и отметки отдельных
+    пользователей различаются именем (см. analytics/rollups.py).
+    """
+    name = models.CharField(max_length=50, primary_key=True, verbose_name="Название")
+    value = models.DateTimeField(verbose_name="Учтено до")
+
+    class Meta:
+        verbose_name = "Отметка обновления сводок"
+        verbose_name_plural = "Отметки обновления сводок"
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
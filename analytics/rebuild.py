@@ -0,0 +1,190 @@
+# analytics/rebuild.py
+"""
+Полный пересчет дневной статистики (ProductivityStats) из истории.
+
+Нужен для первичного заполнения и для починки после ошибок: инкрементальный
+агрегатор (analytics/aggregator.py) учитывает только новые события.
+
+Пользователи делятся на группы по возрастанию id; каждая группа
+пересчитывается отдельно - в процессе из ProcessPoolExecutor или прямо
+в текущем процессе (workers=0). Сессии и задачи группы (рабочие таблицы
+и архив) читаются потоком через iterator(), строки статистики собираются
+в памяти только для этой группы и пишутся одним
+bulk_create(update_conflicts=True) - вставка или замена счетчиков по
+(user, date). Строки за дни, в которых событий больше нет, удаляются.
+Оценки (focus_score, productivity_score) пересчет не трогает - их считает
+analytics/scoring.py (команда rescore_stats).
+
+Прогресс сообщается после каждой группы. Контрольная точка - наибольший
+id пользователя, до которого все группы уже пересчитаны: с нее можно
+продолжить прерванный пересчет.
+
+Пересчет не блокирует живые обновления: события пользователя, пришедшие
+во время пересчета его группы, могут быть учтены дважды или потеряны,
+поэтому запускать его лучше в период обслуживания.
+"""
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+import django
+from django.contrib.auth.models import User
+from django.db import connections, transaction
+
+from pomodoro.models import (
+    PomodoroSession, ArchivedPomodoroSession, session_duration, session_local_date, users_tzinfo,
+)
+from tasks.models import Task, ArchivedTask
+from .aggregator import session_deltas, task_deltas
+from .dashboard import invalidate_dashboard
+from .models import ProductivityStats
+from .rollups import invalidate_user_rollups
+
+REBUILD_CHUNK_SIZE = 200
+REBUILD_ITERATOR_CHUNK = 5000
+REBUILD_WRITE_BATCH = 500
+
+# Поля, которые пересчет заменяет целиком
+COUNTER_FIELDS = (
+    'total_pomodoros_completed', 'total_tasks_completed', 'quadrant_2_time',
+    'planned_pomodoros', 'completed_on_time_tasks', 'interruptions_count',
+)
+SESSION_COLUMNS = ('user_id', 'local_date', 'start_time', 'end_time', 'session_type', 'status',
+                   'duration_seconds', 'task__quadrant_id')
+TASK_COLUMNS = ('user_id', 'completed_at', 'due_date', 'estimated_pomodoros')
+
+
+def compute_stats(user_ids):
+    """
+    Считает дневную статистику пользователей user_ids по всей истории.
+    Возвращает ({(user_id, день): (счетчики, секунды по квадрантам)}, число сессий).
+    """
+    time_zones = users_tzinfo(user_ids)
+    days = defaultdict(lambda: (Counter(), Counter()))
+    session_count = 0
+
+    for model in (PomodoroSession, ArchivedPomodoroSession):
+        rows = (model.objects.filter(user_id__in=user_ids, end_time__isnull=False)
+                .values_list(*SESSION_COLUMNS).iterator(chunk_size=REBUILD_ITERATOR_CHUNK))
+        for user_id, day, start_time, end_time, session_type, status, duration, quadrant_id in rows:
+            session_count += 1
+            day = day or session_local_date(start_time, time_zones[user_id])
+            # Как в агрегаторе: время брошенной сессии неизвестно и не учитывается
+            if status == 'abandoned':
+                duration = None
+            elif duration is None:
+                duration = session_duration(start_time, end_time)
+            counters, quadrant_seconds = session_deltas(session_type, status, duration, quadrant_id)
+            days[user_id, day][0].update(counters)
+            days[user_id, day][1].update(quadrant_seconds)
+
+    for model in (Task, ArchivedTask):
+        rows = (model.objects.filter(user_id__in=user_ids, status='completed', completed_at__isnull=False)
+                .values_list(*TASK_COLUMNS).iterator(chunk_size=REBUILD_ITERATOR_CHUNK))
+        for user_id, completed_at, due_date, estimated_pomodoros in rows:
+            day, counters = task_deltas(completed_at, due_date, estimated_pomodoros, time_zones[user_id])
+            days[user_id, day][0].update(counters)
+
+    return days, session_count
+
+
+def write_stats(user_ids, days):
+    """Записывает пересчитанные строки группы и удаляет строки за дни без событий"""
+    rows = [
+        ProductivityStats(
+            user_id=user_id,
+            date=day,
+            time_spent_per_quadrant={str(key): seconds for key, seconds in quadrant_seconds.items()},
+            **{field: counters.get(field, 0) for field in COUNTER_FIELDS},
+        )
+        for (user_id, day), (counters, quadrant_seconds) in days.items()
+    ]
+
+    with transaction.atomic():
+        ProductivityStats.objects.bulk_create(
+            rows,
+            batch_size=REBUILD_WRITE_BATCH,
+            update_conflicts=True,
+            unique_fields=['user', 'date'],
+            update_fields=[*COUNTER_FIELDS, 'time_spent_per_quadrant', 'updated_at'],
+        )
+        stale = [
+            stats_id for stats_id, user_id, day in
+            ProductivityStats.objects.filter(user_id__in=user_ids).values_list('id', 'user_id', 'date')
+            if (user_id, day) not in days
+        ]
+        ProductivityStats.objects.filter(id__in=stale).delete()
+        # Сводки группы строятся заново при следующем обновлении (строки выше - измененные)
+        invalidate_user_rollups(user_ids)
+        invalidate_dashboard(user_ids)
+
+
+def rebuild_chunk(user_ids):
+    """Пересчет одной группы пользователей (выполняется в процессе-исполнителе). Возвращает число сессий"""
+    try:
+        days, session_count = compute_stats(user_ids)
+        write_stats(user_ids, days)
+        return session_count
+    finally:
+        connections.close_all()
+
+
+def user_chunks(start_after=0, chunk_size=REBUILD_CHUNK_SIZE):
+    """Группы id пользователей по возрастанию, начиная после start_after"""
+    ids = (User.objects.filter(id__gt=start_after).order_by('id')
+           .values_list('id', flat=True).iterator(chunk_size=REBUILD_ITERATOR_CHUNK))
+    chunk = []
+    for user_id in ids:
+        chunk.append(user_id)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def rebuild_stats(start_after=0, chunk_size=REBUILD_CHUNK_SIZE, workers=None, on_progress=None):
+    """
+    Пересчитывает статистику всех пользователей с id больше start_after.
+    workers - число процессов (None - по числу ядер, 0 - в текущем процессе).
+    on_progress(report) вызывается после каждой группы; report содержит
+    users, sessions, elapsed, sessions_per_second и checkpoint.
+    Возвращает итоговый report.
+    """
+    chunks = list(user_chunks(start_after, chunk_size))
+    report = {'users': 0, 'sessions': 0, 'elapsed': 0.0, 'sessions_per_second': 0.0,
+              'checkpoint': start_after, 'total_users': sum(len(chunk) for chunk in chunks)}
+    started = time.monotonic()
+    done, next_index = set(), 0
+
+    def chunk_done(index, session_count):
+        nonlocal next_index
+        done.add(index)
+        # Контрольная точка сдвигается только по непрерывно завершенным группам
+        while next_index in done:
+            report['checkpoint'] = chunks[next_index][-1]
+            next_index += 1
+        report['users'] += len(chunks[index])
+        report['sessions'] += session_count
+        report['elapsed'] = time.monotonic() - started
+        report['sessions_per_second'] = report['sessions'] / report['elapsed'] if report['elapsed'] else 0.0
+        if on_progress:
+            on_progress(dict(report))
+
+    if workers == 0:
+        for index, chunk in enumerate(chunks):
+            days, session_count = compute_stats(chunk)
+            write_stats(chunk, days)
+            chunk_done(index, session_count)
+        return report
+
+    # Дочерние процессы запускаются "с чистого листа" (spawn) и сами настраивают Django -
+    # открытые соединения с базой не наследуются
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'),
+                             initializer=django.setup) as executor:
+        futures = {executor.submit(rebuild_chunk, chunk): index for index, chunk in enumerate(chunks)}
+        for future in as_completed(futures):
+            chunk_done(futures[future], future.result())
+    return report
@@ -0,0 +1,277 @@
+# analytics/rollups.py
+"""
+Недельные и месячные сводки дневной статистики.
+
+Сводка за период (WeeklyStats, MonthlyStats) - сумма дневных строк
+ProductivityStats этого периода. Сводки пересчитываются не целиком, а только
+за "грязные" периоды: те, в которых есть дневные строки, измененные после
+отметки RollupWatermark (поле updated_at). Каждый грязный период
+пересчитывается полностью из своих дневных строк, поэтому повторный пересчет
+ничего не портит. Отметка ставится с запасом ROLLUP_LAG назад - строки
+транзакций, которые фиксировались во время обновления, попадут в следующее.
+
+Отметки две: общая (обновление всех пользователей, индекс stats_updated_idx)
+и отметка пользователя (обновление одного пользователя, индекс
+stats_user_updated_idx). Для пользователя действует более поздняя из них,
+поэтому повторное обновление одного пользователя пересчитывает только
+периоды, измененные после прошлого.
+
+Общее обновление запускается командой refresh_rollups по расписанию,
+отдельно от процессов сервера (например, cron: */5 * * * * python
+manage.py refresh_rollups). Чтение (read_rollups) в базу не пишет: периоды,
+измененные после отметки, оно досчитывает из дневных строк в памяти.
+
+range_totals отвечает на запрос за произвольный диапазон дат точно и
+минимальным числом строк: целые месяцы берутся из месячных сводок, целые
+ISO-недели - из недельных, оставшиеся края - из дневных строк.
+"""
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import ProductivityStats, WeeklyStats, MonthlyStats, RollupWatermark
+
+ROLLUP_WATERMARK = 'rollups'
+# Отметка пользователя: имя - префикс + id пользователя
+USER_WATERMARK_PREFIX = 'rollups:user:'
+ROLLUP_LAG = timedelta(minutes=1)
+ROLLUP_WRITE_BATCH = 500
+
+# Поля-счетчики, которые суммируются в сводках
+SUM_FIELDS = (
+    'total_pomodoros_completed', 'total_tasks_completed', 'quadrant_2_time',
+    'planned_pomodoros', 'completed_on_time_tasks', 'interruptions_count',
+)
+DAILY_FIELDS = ('date', 'time_spent_per_quadrant', *SUM_FIELDS)
+
+
+def week_start(day):
+    """Понедельник ISO-недели дня day"""
+    return day - timedelta(days=day.weekday())
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def week_end(start):
+    return start + timedelta(days=6)
+
+
+def month_end(start):
+    next_month = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return next_month - timedelta(days=1)
+
+
+# Гранулярность: (модель сводки, начало периода дня, конец периода по его началу)
+GRANULARITIES = {
+    'week': (WeeklyStats, week_start, week_end),
+    'month': (MonthlyStats, month_start, month_end),
+}
+
+
+def empty_totals():
+    totals = dict.fromkeys(SUM_FIELDS, 0)
+    totals['time_spent_per_quadrant'] = {}
+    totals['active_days'] = 0
+    return totals
+
+
+def add_totals(totals, row, active_days=1):
+    """Прибавляет к totals строку row (словарь с полями SUM_FIELDS и временем по квадрантам)"""
+    for field in SUM_FIELDS:
+        totals[field] += row[field]
+    spent = Counter(totals['time_spent_per_quadrant'])
+    spent.update(row['time_spent_per_quadrant'] or {})
+    totals['time_spent_per_quadrant'] = dict(spent)
+    totals['active_days'] += active_days
+    return totals
+
+
+def daily_totals(user_id, start_of, first_day, last_day, starts=None):
+    """
+    Суммы дневных строк пользователя за дни [first_day, last_day] по периодам:
+    {начало периода: totals}. Периоды без строк в ответ не попадают;
+    starts - учитывать только эти периоды.
+    """
+    periods = {}
+    rows = ProductivityStats.objects.filter(
+        user_id=user_id, date__gte=first_day, date__lte=last_day
+    ).values(*DAILY_FIELDS)
+    for row in rows:
+        period = start_of(row['date'])
+        if starts is None or period in starts:
+            add_totals(periods.setdefault(period, empty_totals()), row)
+    return periods
+
+
+def refresh_periods(dirty):
+    """
+    Пересчитывает сводки за периоды dirty: {user_id: {день}} - дни измененных
+    дневных строк. Возвращает число пересчитанных периодов.
+    """
+    refreshed = 0
+    for granularity, (model, start_of, end_of) in GRANULARITIES.items():
+        for user_id, days in dirty.items():
+            starts = {start_of(day) for day in days}
+            periods = daily_totals(user_id, start_of, min(starts), end_of(max(starts)), starts)
+
+            with transaction.atomic():
+                model.objects.bulk_create(
+                    [model(user_id=user_id, period_start=start, **totals) for start, totals in periods.items()],
+                    batch_size=ROLLUP_WRITE_BATCH,
+                    update_conflicts=True,
+                    unique_fields=['user', 'period_start'],
+                    update_fields=[*SUM_FIELDS, 'time_spent_per_quadrant', 'active_days'],
+                )
+                # Период, в котором дневных строк не осталось, удаляется из сводок
+                empty = starts - set(periods)
+                if empty:
+                    model.objects.filter(user_id=user_id, period_start__in=empty).delete()
+            refreshed += len(starts)
+    return refreshed
+
+
+def dirty_days(since, user_id=None):
+    """Дни измененных после since дневных строк (since None - всех строк): {user_id: {день}}"""
+    rows = ProductivityStats.objects.all()
+    if since is not None:
+        rows = rows.filter(updated_at__gte=since)
+    if user_id is not None:
+        rows = rows.filter(user_id=user_id)
+    dirty = defaultdict(set)
+    for row_user_id, day in rows.values_list('user_id', 'date').iterator():
+        dirty[row_user_id].add(day)
+    return dirty
+
+
+def _user_watermark(user_id):
+    return f'{USER_WATERMARK_PREFIX}{user_id}'
+
+
+def get_watermark(user_id=None):
+    """
+    Момент, до которого изменения уже учтены в сводках (None - сводки еще не
+    строились). С user_id - более поздняя из общей отметки и отметки пользователя.
+    """
+    names = [ROLLUP_WATERMARK] if user_id is None else [ROLLUP_WATERMARK, _user_watermark(user_id)]
+    return RollupWatermark.objects.filter(name__in=names).aggregate(value=Max('value'))['value']
+
+
+def refresh_rollups(user_id=None):
+    """
+    Пересчитывает сводки за периоды, затронутые после отметки: всех пользователей
+    (сдвигается общая отметка) или только пользователя user_id (сдвигается его
+    отметка). Возвращает число пересчитанных периодов.
+    """
+    started = timezone.now()
+    refreshed = refresh_periods(dirty_days(get_watermark(user_id), user_id))
+    mark = started - ROLLUP_LAG
+    if user_id is None:
+        RollupWatermark.objects.update_or_create(name=ROLLUP_WATERMARK, defaults={'value': mark})
+        # Отметки пользователей не позже общей больше ничего не дают
+        RollupWatermark.objects.filter(name__startswith=USER_WATERMARK_PREFIX, value__lte=mark).delete()
+    else:
+        RollupWatermark.objects.update_or_create(name=_user_watermark(user_id), defaults={'value': mark})
+    return refreshed
+
+
+def invalidate_user_rollups(user_ids):
+    """
+    Удаляет сводки пользователей (после полного пересчета дневной статистики):
+    их дневные строки только что обновлены, и следующее обновление сводок
+    построит периоды заново - в том числе без дней, которых больше нет.
+    """
+    for model, _, _ in GRANULARITIES.values():
+        model.objects.filter(user_id__in=user_ids).delete()
+
+
+def read_rollups(user_id, granularity, start, end):
+    """
+    Сводки пользователя за периоды, начинающиеся в [start, end], без записи в базу:
+    {начало периода: totals}. Периоды, дневные строки которых изменились после
+    отметки, досчитываются из дневных строк (индекс stats_user_updated_idx).
+    """
+    model, start_of, end_of = GRANULARITIES[granularity]
+    last_day = end_of(start_of(end))
+    since = get_watermark(user_id)
+    if since is None:
+        # Сводки еще не строились - все периоды из дневных строк
+        return daily_totals(user_id, start_of, start, last_day)
+
+    periods = {
+        row['period_start']: add_totals(empty_totals(), row, row['active_days'])
+        for row in model.objects.filter(user_id=user_id, period_start__gte=start, period_start__lte=end)
+        .values('period_start', 'active_days', 'time_spent_per_quadrant', *SUM_FIELDS)
+    }
+    dirty = {
+        start_of(day) for day in ProductivityStats.objects.filter(
+            user_id=user_id, updated_at__gte=since, date__gte=start, date__lte=last_day
+        ).values_list('date', flat=True)
+    }
+    if dirty:
+        fresh = daily_totals(user_id, start_of, min(dirty), end_of(max(dirty)), dirty)
+        for period in dirty:
+            if period in fresh:
+                periods[period] = fresh[period]
+            else:
+                periods.pop(period, None)
+    return periods
+
+
+def plan_range(start, end):
+    """
+    Разбивает диапазон дат [start, end] на куски наибольшей гранулярности:
+    список пар ('month' | 'week' | 'day', первый день куска).
+    """
+    pieces = []
+    day = start
+    while day <= end:
+        if day.day == 1 and month_end(day) <= end:
+            pieces.append(('month', day))
+            day = month_end(day) + timedelta(days=1)
+        elif day.weekday() == 0 and week_end(day) <= end:
+            pieces.append(('week', day))
+            day = week_end(day) + timedelta(days=1)
+        else:
+            pieces.append(('day', day))
+            day += timedelta(days=1)
+    return pieces
+
+
+def _runs(starts, end_of):
+    """Разбивает начала периодов на серии идущих подряд: [(первое, последнее), ...]"""
+    runs = []
+    for start in starts:
+        if runs and end_of(runs[-1][1]) + timedelta(days=1) == start:
+            runs[-1][1] = start
+        else:
+            runs.append([start, start])
+    return runs
+
+
+def range_totals(user_id, start, end):
+    """
+    Суммы статистики пользователя ровно за дни [start, end] без записи в базу.
+    Целые месяцы и недели читаются из сводок (read_rollups - с досчетом
+    измененных периодов), края диапазона - из дневных строк.
+    """
+    starts = defaultdict(list)
+    for granularity, day in plan_range(start, end):
+        starts[granularity].append(day)
+
+    totals = empty_totals()
+    for granularity, (_, _, end_of) in GRANULARITIES.items():
+        # Недели бывают с обеих сторон месяцев: каждая серия читается отдельно, без лишних периодов
+        for first, last in _runs(starts[granularity], end_of):
+            for row in read_rollups(user_id, granularity, first, last).values():
+                add_totals(totals, row, row['active_days'])
+    if starts['day']:
+        rows = ProductivityStats.objects.filter(user_id=user_id, date__in=starts['day']).values(*DAILY_FIELDS)
+        for row in rows:
+            add_totals(totals, row)
+    return totals
+
@@ -0,0 +1,253 @@
+# analytics/scoring.py
+"""
+Оценки дневной статистики: focus_score и productivity_score (0-100).
+
+Для каждой строки ProductivityStats (пользователь + день) по его рабочим
+сессиям за этот день считаются:
+
+- доля фокуса - секунды завершенных рабочих сессий от всех секунд работы;
+  focus_score = 100 * доля фокуса;
+- доля прерываний - прерванные, отмененные и брошенные рабочие сессии от
+  всех завершенных рабочих сессий;
+- доля Квадранта 2 - секунды работы над задачами Квадранта 2 от секунд
+  работы над задачами с квадрантом;
+- доля задач в срок - completed_on_time_tasks / total_tasks_completed.
+
+productivity_score = 100 * взвешенное среднее долей фокуса, "без
+прерываний" (1 - доля прерываний), Квадранта 2 и задач в срок. Доли по
+сессиям участвуют, только если в этот день были рабочие сессии, доля
+задач - если были завершенные задачи; веса остальных долей
+перенормируются. День без того и другого получает 0.
+
+Время брошенной сессии неизвестно (его проставляет reaper по длительности
+фазы), поэтому в секунды работы оно не идет - как и в агрегаторе.
+
+Сессии группы пользователей загружаются в столбцы (номер строки
+статистики, длительность, признаки), и суммы по строкам считаются
+векторно через numpy.bincount. Если numpy не установлен, работает
+эквивалентный расчет на чистом Python; он же служит для сверки
+(rescore_stats --verify).
+"""
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Q
+
+try:
+    import numpy as np
+except ImportError:  # numpy необязателен - тогда считаем на чистом Python
+    np = None
+
+from pomodoro.models import (
+    PomodoroSession, ArchivedPomodoroSession, session_duration, session_local_date, users_tzinfo,
+)
+from .aggregator import INTERRUPTED_STATUSES, QUADRANT_2, _quadrant_number
+from .models import ProductivityStats
+from .rebuild import REBUILD_CHUNK_SIZE, REBUILD_ITERATOR_CHUNK, user_chunks
+
+SCORE_WRITE_BATCH = 500
+# Точность хранимых оценок: одинакова для обоих способов расчета
+SCORE_DIGITS = 2
+
+# Веса долей в productivity_score
+WEIGHT_FOCUS = 0.35
+WEIGHT_UNINTERRUPTED = 0.15
+WEIGHT_QUADRANT_2 = 0.25
+WEIGHT_ON_TIME = 0.25
+SESSION_WEIGHTS = WEIGHT_FOCUS + WEIGHT_UNINTERRUPTED + WEIGHT_QUADRANT_2
+
+STATS_COLUMNS = ('id', 'user_id', 'date', 'total_tasks_completed', 'completed_on_time_tasks',
+                 'focus_score', 'productivity_score')
+SESSION_COLUMNS = ('user_id', 'local_date', 'start_time', 'end_time', 'status', 'duration_seconds',
+                   'task__quadrant_id')
+
+
+def numpy_available():
+    return np is not None
+
+
+def load_scoring_input(user_ids, since=None):
+    """
+    Загружает строки статистики пользователей user_ids (с дня since, если задан)
+    и столбцы их рабочих сессий. Возвращает (stats, sessions): stats - кортежи
+    STATS_COLUMNS; sessions - словарь списков одинаковой длины: row (индекс строки
+    в stats), duration, completed, interrupted, quadrant (работа над задачей с
+    квадрантом), q2 (над задачей Квадранта 2).
+    """
+    stats_rows = ProductivityStats.objects.filter(user_id__in=user_ids)
+    if since is not None:
+        stats_rows = stats_rows.filter(date__gte=since)
+    stats = list(stats_rows.order_by('id').values_list(*STATS_COLUMNS))
+    index = {(user_id, day): position for position, (_, user_id, day, *_) in enumerate(stats)}
+
+    sessions = {column: [] for column in ('row', 'duration', 'completed', 'interrupted', 'quadrant', 'q2')}
+    if not stats:
+        return stats, sessions
+
+    time_zones = users_tzinfo(user_ids)
+    for model in (PomodoroSession, ArchivedPomodoroSession):
+        rows = model.objects.filter(user_id__in=user_ids, session_type='work', end_time__isnull=False)
+        if since is not None:
+            # Сессии без local_date (до backfill_sessions) определяют день по start_time;
+            # запас в сутки покрывает любой часовой пояс
+            rows = rows.filter(Q(local_date__gte=since) | Q(
+                local_date__isnull=True,
+                start_time__gte=datetime.combine(since - timedelta(days=1), datetime.min.time(),
+                                                 tzinfo=dt_timezone.utc),
+            ))
+        rows = rows.values_list(*SESSION_COLUMNS).iterator(chunk_size=REBUILD_ITERATOR_CHUNK)
+        for user_id, day, start_time, end_time, status, duration, quadrant_id in rows:
+            day = day or session_local_date(start_time, time_zones[user_id])
+            position = index.get((user_id, day))
+            if position is None:
+                continue
+            if status == 'abandoned':
+                duration = 0
+            elif duration is None:
+                duration = session_duration(start_time, end_time)
+            number = _quadrant_number(quadrant_id)
+            sessions['row'].append(position)
+            sessions['duration'].append(duration)
+            sessions['completed'].append(status == 'completed')
+            sessions['interrupted'].append(status in INTERRUPTED_STATUSES)
+            sessions['quadrant'].append(number is not None)
+            sessions['q2'].append(number == QUADRANT_2)
+    return stats, sessions
+
+
+def _ratio(numerator, denominator):
+    return numerator / denominator if denominator else 0.0
+
+
+def score_python(stats, sessions):
+    """Оценки на чистом Python: список пар (focus_score, productivity_score) по строкам stats"""
+    size = len(stats)
+    work_seconds, focused_seconds = [0] * size, [0] * size
+    work_count, interrupted_count = [0] * size, [0] * size
+    quadrant_seconds, q2_seconds = [0] * size, [0] * size
+
+    for row, duration, completed, interrupted, quadrant, q2 in zip(
+            sessions['row'], sessions['duration'], sessions['completed'],
+            sessions['interrupted'], sessions['quadrant'], sessions['q2']):
+        work_seconds[row] += duration
+        work_count[row] += 1
+        if completed:
+            focused_seconds[row] += duration
+        if interrupted:
+            interrupted_count[row] += 1
+        if quadrant:
+            quadrant_seconds[row] += duration
+        if q2:
+            q2_seconds[row] += duration
+
+    scores = []
+    for row, (_, _, _, tasks, on_time, _, _) in enumerate(stats):
+        focus = _ratio(focused_seconds[row], work_seconds[row])
+        numerator = denominator = 0.0
+        if work_count[row]:
+            interruption_rate = _ratio(interrupted_count[row], work_count[row])
+            numerator += (WEIGHT_FOCUS * focus + WEIGHT_UNINTERRUPTED * (1 - interruption_rate)
+                          + WEIGHT_QUADRANT_2 * _ratio(q2_seconds[row], quadrant_seconds[row]))
+            denominator += SESSION_WEIGHTS
+        if tasks:
+            numerator += WEIGHT_ON_TIME * _ratio(on_time, tasks)
+            denominator += WEIGHT_ON_TIME
+        scores.append((round(100 * focus, SCORE_DIGITS),
+                       round(100 * _ratio(numerator, denominator), SCORE_DIGITS)))
+    return scores
+
+
+def _np_ratio(numerator, denominator):
+    return np.divide(numerator, denominator, out=np.zeros(len(numerator)), where=denominator > 0)
+
+
+def score_numpy(stats, sessions):
+    """Те же оценки векторно (numpy): суммы по строкам - bincount по индексу строки"""
+    size = len(stats)
+    row = np.asarray(sessions['row'], dtype=np.intp)
+    duration = np.asarray(sessions['duration'], dtype=np.float64)
+
+    def per_row(weights):
+        return np.bincount(row, weights=weights, minlength=size)
+
+    work_seconds = per_row(duration)
+    work_count = np.bincount(row, minlength=size)
+    focused_seconds = per_row(duration * np.asarray(sessions['completed'], dtype=bool))
+    interrupted_count = per_row(np.asarray(sessions['interrupted'], dtype=np.float64))
+    quadrant_seconds = per_row(duration * np.asarray(sessions['quadrant'], dtype=bool))
+    q2_seconds = per_row(duration * np.asarray(sessions['q2'], dtype=bool))
+
+    tasks = np.fromiter((item[3] for item in stats), dtype=np.float64, count=size)
+    on_time = np.fromiter((item[4] for item in stats), dtype=np.float64, count=size)
+
+    focus = _np_ratio(focused_seconds, work_seconds)
+    has_work = work_count > 0
+    has_tasks = tasks > 0
+    numerator = (
+        has_work * (WEIGHT_FOCUS * focus
+                    + WEIGHT_UNINTERRUPTED * (1 - _np_ratio(interrupted_count, work_count))
+                    + WEIGHT_QUADRANT_2 * _np_ratio(q2_seconds, quadrant_seconds))
+        + has_tasks * WEIGHT_ON_TIME * _np_ratio(on_time, tasks)
+    )
+    denominator = has_work * SESSION_WEIGHTS + has_tasks * WEIGHT_ON_TIME
+    productivity = _np_ratio(numerator, denominator)
+    return list(zip(np.round(100 * focus, SCORE_DIGITS).tolist(),
+                    np.round(100 * productivity, SCORE_DIGITS).tolist()))
+
+
+def compute_scores(stats, sessions, use_numpy=None):
+    """Оценки строк stats: через numpy, если он есть (use_numpy None) или явно запрошен"""
+    if use_numpy is None:
+        use_numpy = numpy_available()
+    return score_numpy(stats, sessions) if use_numpy else score_python(stats, sessions)
+
+
+def write_scores(stats, scores):
+    """Сохраняет оценки, которые изменились. Возвращает число измененных строк"""
+    changed = [
+        ProductivityStats(id=stats_id, focus_score=focus, productivity_score=productivity)
+        for (stats_id, *_, old_focus, old_productivity), (focus, productivity) in zip(stats, scores)
+        if (focus, productivity) != (old_focus, old_productivity)
+    ]
+    # bulk_update не трогает updated_at: оценки не входят в сводки и не делают периоды грязными
+    with transaction.atomic():
+        ProductivityStats.objects.bulk_update(changed, ['focus_score', 'productivity_score'],
+                                              batch_size=SCORE_WRITE_BATCH)
+    return len(changed)
+
+
+def max_score_difference(first, second):
+    """Наибольшее расхождение двух наборов оценок - для сверки способов расчета"""
+    return max((abs(a - b) for pair_a, pair_b in zip(first, second) for a, b in zip(pair_a, pair_b)),
+               default=0.0)
+
+
+def rescore_stats(since=None, chunk_size=REBUILD_CHUNK_SIZE, use_numpy=None, verify=False,
+                  on_progress=None):
+    """
+    Пересчитывает оценки строк статистики всех пользователей (с дня since, если задан).
+    Пользователи идут группами по chunk_size. verify - дополнительно считать на чистом
+    Python и сверять. on_progress(report) вызывается после каждой группы; report
+    содержит users, rows, updated, elapsed, engine и max_difference (при verify).
+    """
+    if use_numpy is None:
+        use_numpy = numpy_available()
+    report = {'users': 0, 'rows': 0, 'updated': 0, 'elapsed': 0.0,
+              'engine': 'numpy' if use_numpy else 'python', 'max_difference': 0.0}
+    started = time.monotonic()
+
+    for user_ids in user_chunks(chunk_size=chunk_size):
+        stats, sessions = load_scoring_input(user_ids, since)
+        scores = compute_scores(stats, sessions, use_numpy)
+        if verify and use_numpy:
+            difference = max_score_difference(scores, score_python(stats, sessions))
+            report['max_difference'] = max(report['max_difference'], difference)
+        report['updated'] += write_scores(stats, scores)
+        report['users'] += len(user_ids)
+        report['rows'] += len(stats)
+        report['elapsed'] = time.monotonic() - started
+        if on_progress:
+            on_progress(dict(report))
+    return report
+
@@ -1,3 +1,530 @@
+import json
+import os
+import random
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
+from zoneinfo import ZoneInfo
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import QuerySet
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from pomodoro.ingest import ingest_session_events
+from pomodoro.models import ArchivedPomodoroSession, PomodoroSession
+from tasks.archive import archive_finished_tasks
+from tasks.models import Task, EisenhowerQuadrant
+from .aggregator import apply_deltas, record_task_completed
+from .models import ProductivityStats, WeeklyStats, MonthlyStats
+from .rebuild import COUNTER_FIELDS, compute_stats, rebuild_stats, write_stats
+from .scoring import (
+    SCORE_DIGITS, compute_scores, max_score_difference, numpy_available, rescore_stats, score_python,
+)
+from .rollups import (
+    plan_range, range_totals, refresh_rollups, refresh_periods, read_rollups, week_start, week_end, month_end,
+    SUM_FIELDS,
+)
+
+
+def write_queries(ctx):
+    return [q['sql'] for q in ctx.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+
+
+class DashboardSeriesTests(TestCase):
+    """API панели читает только агрегаты, кэширует ответ и сбрасывает его при новых данных"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('analyst', password='secret-pass-123')
+        for day in (date(2025, 1, 6), date(2025, 1, 7), date(2025, 2, 3)):
+            apply_deltas(cls.user.id, day, {'total_pomodoros_completed': 2, 'total_tasks_completed': 1,
+                                            'completed_on_time_tasks': 1}, {1: 600, 2: 1800})
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def series(self, granularity):
+        return self.client.get(reverse('analytics:stats_series'),
+                               {'granularity': granularity, 'start': '2025-01-01', 'end': '2025-12-31'})
+
+    def test_series_reads_only_aggregates(self):
+        for granularity, periods in (('day', 365), ('week', 53), ('month', 12)):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.series(granularity)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            self.assertEqual(len(data['series']), periods)
+            self.assertEqual(data['totals']['pomodoros'], 6)
+            self.assertEqual(data['totals']['active_days'], 3)
+            self.assertEqual(data['totals']['quadrant_2_share'], 0.75)
+            self.assertEqual(data['totals']['on_time_ratio'], 1.0)
+            for query in ctx.captured_queries:
+                self.assertNotIn('pomodoro_pomodorosession', query['sql'])
+            self.assertEqual(write_queries(ctx), [])
+
+    def test_response_cached_until_stats_change(self):
+        # Сводки построены; новые дневные данные ответ досчитывает, не записывая сводки
+        refresh_rollups()
+        self.series('month')
+        with CaptureQueriesContext(connection) as ctx:
+            cached = self.series('month').json()
+        self.assertFalse([q for q in ctx.captured_queries if 'analytics_' in q['sql']])
+
+        apply_deltas(self.user.id, date(2025, 3, 3), {'total_pomodoros_completed': 4})
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.series('month').json()
+        self.assertEqual(write_queries(ctx), [])
+        self.assertEqual(data['totals']['pomodoros'], cached['totals']['pomodoros'] + 4)
+        self.assertEqual(data['series'][2]['pomodoros'], 4)
+
+    def test_invalid_range(self):
+        response = self.client.get(reverse('analytics:stats_series'), {'start': '2025-02-01', 'end': '2025-01-01'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()['success'])
+
+
+class RollupTests(TestCase):
+    """Недельные и месячные сводки: суммы дневных строк, пересчет только измененных периодов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('roller')
+        cls.days = [date(2025, 1, 1) + timedelta(days=offset) for offset in range(0, 120, 3)]
+        for number, day in enumerate(cls.days):
+            apply_deltas(cls.user.id, day, {'total_pomodoros_completed': number + 1, 'interruptions_count': 1},
+                         {1 + number % 4: 60 * (number + 1)})
+        # Строки "давно" изменены: иначе все они попадают в запас ROLLUP_LAG и всегда грязные
+        ProductivityStats.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+
+    def daily_sum(self, first, last):
+        rows = ProductivityStats.objects.filter(user=self.user, date__gte=first, date__lte=last)
+        spent = {}
+        for row in rows:
+            for key, seconds in row.time_spent_per_quadrant.items():
+                spent[key] = spent.get(key, 0) + seconds
+        return {
+            **{field: sum(getattr(row, field) for row in rows) for field in SUM_FIELDS},
+            'time_spent_per_quadrant': spent,
+            'active_days': rows.count(),
+        }
+
+    def assert_rollups_match_days(self):
+        for model, end_of in ((WeeklyStats, week_end), (MonthlyStats, month_end)):
+            rollups = model.objects.filter(user=self.user)
+            self.assertTrue(rollups)
+            for rollup in rollups:
+                expected = self.daily_sum(rollup.period_start, end_of(rollup.period_start))
+                self.assertEqual(
+                    {field: getattr(rollup, field) for field in expected}, expected, rollup.period_start
+                )
+
+    def test_refresh_sums_daily_rows(self):
+        refresh_rollups()
+        self.assertEqual(MonthlyStats.objects.filter(user=self.user).count(), 4)
+        self.assertEqual(WeeklyStats.objects.filter(user=self.user).count(),
+                         len({week_start(day) for day in self.days}))
+        self.assert_rollups_match_days()
+
+    def test_refresh_touches_only_changed_periods(self):
+        # Первое обновление пользователя строит все его периоды, повторное - ничего
+        self.assertGreater(refresh_rollups(self.user.id), 2)
+        self.assertEqual(refresh_rollups(self.user.id), 0)
+
+        apply_deltas(self.user.id, date(2025, 2, 5), {'total_pomodoros_completed': 10})
+        # Одна неделя и один месяц; после этого отметка пользователя сдвигается
+        self.assertEqual(refresh_rollups(self.user.id), 2)
+        ProductivityStats.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(refresh_rollups(self.user.id), 0)
+
+        # Общее обновление: первое - все периоды, следующее - только измененные
+        refresh_rollups()
+        apply_deltas(self.user.id, date(2025, 3, 20), {'total_pomodoros_completed': 3})
+        self.assertEqual(refresh_rollups(), 2)
+        self.assert_rollups_match_days()
+
+    def test_period_without_days_is_removed(self):
+        refresh_rollups()
+        ProductivityStats.objects.filter(user=self.user, date__month=1).delete()
+        refresh_periods({self.user.id: {date(2025, 1, 1)}})
+        self.assertFalse(MonthlyStats.objects.filter(user=self.user, period_start=date(2025, 1, 1)).exists())
+        self.assertFalse(WeeklyStats.objects.filter(user=self.user, period_start=date(2024, 12, 30)).exists())
+
+    # Диапазоны не по границам недель и месяцев, в том числе внутри одной недели и через год
+    RANGES = [
+        (date(2025, 1, 3), date(2025, 3, 18)),
+        (date(2024, 12, 20), date(2025, 2, 11)),
+        (date(2025, 1, 14), date(2025, 1, 16)),
+        (date(2025, 1, 6), date(2025, 4, 30)),
+        (date(2025, 2, 1), date(2025, 2, 28)),
+    ]
+
+    def test_plan_range_uses_coarsest_pieces(self):
+        self.assertEqual(plan_range(date(2025, 1, 30), date(2025, 3, 11)), [
+            ('day', date(2025, 1, 30)), ('day', date(2025, 1, 31)),
+            ('month', date(2025, 2, 1)),
+            ('day', date(2025, 3, 1)), ('day', date(2025, 3, 2)),
+            ('week', date(2025, 3, 3)),
+            ('day', date(2025, 3, 10)), ('day', date(2025, 3, 11)),
+        ])
+        self.assertEqual(plan_range(date(2024, 12, 30), date(2025, 1, 5)), [('week', date(2024, 12, 30))])
+        # Дни покрываются ровно один раз
+        for start, end in self.RANGES:
+            covered = []
+            for granularity, first in plan_range(start, end):
+                last = {'month': month_end, 'week': week_end, 'day': lambda day: day}[granularity](first)
+                covered.extend(first + timedelta(days=offset) for offset in range((last - first).days + 1))
+            self.assertEqual(covered, [start + timedelta(days=offset) for offset in range((end - start).days + 1)])
+
+    def assert_range_totals_exact(self):
+        for start, end in self.RANGES:
+            with CaptureQueriesContext(connection) as ctx:
+                totals = range_totals(self.user.id, start, end)
+            self.assertEqual(write_queries(ctx), [])
+            expected = self.daily_sum(start, end)
+            self.assertEqual({field: totals[field] for field in expected}, expected, (start, end))
+
+    def test_range_totals_match_daily_sums(self):
+        # Сводки еще не построены, построены и устарели после новых дневных данных
+        self.assert_range_totals_exact()
+        refresh_rollups()
+        self.assert_range_totals_exact()
+        apply_deltas(self.user.id, date(2025, 2, 13), {'total_pomodoros_completed': 5}, {2: 300})
+        apply_deltas(self.user.id, date(2025, 1, 15), {'interruptions_count': 2})
+        self.assert_range_totals_exact()
+
+    def test_read_rollups_patches_changed_periods_without_writes(self):
+        refresh_rollups()
+        apply_deltas(self.user.id, date(2025, 3, 12), {'total_pomodoros_completed': 7})
+
+        with CaptureQueriesContext(connection) as ctx:
+            months = read_rollups(self.user.id, 'month', date(2025, 1, 1), date(2025, 4, 1))
+            weeks = read_rollups(self.user.id, 'week', date(2024, 12, 30), date(2025, 4, 28))
+        self.assertEqual(write_queries(ctx), [])
+
+        self.assertEqual(sorted(months), [date(2025, month, 1) for month in range(1, 5)])
+        for period, totals in months.items():
+            expected = self.daily_sum(period, month_end(period))
+            self.assertEqual({field: totals[field] for field in expected}, expected, period)
+        for period, totals in weeks.items():
+            self.assertEqual(totals['total_pomodoros_completed'],
+                             self.daily_sum(period, week_end(period))['total_pomodoros_completed'])
+
+
+def stats_rows(**filters):
+    """Строки статистики в сравнимом виде: {(пользователь, день): (счетчики, время по квадрантам)}"""
+    return {
+        (row.user_id, row.date): ({field: getattr(row, field) for field in COUNTER_FIELDS},
+                                  row.time_spent_per_quadrant)
+        for row in ProductivityStats.objects.filter(**filters)
+    }
+
+
+class RebuildStatsTests(TestCase):
+    """Полный пересчет совпадает с инкрементальным агрегатором, заменяет строки и продолжается с контрольной точки"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.first = User.objects.create_user('rebuilt-first')
+        cls.second = User.objects.create_user('rebuilt-second')
+        # Настройки меняем в закэшированном объекте: сигнал сохраняет его при каждом сохранении пользователя
+        cls.second.usersettings.time_zone = 'America/New_York'
+        cls.second.usersettings.save()
+
+        quadrants = {quadrant.priority_order: quadrant for quadrant in EisenhowerQuadrant.objects.all()}
+        base = datetime(2025, 1, 10, 3, 30, tzinfo=dt_timezone.utc)
+        for user in (cls.first, cls.second):
+            old = Task.objects.create(user=user, title='Старая', quadrant=quadrants[2], estimated_pomodoros=3)
+            current = Task.objects.create(user=user, title='Текущая', quadrant=quadrants[1])
+            loose = Task.objects.create(user=user, title='Без квадранта')
+
+            # Все события проходят через тот же прием, что и от клиентов
+            events = []
+            sessions = [
+                (old, 'work', 'completed', base - timedelta(days=60), 25),
+                (old, 'work', 'interrupted', base - timedelta(days=60, hours=-1), 10),
+                (current, 'work', 'completed', base, 25),
+                (current, 'short_break', 'completed', base + timedelta(minutes=25), 5),
+                (current, 'work', 'cancelled', base + timedelta(hours=20), 3),
+                (loose, 'work', 'completed', base + timedelta(days=1), 25),
+            ]
+            for number, (task, session_type, status, start, minutes) in enumerate(sessions):
+                key = f'{user.id}-{number}'
+                events.append({'type': 'start', 'key': key, 'task_id': task.id, 'session_type': session_type,
+                               'at': start.isoformat()})
+                events.append({'type': 'end', 'key': key, 'status': status,
+                               'at': (start + timedelta(minutes=minutes, microseconds=250000)).isoformat()})
+            ingest_session_events(user, events)
+
+            for task, completed_at, due_date in ((old, base - timedelta(days=59), base - timedelta(days=61)),
+                                                 (current, base + timedelta(hours=2), None)):
+                task.status, task.completed_at, task.due_date = 'completed', completed_at, due_date
+                task.save()
+                record_task_completed(task)
+
+        # Завершенные задачи с сессиями уходят в архив - пересчет читает и его
+        archive_finished_tasks(days=30)
+
+    def test_rebuild_matches_incremental(self):
+        # Сессии завершенных задач в архиве, задачи без квадранта - в рабочей таблице
+        self.assertEqual((ArchivedPomodoroSession.objects.count(), PomodoroSession.objects.count()), (10, 2))
+        incremental = stats_rows()
+        # Первый пользователь в Москве, второй в Нью-Йорке: одни и те же сессии ложатся в разные дни
+        self.assertIn((self.first.id, date(2025, 1, 10)), incremental)
+        self.assertIn((self.second.id, date(2025, 1, 9)), incremental)
+
+        ProductivityStats.objects.all().delete()
+        report = rebuild_stats(workers=0)
+        self.assertEqual(stats_rows(), incremental)
+        self.assertEqual(report['sessions'], PomodoroSession.objects.count() + ArchivedPomodoroSession.objects.count())
+        self.assertEqual((report['users'], report['checkpoint']), (2, self.second.id))
+
+    def test_compute_stats_counts_day(self):
+        days, session_count = compute_stats([self.first.id])
+        self.assertEqual(session_count, 6)
+        counters, quadrant_seconds = days[self.first.id, date(2025, 1, 10)]
+        # Рабочая сессия 25 минут в квадранте 1, перерыв не в счет; задача завершена в тот же день
+        self.assertEqual(counters['total_pomodoros_completed'], 1)
+        self.assertEqual(counters['total_tasks_completed'], 1)
+        self.assertEqual(counters['completed_on_time_tasks'], 1)
+        self.assertEqual(quadrant_seconds, {1: 25 * 60})
+
+    def test_write_stats_replaces_counters_and_removes_stale_days(self):
+        incremental = stats_rows()
+        ProductivityStats.objects.update(total_pomodoros_completed=99, focus_score=0.5)
+        apply_deltas(self.first.id, date(2024, 6, 1), {'total_pomodoros_completed': 1})
+
+        days, _ = compute_stats([self.first.id])
+        write_stats([self.first.id], days)
+
+        self.assertEqual(stats_rows(user=self.first), {
+            key: value for key, value in incremental.items() if key[0] == self.first.id
+        })
+        # Оценки пересчет не трогает, чужие строки тоже
+        self.assertFalse(ProductivityStats.objects.filter(user=self.first).exclude(focus_score=0.5).exists())
+        self.assertFalse(ProductivityStats.objects.filter(user=self.second).exclude(total_pomodoros_completed=99).exists())
+
+    def test_resume_from_checkpoint(self):
+        incremental = stats_rows()
+        ProductivityStats.objects.update(total_pomodoros_completed=99)
+
+        reports = []
+        rebuild_stats(start_after=self.first.id, chunk_size=1, workers=0, on_progress=reports.append)
+        self.assertEqual([(report['users'], report['checkpoint']) for report in reports], [(1, self.second.id)])
+        self.assertEqual(stats_rows(user=self.second),
+                         {key: value for key, value in incremental.items() if key[0] == self.second.id})
+        self.assertFalse(ProductivityStats.objects.filter(user=self.first).exclude(total_pomodoros_completed=99).exists())
+
+    def test_command_continues_from_checkpoint_file(self):
+        ProductivityStats.objects.update(total_pomodoros_completed=99)
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint = os.path.join(directory, 'checkpoint.json')
+            with open(checkpoint, 'w', encoding='utf-8') as stream:
+                json.dump({'last_user_id': self.first.id}, stream)
+
+            out = StringIO()
+            call_command('rebuild_stats', workers=0, checkpoint=checkpoint, stdout=out)
+            self.assertIn(f'Продолжаем после пользователя {self.first.id}', out.getvalue())
+            with open(checkpoint, encoding='utf-8') as stream:
+                self.assertEqual(json.load(stream), {'last_user_id': self.second.id})
+
+            # --restart пересчитывает всех, не глядя на файл
+            call_command('rebuild_stats', workers=0, checkpoint=checkpoint, restart=True, stdout=StringIO())
+        self.assertFalse(ProductivityStats.objects.filter(total_pomodoros_completed=99).exists())
+
+
+def scoring_input(rows):
+    """Вход расчета оценок: rows - пары ((задач, в срок), [(длительность, статус, номер квадранта), ...])"""
+    stats = [(position, 1, date(2025, 1, 1), tasks, on_time, 0.0, 0.0)
+             for position, ((tasks, on_time), _) in enumerate(rows)]
+    sessions = {column: [] for column in ('row', 'duration', 'completed', 'interrupted', 'quadrant', 'q2')}
+    for position, (_, work) in enumerate(rows):
+        for duration, status, number in work:
+            sessions['row'].append(position)
+            sessions['duration'].append(duration)
+            sessions['completed'].append(status == 'completed')
+            sessions['interrupted'].append(status in ('interrupted', 'cancelled', 'abandoned'))
+            sessions['quadrant'].append(number is not None)
+            sessions['q2'].append(number == 2)
+    return stats, sessions
+
+
+class ScoringTests(TestCase):
+    """Оценки дня: формула на известном входе, совпадение numpy и Python, запись только изменившихся"""
+
+    FIXED = [
+        # Фокус 2100/2400, без прерываний 2/3, Квадрант 2 1500/1800, в срок 1/2
+        ((2, 1), [(1500, 'completed', 2), (300, 'interrupted', 1), (600, 'completed', None)]),
+        # Только задачи: все в срок
+        ((3, 3), []),
+        # Ни сессий, ни задач
+        ((0, 0), []),
+        # Только сессии: доля задач не участвует, веса перенормируются
+        ((0, 0), [(1200, 'completed', 1)]),
+        # Брошенная сессия: времени нет, но прерывание учитывается
+        ((1, 0), [(0, 'abandoned', 2)]),
+    ]
+    EXPECTED = [
+        (87.5, round(100 * (0.35 * 0.875 + 0.15 * 2 / 3 + 0.25 * 5 / 6 + 0.25 * 0.5), SCORE_DIGITS)),
+        (0.0, 100.0),
+        (0.0, 0.0),
+        (100.0, round(100 * (0.35 + 0.15) / 0.75, SCORE_DIGITS)),
+        (0.0, 0.0),
+    ]
+
+    def test_formula_on_fixed_input(self):
+        stats, sessions = scoring_input(self.FIXED)
+        self.assertEqual(self.EXPECTED[0][1], 73.96)
+        self.assertEqual(score_python(stats, sessions), self.EXPECTED)
+        self.assertEqual(compute_scores(stats, sessions, use_numpy=False), self.EXPECTED)
+
+    @unittest.skipUnless(numpy_available(), 'numpy не установлен')
+    def test_numpy_matches_python(self):
+        stats, sessions = scoring_input(self.FIXED)
+        self.assertEqual(compute_scores(stats, sessions, use_numpy=True), self.EXPECTED)
+
+        generator = random.Random(7)
+        rows = []
+        for _ in range(500):
+            tasks = generator.randint(0, 5)
+            work = [(generator.randint(0, 3000), generator.choice(('completed', 'interrupted', 'abandoned')),
+                     generator.choice((None, 1, 2, 3, 4))) for _ in range(generator.randint(0, 8))]
+            rows.append(((tasks, generator.randint(0, tasks)), work))
+        stats, sessions = scoring_input(rows)
+        # Суммы в другом порядке могут разойтись только на округлении последнего знака
+        self.assertLessEqual(max_score_difference(compute_scores(stats, sessions, use_numpy=True),
+                                                  score_python(stats, sessions)), 10 ** -SCORE_DIGITS)
+
+    def test_rescore_writes_changed_rows(self):
+        user = User.objects.create_user('scored')
+        quadrant = EisenhowerQuadrant.objects.get(priority_order=2)
+        task = Task.objects.create(user=user, title='Задача', quadrant=quadrant)
+        start = datetime(2025, 1, 10, 9, 0, tzinfo=dt_timezone.utc)
+        ingest_session_events(user, [
+            {'type': 'start', 'key': 'a', 'task_id': task.id, 'at': start.isoformat()},
+            {'type': 'end', 'key': 'a', 'status': 'completed', 'at': (start + timedelta(minutes=25)).isoformat()},
+            {'type': 'start', 'key': 'b', 'task_id': task.id, 'at': (start + timedelta(hours=1)).isoformat()},
+            {'type': 'end', 'key': 'b', 'status': 'interrupted',
+             'at': (start + timedelta(hours=1, minutes=5)).isoformat()},
+        ])
+
+        report = rescore_stats(use_numpy=False)
+        self.assertEqual((report['rows'], report['updated'], report['engine']), (1, 1, 'python'))
+        stats = ProductivityStats.objects.get(user=user)
+        self.assertEqual(stats.focus_score, round(100 * 25 / 30, SCORE_DIGITS))
+        self.assertEqual(stats.productivity_score,
+                         round(100 * (0.35 * 25 / 30 + 0.15 * 0.5 + 0.25) / 0.75, SCORE_DIGITS))
+        # Повторный пересчет ничего не пишет
+        self.assertEqual(rescore_stats(use_numpy=False)['updated'], 0)
+
+
+class AggregatorTests(TestCase):
+    """Дневная статистика из событий: приращения одним UPDATE по дню в часовом поясе пользователя"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('aggregated', password='secret-pass-123')
+        # Настройки меняем в закэшированном объекте: сигнал сохраняет его при каждом сохранении пользователя
+        cls.user.usersettings.time_zone = 'Asia/Tokyo'
+        cls.user.usersettings.save()
+        cls.quadrants = {quadrant.priority_order: quadrant for quadrant in EisenhowerQuadrant.objects.all()}
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def today(self):
+        return timezone.now().astimezone(ZoneInfo('Asia/Tokyo')).date()
+
+    def end_session(self, task, session_type, status, start_time):
+        session = PomodoroSession.objects.create(user=self.user, task=task, session_type=session_type,
+                                                 start_time=start_time)
+        data = self.client.post(reverse('pomodoro:end_session'),
+                                json.dumps({'session_id': session.id, 'status': status}),
+                                content_type='application/json').json()
+        self.assertTrue(data['success'], data)
+        session.refresh_from_db()
+        return session
+
+    def test_session_events(self):
+        important = Task.objects.create(user=self.user, title='Важно', quadrant=self.quadrants[2])
+        urgent = Task.objects.create(user=self.user, title='Срочно', quadrant=self.quadrants[1])
+        start = timezone.now() - timedelta(minutes=25)
+        day = start.astimezone(ZoneInfo('Asia/Tokyo')).date()
+
+        completed = self.end_session(important, 'work', 'completed', start)
+        interrupted = self.end_session(urgent, 'work', 'interrupted', start)
+        self.end_session(important, 'short_break', 'completed', start)
+        # Повторное завершение статистику не меняет
+        self.client.post(reverse('pomodoro:end_session'), json.dumps({'session_id': completed.id}),
+                         content_type='application/json')
+
+        stats = ProductivityStats.objects.get(user=self.user)
+        self.assertEqual(stats.date, day)
+        self.assertEqual((stats.total_pomodoros_completed, stats.interruptions_count), (1, 1))
+        self.assertEqual(stats.quadrant_2_time, completed.duration_seconds)
+        self.assertEqual(stats.time_spent_per_quadrant,
+                         {'2': completed.duration_seconds, '1': interrupted.duration_seconds})
+
+    def test_task_completion_events(self):
+        on_time = Task.objects.create(user=self.user, title='В срок', estimated_pomodoros=3,
+                                      due_date=timezone.now() + timedelta(days=1))
+        late = Task.objects.create(user=self.user, title='Опоздала', estimated_pomodoros=2,
+                                   due_date=timezone.now() - timedelta(days=1))
+        for task in (on_time, late, on_time):
+            self.assertTrue(self.client.post(reverse('pomodoro:complete_task', args=[task.id])).json()['success'])
+
+        stats = ProductivityStats.objects.get(user=self.user, date=self.today())
+        self.assertEqual((stats.total_tasks_completed, stats.completed_on_time_tasks, stats.planned_pomodoros),
+                         (2, 1, 5))
+
+    def test_increment_is_one_update(self):
+        day = date(2025, 5, 5)
+        apply_deltas(self.user.id, day, {'total_pomodoros_completed': 1}, {2: 600})
+        with CaptureQueriesContext(connection) as ctx:
+            apply_deltas(self.user.id, day, {'total_pomodoros_completed': 2, 'interruptions_count': 1}, {2: 60, 4: 30})
+            apply_deltas(self.user.id, day, {'total_pomodoros_completed': 0}, {})
+        stats_queries = [q['sql'] for q in ctx.captured_queries if 'analytics_productivitystats' in q['sql']]
+        self.assertEqual(len(stats_queries), 1)
+        self.assertTrue(stats_queries[0].startswith('UPDATE'))
+
+        stats = ProductivityStats.objects.get(user=self.user, date=day)
+        self.assertEqual((stats.total_pomodoros_completed, stats.interruptions_count), (3, 1))
+        self.assertEqual(stats.time_spent_per_quadrant, {'2': 660, '4': 30})
+
+    def test_locked_fallback_matches_json_update(self):
+        deltas = [({'total_pomodoros_completed': 1}, {1: 100}), ({'interruptions_count': 1}, {1: 50, 3: 20})]
+        for counters, quadrant_seconds in deltas:
+            apply_deltas(self.user.id, date(2025, 5, 1), counters, quadrant_seconds)
+        with mock.patch('analytics.aggregator._supports_json_increment', return_value=False):
+            for counters, quadrant_seconds in deltas:
+                apply_deltas(self.user.id, date(2025, 5, 2), counters, quadrant_seconds)
+
+        first, second = (ProductivityStats.objects.get(user=self.user, date=day)
+                         for day in (date(2025, 5, 1), date(2025, 5, 2)))
+        self.assertEqual(first.time_spent_per_quadrant, {'1': 150, '3': 20})
+        self.assertEqual(second.time_spent_per_quadrant, first.time_spent_per_quadrant)
+        self.assertEqual((second.total_pomodoros_completed, second.interruptions_count), (1, 1))
+
+    def test_concurrent_insert_becomes_update(self):
+        day = date(2025, 5, 3)
+        apply_deltas(self.user.id, day, {'total_pomodoros_completed': 1})
+        update = QuerySet.update
+        calls = []
+
+        def missed_first(queryset, **kwargs):
+            # Первый UPDATE "не нашел" строку: ее создал параллельный запрос
+            calls.append(kwargs)
+            return 0 if len(calls) == 1 else update(queryset, **kwargs)
 
-# Create your tests here.
+        with mock.patch.object(QuerySet, 'update', missed_first):
+            apply_deltas(self.user.id, day, {'total_pomodoros_completed': 2})
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(ProductivityStats.objects.get(user=self.user, date=day).total_pomodoros_completed, 3)
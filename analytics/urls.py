@@ -0,0 +1,10 @@
+# analytics/urls.py
+from django.urls import path
+from . import views
+
+app_name = 'analytics'
+
+urlpatterns = [
+    # Ряды статистики по дням, неделям и месяцам (только из агрегатов)
+    path('api/series/', views.stats_series, name='stats_series'),
+]
@@ -1,3 +1,27 @@
-from django.shortcuts import render
+# analytics/views.py
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.utils import timezone
 
-# Create your views here.
+from pomodoro.models import user_tzinfo
+from .dashboard import dashboard_series, parse_range
+
+
+@login_required
+def stats_series(request):
+    """
+    API: ряд статистики пользователя для панели аналитики.
+    ?granularity=day|week|month&start=YYYY-MM-DD&end=YYYY-MM-DD - диапазон
+    расширяется до целых периодов. Читаются только агрегаты (см. analytics/dashboard.py).
+    """
+    granularity = request.GET.get('granularity', 'day')
+    today = timezone.localdate(timezone=user_tzinfo(request.user.id))
+    try:
+        start, end = parse_range(granularity, request.GET.get('start'), request.GET.get('end'), today)
+    except ValueError as error:
+        return JsonResponse({
+            'success': False,
+            'error': str(error)
+        }, status=400)
+
+    return JsonResponse({'success': True, **dashboard_series(request.user.id, granularity, start, end)})
@@ -0,0 +1,113 @@
+# core/events.py
+"""
+Публикация событий пользователя для потока Server-Sent Events (см. core.views.event_stream).
+
+События: изменения задач (новая версия матрицы), начало и завершение
+Pomodoro-сессий, смена состояния таймера. Публикуются после коммита
+транзакции, чтобы клиент, получивший событие, уже видел изменения в базе.
+
+Брокер выбирается настройкой EVENTS_BROKER (путь к классу). По умолчанию -
+InProcessBroker: подписчики живут в памяти процесса, поэтому события
+доходят только до клиентов того же процесса. Для нескольких воркеров
+нужен брокер с общим каналом (Redis pub/sub, LISTEN/NOTIFY PostgreSQL)
+с тем же интерфейсом, что у EventBroker.
+"""
+import asyncio
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+DEFAULT_BROKER = 'core.events.InProcessBroker'
+
+# Сколько неотправленных событий держим на одного подписчика
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class EventBroker:
+    """Интерфейс брокера событий"""
+
+    def publish(self, user_id, event, data):
+        """Отправляет событие всем подпискам пользователя. Может вызываться из любого потока"""
+        raise NotImplementedError
+
+    def subscribe(self, user_id):
+        """Подписка на события пользователя: объект с async get() и close()"""
+        raise NotImplementedError
+
+
+class Subscription:
+    """
+    Очередь событий одного клиента в его цикле событий asyncio.
+    При переполнении (клиент не успевает читать) события отбрасываются,
+    а клиенту приходит 'resync' - перечитать состояние целиком.
+    """
+
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def put(self, message):
+        # Вызывается в цикле событий подписчика (через call_soon_threadsafe)
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self):
+        """Следующее событие (event, data)"""
+        if self.overflowed and self.queue.empty():
+            self.overflowed = False
+            return 'resync', {}
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker(EventBroker):
+    """Брокер в памяти процесса: подписки - очереди asyncio, без потока на клиента"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def publish(self, user_id, event, data):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, (event, data))
+            except RuntimeError:
+                # Цикл событий подписчика уже закрыт
+                self.unsubscribe(subscription)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    """Брокер событий процесса (класс из настройки EVENTS_BROKER)"""
+    return import_string(getattr(settings, 'EVENTS_BROKER', DEFAULT_BROKER))()
+
+
+def publish_event(user_id, event, data):
+    """Публикует событие пользователя после коммита текущей транзакции (вне транзакции - сразу)"""
+    transaction.on_commit(lambda: get_broker().publish(user_id, event, data))
@@ -1,3 +1,94 @@
+import asyncio
+
+from django.contrib.auth.models import User
 from django.test import TestCase
 
-# Create your tests here.
+from .events import InProcessBroker, SUBSCRIBER_QUEUE_SIZE, get_broker
+
+
+async def drain():
+    """Дает циклу событий выполнить отложенные call_soon_threadsafe из publish"""
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+class InProcessBrokerTests(TestCase):
+    """Брокер в памяти: доставка подпискам пользователя, отписка, resync при переполнении"""
+
+    def test_publish_reaches_only_users_subscriptions(self):
+        async def scenario():
+            broker = InProcessBroker()
+            first, second, other = broker.subscribe(1), broker.subscribe(1), broker.subscribe(2)
+            broker.publish(1, 'tasks', {'version': 7})
+            await drain()
+            self.assertEqual(await first.get(), ('tasks', {'version': 7}))
+            self.assertEqual(await second.get(), ('tasks', {'version': 7}))
+            self.assertTrue(other.queue.empty())
+
+            first.close()
+            second.close()
+            other.close()
+            self.assertEqual(broker._subscriptions, {})
+            # Публикация без подписчиков ничего не делает
+            broker.publish(1, 'tasks', {'version': 8})
+
+        asyncio.run(scenario())
+
+    def test_overflow_turns_into_resync(self):
+        async def scenario():
+            broker = InProcessBroker()
+            subscription = broker.subscribe(1)
+            for number in range(SUBSCRIBER_QUEUE_SIZE + 5):
+                broker.publish(1, 'tasks', {'version': number})
+            await drain()
+
+            # Помещается SUBSCRIBER_QUEUE_SIZE событий, лишние заменяются одним resync
+            received = [await subscription.get() for _ in range(SUBSCRIBER_QUEUE_SIZE + 1)]
+            self.assertEqual(received[-2], ('tasks', {'version': SUBSCRIBER_QUEUE_SIZE - 1}))
+            self.assertEqual(received[-1], ('resync', {}))
+            self.assertFalse(subscription.overflowed)
+            subscription.close()
+
+        asyncio.run(scenario())
+
+
+class EventStreamTests(TestCase):
+    """Поток /events/: события пользователя под ASGI, 501 под WSGI"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('listener', password='secret-pass-123')
+
+    def test_wsgi_request_is_not_streamed(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/events/')
+        self.assertEqual(response.status_code, 501)
+        self.assertFalse(response.json()['success'])
+
+    async def test_stream_sends_events_and_resync(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get('/events/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        chunks = aiter(response.streaming_content)
+        # Подписка создается с первым фрагментом ответа
+        self.assertEqual(await anext(chunks), b'retry: 5000\n\n')
+        broker = get_broker()
+        broker.publish(self.user.id, 'tasks', {'version': 3})
+        self.assertEqual(await anext(chunks), b'event: tasks\ndata: {"version": 3}\n\n')
+
+        # Клиент не успевает читать: после очереди событий приходит resync
+        for number in range(SUBSCRIBER_QUEUE_SIZE + 1):
+            broker.publish(self.user.id, 'tasks', {'version': number})
+        await drain()
+        events = [await anext(chunks) for _ in range(SUBSCRIBER_QUEUE_SIZE + 1)]
+        self.assertEqual(events[-1], b'event: resync\ndata: {}\n\n')
+
+        # При отключении клиента сервер отменяет ожидание - подписка закрывается
+        waiting = asyncio.ensure_future(anext(chunks))
+        await drain()
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        self.assertNotIn(self.user.id, broker._subscriptions)
@@ -38,4 +38,8 @@ urlpatterns = [
     # views.pomodoro_technique - функция pomodoro_technique из views.py
     # name='pomodoro_technique' - имя для шаблонов
     path('pomodoro-technique/', views.pomodoro_technique, name='pomodoro_technique'),
-]
\ No newline at end of file
+
+    # Поток событий пользователя (Server-Sent Events) - http://127.0.0.1:8000/events/
+    # Асинхронное представление: запускайте проект через ASGI (task_system/asgi.py)
+    path('events/', views.event_stream, name='event_stream'),
+]
@@ -1,7 +1,20 @@
 # core/views.py
+import asyncio
+import json
+
 # Импортируем функцию render из модуля django.shortcuts
 # render - это "сборщик" который объединяет HTML-шаблон с данными
 from django.shortcuts import render
+from django.contrib.auth.decorators import login_required
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+
+from .events import get_broker
+
+# Комментарий-пинг раз в 15 секунд: прокси не закрывают "молчащее" соединение,
+# а сервер узнает об отключившемся клиенте
+EVENT_STREAM_KEEPALIVE = 15
 
 
 # Создаем функцию-представление для главной страницы
@@ -187,4 +200,49 @@ def pomodoro_technique(request):
     }
 
     # Возвращаем страницу обучения методу Pomodoro
-    return render(request, 'core/pomodoro_technique.html', context)
\ No newline at end of file
+    return render(request, 'core/pomodoro_technique.html', context)
+
+
+@login_required
+async def event_stream(request):
+    """
+    Поток Server-Sent Events пользователя: изменения задач, сессии и таймер.
+
+    Асинхронное представление: под ASGI каждое соединение - это корутина,
+    ожидающая очередь событий, а не поток WSGI, поэтому воркер держит тысячи
+    простаивающих клиентов. При отключении клиента корутина отменяется и
+    подписка закрывается.
+
+    Под WSGI (в том числе runserver) бесконечный ответ занял бы поток воркера
+    навсегда, поэтому там поток не открывается: ответ 501. Браузер на ошибку
+    не переподключается, и страницы переходят на периодическую проверку изменений.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({
+            'success': False,
+            'error': 'Поток событий доступен только при запуске через ASGI'
+        }, status=501)
+
+    user = await request.auser()
+
+    async def events():
+        # Подписываемся, только когда ответ действительно начали отправлять
+        subscription = get_broker().subscribe(user.id)
+        try:
+            # Через сколько миллисекунд браузеру переподключаться после обрыва
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(subscription.get(), EVENT_STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f'event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n'
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Отключаем буферизацию ответа в nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -2,7 +2,7 @@
 from django.contrib import admin
 
 # Импортируем модель PomodoroSession из текущего приложения
-from .models import PomodoroSession
+from .models import PomodoroSession, ActiveTimer
 
 
 # Создаем класс для настройки отображения модели PomodoroSession в админке
@@ -66,4 +66,22 @@ class PomodoroSessionAdmin(admin.ModelAdmin):
 
 # Регистрируем модель PomodoroSession в админ-панели с нашим кастомным классом
 # Теперь сессии будут отображаться с нашими настройками безопасности
-admin.site.register(PomodoroSession, PomodoroSessionAdmin)
\ No newline at end of file
+admin.site.register(PomodoroSession, PomodoroSessionAdmin)
+
+
+# Активные таймеры - только просмотр: ими управляют клиенты через API таймера
+class ActiveTimerAdmin(admin.ModelAdmin):
+    list_display = ('user', 'task', 'phase', 'started_at', 'deadline', 'paused_remaining')
+    list_filter = ('phase',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user', 'task')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+admin.site.register(ActiveTimer, ActiveTimerAdmin)
\ No newline at end of file
@@ -0,0 +1,47 @@
+# pomodoro/backfill.py
+"""
+Заполнение duration_seconds и local_date у сессий, созданных до появления этих колонок.
+
+Сессии читаются пакетами по возрастанию id (по первичному ключу, без OFFSET),
+каждый пакет пишется одним bulk_update в своей короткой транзакции - таблицу
+можно обрабатывать на работающем сервере. Повторный запуск продолжает с
+незаполненных строк и ничего не пересчитывает заново.
+"""
+from django.db import transaction
+from django.db.models import Q
+
+from .models import PomodoroSession, ArchivedPomodoroSession, session_duration, session_local_date, users_tzinfo
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def _backfill_model(model, batch_size):
+    missing = Q(local_date__isnull=True) | Q(end_time__isnull=False, duration_seconds__isnull=True)
+    filled, last_id = 0, 0
+
+    while True:
+        batch = list(
+            model.objects.filter(missing, id__gt=last_id).order_by('id')
+            .only('id', 'user_id', 'start_time', 'end_time', 'duration_seconds', 'local_date')[:batch_size]
+        )
+        if not batch:
+            return filled
+        last_id = batch[-1].id
+
+        time_zones = users_tzinfo({session.user_id for session in batch})
+        for session in batch:
+            session.local_date = session_local_date(session.start_time, time_zones[session.user_id])
+            if session.end_time is not None:
+                session.duration_seconds = session_duration(session.start_time, session.end_time)
+
+        with transaction.atomic():
+            model.objects.bulk_update(batch, ['local_date', 'duration_seconds'])
+        filled += len(batch)
+
+
+def backfill_session_fields(batch_size=BACKFILL_BATCH_SIZE):
+    """Заполняет колонки в рабочей таблице и в архиве. Возвращает {'sessions', 'archived'}"""
+    return {
+        'sessions': _backfill_model(PomodoroSession, batch_size),
+        'archived': _backfill_model(ArchivedPomodoroSession, batch_size),
+    }
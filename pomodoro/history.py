@@ -0,0 +1,103 @@
+# pomodoro/history.py
+"""
+История Pomodoro-сессий пользователя: постраничный просмотр и полная выгрузка.
+
+Страницы листаются по ключу (start_time, id), а не через OFFSET: следующая
+страница - это сессии "раньше последней показанной", и запрос идет по индексу
+(user, -start_time, -id) одинаково быстро на любой глубине истории.
+
+Выгрузка (CSV или JSONL) читает рабочую таблицу и архив двумя потоковыми
+курсорами (iterator) в одном порядке и сливает их через heapq.merge - память
+не зависит от числа сессий.
+"""
+import csv
+import heapq
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from tasks.archive import sessions_with_archive
+from .models import PomodoroSession, ArchivedPomodoroSession
+
+HISTORY_PAGE_SIZE = 50
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = ('csv', 'jsonl')
+HISTORY_FIELDS = ('id', 'task_id', 'task__title', 'session_type', 'start_time', 'end_time', 'status')
+EXPORT_COLUMNS = ('id', 'task_id', 'task_title', 'session_type', 'start_time', 'end_time', 'status')
+
+SESSION_TYPES = dict(PomodoroSession.SESSION_TYPES)
+STATUSES = dict(PomodoroSession.STATUS_CHOICES)
+
+
+def encode_cursor(session):
+    """Ключ страницы из последней показанной сессии: "<start_time ISO>_<id>" """
+    return f"{session['start_time'].isoformat()}_{session['id']}"
+
+
+def decode_cursor(value):
+    """Разбирает ключ страницы в (start_time, id); None - если ключа нет или он неверный"""
+    if not value:
+        return None
+    start_time, _, session_id = value.rpartition('_')
+    start_time = parse_datetime(start_time)
+    if start_time is None or not session_id.isdigit():
+        return None
+    return start_time, int(session_id)
+
+
+def history_page(user, cursor=None, limit=HISTORY_PAGE_SIZE):
+    """
+    Страница истории (вместе с архивом), новые сессии первыми.
+    Возвращает (сессии, ключ следующей страницы или None).
+    """
+    conditions = []
+    if cursor is not None:
+        start_time, session_id = cursor
+        conditions.append(Q(start_time__lt=start_time) | Q(start_time=start_time, id__lt=session_id))
+
+    # Берем на одну сессию больше: так без COUNT видно, есть ли следующая страница
+    sessions = list(
+        sessions_with_archive(user, HISTORY_FIELDS, *conditions)
+        .order_by('-start_time', '-id')[:limit + 1]
+    )
+    for session in sessions:
+        session['session_type_display'] = SESSION_TYPES.get(session['session_type'], session['session_type'])
+        session['status_display'] = STATUSES.get(session['status'], session['status'])
+
+    if len(sessions) > limit:
+        sessions = sessions[:limit]
+        return sessions, encode_cursor(sessions[-1])
+    return sessions, None
+
+
+def iter_sessions(user, chunk_size=EXPORT_CHUNK_SIZE):
+    """Все сессии пользователя (рабочие и архивные) потоком, новые первыми"""
+    streams = [
+        model.objects.filter(user=user).order_by('-start_time', '-id')
+        .values_list(*HISTORY_FIELDS).iterator(chunk_size=chunk_size)
+        for model in (PomodoroSession, ArchivedPomodoroSession)
+    ]
+    # Обе выборки уже упорядочены - слияние держит в памяти по одной строке из каждой
+    return heapq.merge(*streams, key=lambda row: (row[4], row[0]), reverse=True)
+
+
+class _Echo:
+    """Псевдофайл для csv.writer: write возвращает строку, а не пишет ее"""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(user, fmt='csv'):
+    """Строки выгрузки истории в формате fmt (csv или jsonl) - для StreamingHttpResponse"""
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(EXPORT_COLUMNS)
+        for row in iter_sessions(user):
+            yield writer.writerow(row)
+        return
+
+    for row in iter_sessions(user):
+        yield json.dumps(dict(zip(EXPORT_COLUMNS, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
@@ -0,0 +1,179 @@
+# pomodoro/ingest.py
+"""
+Пакетный прием событий Pomodoro-сессий от клиентов (в том числе накопленных офлайн).
+
+Событие - словарь:
+    {"type": "start", "key": "<ключ сессии>", "task_id": 1, "session_type": "work", "at": "<ISO-время>"}
+    {"type": "end", "key": "<ключ сессии>", "status": "completed", "at": "<ISO-время>"}
+
+Ключ сессии создает клиент; он же служит ключом идемпотентности: сессия
+с этим ключом у пользователя может быть только одна (уникальный индекс
+user + client_key), а завершить ее можно только один раз. Поэтому повторная
+отправка пакета после обрыва связи ничего не дублирует.
+
+Весь пакет пишется одной транзакцией: новые сессии - одним bulk_create,
+завершения - одним bulk_update, счетчики задач - одним UPDATE на задачу.
+"""
+from collections import Counter
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from analytics.aggregator import record_sessions
+from core.events import publish_event
+from tasks.concurrency import increment_completed_pomodoros
+from tasks.models import Task
+from .models import PomodoroSession, CLIENT_END_STATUSES, session_duration, session_local_date, user_tzinfo
+
+MAX_EVENTS_PER_BATCH = 500
+# Часы клиента могут спешить: время из будущего больше этого допуска заменяется на "сейчас"
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+SESSION_TYPES = dict(PomodoroSession.SESSION_TYPES)
+
+
+def _parse_time(value, now):
+    moment = parse_datetime(value) if isinstance(value, str) else None
+    if moment is None:
+        raise ValueError('Неверное время события')
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, dt_timezone.utc)
+    return min(moment, now) if moment > now + MAX_CLOCK_SKEW else moment
+
+
+def _validate(event, now):
+    """Проверяет событие и приводит поля к нужным типам. Неверное событие - ValueError"""
+    if not isinstance(event, dict):
+        raise ValueError('Событие должно быть объектом')
+
+    key = event.get('key')
+    if not isinstance(key, str) or not 0 < len(key) <= 64:
+        raise ValueError('Неверный ключ сессии')
+
+    kind = event.get('type')
+    if kind == 'start':
+        session_type = event.get('session_type', 'work')
+        if session_type not in SESSION_TYPES:
+            raise ValueError('Неверный тип сессии')
+        return {'type': kind, 'key': key, 'task_id': int(event.get('task_id')),
+                'session_type': session_type, 'at': _parse_time(event.get('at'), now)}
+    if kind == 'end':
+        status = event.get('status', 'completed')
+        if status not in CLIENT_END_STATUSES:
+            raise ValueError('Неверный статус сессии')
+        return {'type': kind, 'key': key, 'status': status, 'at': _parse_time(event.get('at'), now)}
+    raise ValueError('Неизвестный тип события')
+
+
+def ingest_session_events(user, events):
+    """
+    Применяет пакет событий сессий пользователя. Возвращает список результатов
+    в порядке событий: {'key', 'type', 'result'}, где result - 'created',
+    'ended', 'duplicate' (уже применено раньше) или 'error' (с полем 'error').
+    """
+    now = timezone.now()
+    results = [None] * len(events)
+    starts, ends = {}, {}
+
+    for index, event in enumerate(events):
+        try:
+            event = _validate(event, now)
+        except (TypeError, ValueError) as e:
+            key = event.get('key') if isinstance(event, dict) else None
+            results[index] = {'key': key, 'type': None, 'result': 'error', 'error': str(e)}
+            continue
+        # Повтор того же события внутри пакета применяется один раз
+        target = starts if event['type'] == 'start' else ends
+        if event['key'] in target:
+            results[index] = {'key': event['key'], 'type': event['type'], 'result': 'duplicate'}
+        else:
+            target[event['key']] = (index, event)
+
+    own_tasks = set(Task.objects.filter(
+        user=user,
+        id__in={event['task_id'] for _, event in starts.values()}
+    ).values_list('id', flat=True))
+
+    tzinfo = user_tzinfo(user.id)
+    progress = {}
+    with transaction.atomic():
+        keys = set(starts) | set(ends)
+        sessions = {
+            session.client_key: session
+            for session in PomodoroSession.objects.select_for_update().filter(user=user, client_key__in=keys)
+            .only('id', 'client_key', 'task_id', 'session_type', 'start_time', 'end_time', 'status',
+                  'duration_seconds', 'local_date')
+        }
+
+        created = []
+        for key, (index, event) in starts.items():
+            if key in sessions:
+                results[index] = {'key': key, 'type': 'start', 'result': 'duplicate'}
+            elif event['task_id'] not in own_tasks:
+                results[index] = {'key': key, 'type': 'start', 'result': 'error', 'error': 'Задача не найдена'}
+            else:
+                session = PomodoroSession(
+                    user=user,
+                    task_id=event['task_id'],
+                    session_type=event['session_type'],
+                    start_time=event['at'],
+                    local_date=session_local_date(event['at'], tzinfo),
+                    status='active',
+                    client_key=key,
+                )
+                created.append(session)
+                sessions[key] = session
+                results[index] = {'key': key, 'type': 'start', 'result': 'created'}
+
+        ended, finished, completed_work = [], [], Counter()
+        for key, (index, event) in ends.items():
+            session = sessions.get(key)
+            if session is None:
+                results[index] = {'key': key, 'type': 'end', 'result': 'error', 'error': 'Сессия не найдена'}
+                continue
+            if session.end_time is not None:
+                results[index] = {'key': key, 'type': 'end', 'result': 'duplicate'}
+                continue
+            session.end_time = max(event['at'], session.start_time)
+            session.duration_seconds = session_duration(session.start_time, session.end_time)
+            session.status = event['status']
+            # Сессия из этого же пакета еще не записана - она уйдет в bulk_create уже завершенной
+            if session.pk is not None:
+                ended.append(session)
+            if session.session_type == 'work' and session.status == 'completed':
+                completed_work[session.task_id] += 1
+            finished.append(session)
+            results[index] = {'key': key, 'type': 'end', 'result': 'ended'}
+
+        # Без ignore_conflicts: если параллельный запрос с теми же ключами успел раньше,
+        # пакет откатывается целиком (IntegrityError), и повтор клиента получит 'duplicate'
+        PomodoroSession.objects.bulk_create(created)
+        PomodoroSession.objects.bulk_update(ended, ['end_time', 'duration_seconds', 'status'])
+
+        # Дневная статистика: по одному UPDATE на день пакета
+        quadrants = dict(Task.objects.filter(id__in={session.task_id for session in finished})
+                         .values_list('id', 'quadrant_id'))
+        record_sessions(user.id, [
+            (session.local_date or session_local_date(session.start_time, tzinfo), session.session_type,
+             session.status, session.duration_seconds, quadrants.get(session.task_id))
+            for session in finished
+        ])
+
+        for task_id, count in completed_work.items():
+            completed, estimated = increment_completed_pomodoros(task_id, user.id, count)
+            progress[task_id] = {
+                'completed': completed,
+                'total': estimated,
+                'percentage': completed / estimated * 100 if estimated > 0 else 0,
+            }
+
+    for task_id, task_progress in progress.items():
+        publish_event(user.id, 'session', {
+            'action': 'ended',
+            'task_id': task_id,
+            'task_progress': task_progress,
+        })
+
+    return results
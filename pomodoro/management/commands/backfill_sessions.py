@@ -0,0 +1,18 @@
+# pomodoro/management/commands/backfill_sessions.py
+from django.core.management.base import BaseCommand
+
+from pomodoro.backfill import backfill_session_fields, BACKFILL_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Заполняет длительность и дату (по часовому поясу пользователя) у старых Pomodoro-сессий'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE,
+                            help='Сколько сессий обновлять одной транзакцией')
+
+    def handle(self, *args, **options):
+        report = backfill_session_fields(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Заполнено сессий: {report['sessions']}, архивных сессий: {report['archived']}"
+        ))
@@ -0,0 +1,23 @@
+# pomodoro/management/commands/reap_sessions.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from pomodoro.reaper import reap_abandoned_sessions, REAPER_BATCH_SIZE, REAPER_GRACE
+
+
+class Command(BaseCommand):
+    help = 'Закрывает брошенные Pomodoro-сессии (не завершенные после окончания фазы) со статусом "Брошена"'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=REAPER_BATCH_SIZE,
+                            help='Сколько сессий закрывать одним UPDATE')
+        parser.add_argument('--grace', type=int, default=int(REAPER_GRACE.total_seconds() // 60),
+                            help='Запас в минутах сверх длительности фазы')
+
+    def handle(self, *args, **options):
+        reaped = reap_abandoned_sessions(
+            batch_size=options['batch_size'],
+            grace=timedelta(minutes=options['grace']),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Закрыто брошенных сессий: {reaped}'))
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pomodoro', '0002_add_hot_query_indexes'),
+        ('tasks', '0010_archived_task'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPomodoroSession',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('session_type', models.CharField(choices=[('work', 'Работа'), ('short_break', 'Короткий перерыв'), ('long_break', 'Длинный перерыв')], max_length=15, verbose_name='Тип сессии')),
+                ('start_time', models.DateTimeField(verbose_name='Время начала')),
+                ('end_time', models.DateTimeField(blank=True, null=True, verbose_name='Время окончания')),
+                ('status', models.CharField(choices=[('completed', 'Завершена'), ('interrupted', 'Прервана'), ('cancelled', 'Отменена')], max_length=12, verbose_name='Статус')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tasks.archivedtask', verbose_name='Задача')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Архивная Pomodoro сессия',
+                'verbose_name_plural': 'Архивные Pomodoro сессии',
+                'indexes': [models.Index(fields=['user', '-start_time'], name='archived_session_start_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('pomodoro', '0003_archived_session'),
+        ('tasks', '0010_archived_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActiveTimer',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('phase', models.CharField(choices=[('work', 'Работа'), ('short_break', 'Короткий перерыв'), ('long_break', 'Длинный перерыв')], default='work', max_length=15, verbose_name='Фаза')),
+                ('duration', models.DurationField(verbose_name='Длительность фазы')),
+                ('started_at', models.DateTimeField(verbose_name='Начало фазы')),
+                ('deadline', models.DateTimeField(blank=True, null=True, verbose_name='Окончание фазы')),
+                ('paused_remaining', models.DurationField(blank=True, null=True, verbose_name='Остаток на паузе')),
+                ('completed_cycles', models.PositiveSmallIntegerField(default=0, verbose_name='Завершено циклов')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tasks.task', verbose_name='Задача')),
+            ],
+            options={
+                'verbose_name': 'Активный таймер',
+                'verbose_name_plural': 'Активные таймеры',
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:18
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pomodoro', '0004_active_timer'),
+        ('tasks', '0010_archived_task'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pomodorosession',
+            name='client_key',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name='Ключ клиента'),
+        ),
+        migrations.AlterField(
+            model_name='pomodorosession',
+            name='start_time',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время начала'),
+        ),
+        migrations.AddConstraint(
+            model_name='pomodorosession',
+            constraint=models.UniqueConstraint(fields=('user', 'client_key'), name='session_user_client_key_uniq'),
+        ),
+    ]
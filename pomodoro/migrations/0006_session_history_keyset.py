@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pomodoro', '0005_session_client_key'),
+        ('tasks', '0010_archived_task'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='archivedpomodorosession',
+            name='archived_session_start_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='pomodorosession',
+            name='session_user_start_idx',
+        ),
+        migrations.AddIndex(
+            model_name='archivedpomodorosession',
+            index=models.Index(fields=['user', '-start_time', '-id'], name='archived_session_start_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pomodorosession',
+            index=models.Index(fields=['user', '-start_time', '-id'], name='session_user_start_id_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pomodoro', '0006_session_history_keyset'),
+        ('tasks', '0010_archived_task'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedpomodorosession',
+            name='status',
+            field=models.CharField(choices=[('active', 'Идет'), ('completed', 'Завершена'), ('interrupted', 'Прервана'), ('cancelled', 'Отменена'), ('abandoned', 'Брошена')], max_length=12, verbose_name='Статус'),
+        ),
+        migrations.AlterField(
+            model_name='pomodorosession',
+            name='status',
+            field=models.CharField(choices=[('active', 'Идет'), ('completed', 'Завершена'), ('interrupted', 'Прервана'), ('cancelled', 'Отменена'), ('abandoned', 'Брошена')], default='active', max_length=12, verbose_name='Статус'),
+        ),
+        migrations.AddIndex(
+            model_name='pomodorosession',
+            index=models.Index(condition=models.Q(('end_time__isnull', True)), fields=['start_time'], name='session_open_start_idx'),
+        ),
+    ]
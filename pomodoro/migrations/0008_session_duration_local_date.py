@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pomodoro', '0007_session_active_status'),
+        ('tasks', '0010_archived_task'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedpomodorosession',
+            name='duration_seconds',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Длительность (сек)'),
+        ),
+        migrations.AddField(
+            model_name='archivedpomodorosession',
+            name='local_date',
+            field=models.DateField(blank=True, null=True, verbose_name='Дата (по времени пользователя)'),
+        ),
+        migrations.AddField(
+            model_name='pomodorosession',
+            name='duration_seconds',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Длительность (сек)'),
+        ),
+        migrations.AddField(
+            model_name='pomodorosession',
+            name='local_date',
+            field=models.DateField(blank=True, null=True, verbose_name='Дата (по времени пользователя)'),
+        ),
+        migrations.AddIndex(
+            model_name='pomodorosession',
+            index=models.Index(fields=['user', 'local_date'], name='session_user_date_idx'),
+        ),
+    ]
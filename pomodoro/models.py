@@ -1,5 +1,10 @@
+from datetime import timedelta
+
 from django.db import models
 from django.contrib.auth.models import User  # Импортируем встроенную модель пользователя
+from django.utils import timezone
+
+from users.models import UserSettings, get_time_zone, default_time_zone
 
 
 # Создаем модель для отслеживания Pomodoro рабочих сессий
@@ -20,9 +25,11 @@ class PomodoroSession(models.Model):
     # Создаем список возможных статусов сессии
     STATUS_CHOICES = [
         # (значение в базе, человекочитаемое название)
+        ('active', 'Идет'),  # Сессия начата и еще не завершена
         ('completed', 'Завершена'),  # Сессия успешно завершена
         ('interrupted', 'Прервана'),  # Сессия была прервана пользователем
         ('cancelled', 'Отменена'),  # Сессия была отменена
+        ('abandoned', 'Брошена'),  # Сессию не завершили (закрыли вкладку) - закрыта фоновой задачей
     ]
 
     # Связь "многие-к-одному" с моделью Task из приложения tasks
@@ -40,8 +47,9 @@ class PomodoroSession(models.Model):
     session_type = models.CharField(max_length=15, choices=SESSION_TYPES, default='work', verbose_name="Тип сессии")
 
     # Время начала сессии
-    # auto_now_add=True - автоматически устанавливает текущее время при создании объекта
-    start_time = models.DateTimeField(auto_now_add=True, verbose_name="Время начала")
+    # default=timezone.now - текущее время при создании; клиент может передать свое время
+    # (события, накопленные офлайн, см. pomodoro/ingest.py)
+    start_time = models.DateTimeField(default=timezone.now, verbose_name="Время начала")
 
     # Время окончания сессии
     # null=True - в базе данных поле может содержать NULL (сессия еще не завершена)
@@ -50,8 +58,20 @@ class PomodoroSession(models.Model):
 
     # Статус сессии с выбором из предопределенных значений
     # choices=STATUS_CHOICES - ограничивает возможные значения списком выше
-    # default='completed' - значение по умолчанию
-    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default='completed', verbose_name="Статус")
+    # default='active' - значение по умолчанию: сессия идет, пока ее не завершат
+    # (незавершенные сессии закрывает pomodoro/reaper.py)
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default='active', verbose_name="Статус")
+
+    # Длительность сессии в секундах (end_time - start_time): заполняется при завершении,
+    # чтобы метрики по времени не считали разность дат для каждой строки
+    duration_seconds = models.PositiveIntegerField(null=True, blank=True, verbose_name="Длительность (сек)")
+
+    # День начала сессии в часовом поясе пользователя: выборки "за день" идут по индексу
+    # (user, local_date), а не через преобразование start_time в дату для каждой строки
+    local_date = models.DateField(null=True, blank=True, verbose_name="Дата (по времени пользователя)")
+
+    # Ключ идемпотентности, созданный клиентом: повтор того же события не создает вторую сессию
+    client_key = models.CharField(max_length=64, null=True, blank=True, verbose_name="Ключ клиента")
 
     # Класс Meta для дополнительных настроек модели
     class Meta:
@@ -61,8 +81,143 @@ class PomodoroSession(models.Model):
         # Название модели во множественном числе для отображения в админке
         verbose_name_plural = "Pomodoro сессии"
 
+        # Составные индексы под горячие запросы страницы таймера и истории сессий
+        indexes = [
+            # task_detail: сессии пользователя по задаче за сегодня и последние сессии задачи
+            models.Index(fields=['user', 'task', 'start_time'], name='session_user_task_start_idx'),
+            # session_history: все сессии пользователя, новые первыми; id - вторая часть ключа страницы
+            models.Index(fields=['user', '-start_time', '-id'], name='session_user_start_id_idx'),
+            # task_detail и статистика: сессии пользователя за день
+            models.Index(fields=['user', 'local_date'], name='session_user_date_idx'),
+            # reaper: только открытые сессии - индекс остается маленьким
+            models.Index(fields=['start_time'], name='session_open_start_idx',
+                         condition=models.Q(end_time__isnull=True)),
+        ]
+        constraints = [
+            # Дедупликация повторно присланных событий; сессии без ключа не ограничиваются
+            models.UniqueConstraint(fields=['user', 'client_key'], name='session_user_client_key_uniq'),
+        ]
+
     # Метод для строкового представления объекта
     def __str__(self):
         # Возвращаем строку с типом сессии и названием задачи
         # get_session_type_display() - метод Django для получения человекочитаемого значения choice поля
-        return f"{self.get_session_type_display()} сессия для {self.task.title}"
\ No newline at end of file
+        return f"{self.get_session_type_display()} сессия для {self.task.title}"
+
+
+class ArchivedPomodoroSession(models.Model):
+    """
+    Сессия архивной задачи: переносится в архив вместе с задачей (см. tasks/archive.py).
+    id сохраняется прежним. В архиве сессии только читаются.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    task = models.ForeignKey('tasks.ArchivedTask', on_delete=models.CASCADE, verbose_name="Задача")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Пользователь")
+    session_type = models.CharField(max_length=15, choices=PomodoroSession.SESSION_TYPES, verbose_name="Тип сессии")
+    start_time = models.DateTimeField(verbose_name="Время начала")
+    end_time = models.DateTimeField(null=True, blank=True, verbose_name="Время окончания")
+    status = models.CharField(max_length=12, choices=PomodoroSession.STATUS_CHOICES, verbose_name="Статус")
+    duration_seconds = models.PositiveIntegerField(null=True, blank=True, verbose_name="Длительность (сек)")
+    local_date = models.DateField(null=True, blank=True, verbose_name="Дата (по времени пользователя)")
+
+    class Meta:
+        verbose_name = "Архивная Pomodoro сессия"
+        verbose_name_plural = "Архивные Pomodoro сессии"
+        indexes = [
+            models.Index(fields=['user', '-start_time', '-id'], name='archived_session_start_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_session_type_display()} сессия (архив) для задачи {self.task_id}"
+
+
+def user_tzinfo(user_id):
+    """Часовой пояс пользователя из его настроек (без настроек - часовой пояс проекта)"""
+    name = UserSettings.objects.filter(user_id=user_id).values_list('time_zone', flat=True).first()
+    return get_time_zone(name or default_time_zone())
+
+
+def users_tzinfo(user_ids):
+    """Часовые пояса нескольких пользователей одним запросом: {user_id: tzinfo}"""
+    names = dict(UserSettings.objects.filter(user_id__in=user_ids).values_list('user_id', 'time_zone'))
+    return {user_id: get_time_zone(names.get(user_id) or default_time_zone()) for user_id in user_ids}
+
+
+def session_local_date(start_time, tzinfo):
+    """День начала сессии в часовом поясе пользователя"""
+    return timezone.localtime(start_time, tzinfo).date()
+
+
+# Статусы, с которыми сессию может завершить клиент. 'abandoned' ставит только reaper
+# (время брошенной сессии неизвестно и в статистику не идет), 'active' - не завершение
+CLIENT_END_STATUSES = ('completed', 'interrupted', 'cancelled')
+
+
+def session_duration(start_time, end_time):
+    """Длительность сессии в целых секундах (не меньше нуля)"""
+    return max(0, int((end_time - start_time).total_seconds()))
+
+
+# Поле настроек пользователя с длительностью каждой фазы таймера (в минутах)
+PHASE_DURATION_SETTINGS = {
+    'work': 'pomodoro_duration',
+    'short_break': 'short_break_duration',
+    'long_break': 'long_break_duration',
+}
+
+
+class ActiveTimer(models.Model):
+    """
+    Текущий таймер пользователя - источник истины для всех его вкладок и устройств.
+
+    Хранится не "сколько осталось", а момент окончания фазы (deadline): клиент
+    сам считает остаток как deadline - сейчас, без запросов каждую секунду и без
+    дрейфа в фоновых вкладках. На паузе deadline пуст, а остаток лежит в
+    paused_remaining. Ключ таблицы - пользователь, поэтому состояние читается
+    одним поиском по первичному ключу.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, verbose_name="Пользователь")
+    task = models.ForeignKey('tasks.Task', on_delete=models.CASCADE, verbose_name="Задача")
+    phase = models.CharField(max_length=15, choices=PomodoroSession.SESSION_TYPES, default='work',
+                             verbose_name="Фаза")
+    # Полная длительность фазы - для индикатора прогресса на клиенте
+    duration = models.DurationField(verbose_name="Длительность фазы")
+    started_at = models.DateTimeField(verbose_name="Начало фазы")
+    # Момент окончания фазы; NULL - таймер на паузе
+    deadline = models.DateTimeField(null=True, blank=True, verbose_name="Окончание фазы")
+    paused_remaining = models.DurationField(null=True, blank=True, verbose_name="Остаток на паузе")
+    # Сколько рабочих фаз подряд завершено - для выбора длинного перерыва
+    completed_cycles = models.PositiveSmallIntegerField(default=0, verbose_name="Завершено циклов")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Активный таймер"
+        verbose_name_plural = "Активные таймеры"
+
+    def __str__(self):
+        return f"Таймер {self.user_id}: {self.get_phase_display()}"
+
+    @property
+    def is_paused(self):
+        return self.deadline is None
+
+    def remaining(self, now=None):
+        """Остаток фазы на момент now (не меньше нуля)"""
+        if self.is_paused:
+            return self.paused_remaining
+        return max(self.deadline - (now or timezone.now()), timedelta(0))
+
+    def state(self, now=None):
+        """Состояние таймера для клиента; server_time нужен клиенту для поправки часов"""
+        now = now or timezone.now()
+        return {
+            'task_id': self.task_id,
+            'phase': self.phase,
+            'duration': int(self.duration.total_seconds()),
+            'started_at': self.started_at.isoformat(),
+            'deadline': self.deadline.isoformat() if self.deadline else None,
+            'paused': self.is_paused,
+            'remaining': round(self.remaining(now).total_seconds()),
+            'completed_cycles': self.completed_cycles,
+            'server_time': now.isoformat(),
+        }
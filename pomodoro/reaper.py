@@ -0,0 +1,132 @@
+# pomodoro/reaper.py
+"""
+Закрытие брошенных Pomodoro-сессий.
+
+Если вкладку закрыли посреди фазы, сессия так и остается открытой
+(end_time пуст). Сессия считается брошенной, когда с ее начала прошла
+длительность фазы по настройкам пользователя плюс запас REAPER_GRACE,
+а таймер задачи не идет и не стоит на паузе. Такая сессия закрывается
+со статусом 'abandoned' и временем окончания "начало + длительность фазы".
+
+Сессии закрываются небольшими пакетами: каждый пакет - один UPDATE
+в своей короткой транзакции, с повторной проверкой end_time IS NULL
+(reaper запускается одним процессом - пакеты не пересекаются).
+Поэтому блокировка записи SQLite держится миллисекунды, а сессию,
+которую клиент успел завершить сам, фоновая задача не перезапишет.
+
+Запускается командой reap_sessions по расписанию, отдельно от процессов
+сервера (например, cron: */5 * * * * python manage.py reap_sessions).
+"""
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, DateTimeField, Exists, IntegerField, OuterRef, Q, Value, When
+from django.utils import timezone
+
+from analytics.aggregator import record_sessions
+from users.models import UserSettings
+from .models import PomodoroSession, ActiveTimer, PHASE_DURATION_SETTINGS, session_local_date, user_tzinfo
+
+REAPER_BATCH_SIZE = 200
+# Запас сверх длительности фазы: клиент мог быть офлайн и еще пришлет завершение
+REAPER_GRACE = timedelta(minutes=10)
+# Пауза между пакетами, чтобы запросы пользователей успевали занять блокировку записи
+REAPER_BATCH_PAUSE = 0.05
+
+# Длительности для пользователей без сохраненных настроек - значения по умолчанию модели
+DEFAULT_DURATIONS = {
+    phase: timedelta(minutes=UserSettings._meta.get_field(field).default)
+    for phase, field in PHASE_DURATION_SETTINGS.items()
+}
+
+
+def _phase_durations(user_ids):
+    """Длительности фаз по пользователям: {user_id: {фаза: timedelta}}"""
+    return {
+        user_settings.user_id: {
+            phase: timedelta(minutes=getattr(user_settings, field))
+            for phase, field in PHASE_DURATION_SETTINGS.items()
+        }
+        for user_settings in UserSettings.objects.filter(user_id__in=user_ids)
+    }
+
+
+def _live_timer(now, grace):
+    """Условие "у задачи сессии есть живой таймер" (на паузе или еще не истекший)"""
+    return Exists(ActiveTimer.objects.filter(
+        Q(deadline__isnull=True) | Q(deadline__gt=now - grace),
+        user=OuterRef('user'),
+        task=OuterRef('task'),
+    ))
+
+
+def reap_abandoned_sessions(now=None, batch_size=REAPER_BATCH_SIZE, grace=REAPER_GRACE,
+                            pause=REAPER_BATCH_PAUSE):
+    """Закрывает брошенные сессии пакетами. Возвращает число закрытых сессий"""
+    now = now or timezone.now()
+    live_timer = _live_timer(now, grace)
+    reaped, last_id = 0, 0
+
+    while True:
+        # Кандидаты - открытые сессии старше запаса (частичный индекс session_open_start_idx)
+        batch = list(
+            PomodoroSession.objects
+            .filter(end_time__isnull=True, start_time__lt=now - grace, id__gt=last_id)
+            .exclude(live_timer)
+            .order_by('id')
+            .values_list('id', 'user_id', 'session_type', 'start_time')[:batch_size]
+        )
+        if not batch:
+            return reaped
+        last_id = batch[-1][0]
+
+        durations = _phase_durations({user_id for _, user_id, _, _ in batch})
+        ends = {}
+        for session_id, user_id, session_type, start_time in batch:
+            duration = durations.get(user_id, DEFAULT_DURATIONS).get(session_type, DEFAULT_DURATIONS['work'])
+            if start_time + duration + grace <= now:
+                ends[session_id] = (start_time + duration, int(duration.total_seconds()))
+
+        if ends:
+            with transaction.atomic():
+                # Условие end_time IS NULL повторяется: сессию могли завершить или запустить
+                # таймер ее задачи после выборки. UPDATE идет первым и берет блокировку записи
+                queryset = PomodoroSession.objects.filter(id__in=ends)
+                if queryset.filter(end_time__isnull=True).exclude(live_timer).update(
+                    status='abandoned',
+                    end_time=Case(
+                        *[When(id=session_id, then=Value(end)) for session_id, (end, _) in ends.items()],
+                        output_field=DateTimeField(),
+                    ),
+                    duration_seconds=Case(
+                        *[When(id=session_id, then=Value(seconds)) for session_id, (_, seconds) in ends.items()],
+                        output_field=IntegerField(),
+                    ),
+                ):
+                    # 'abandoned' ставит только reaper, и кандидаты были открыты -
+                    # значит, это сессии, закрытые этим UPDATE; их прерывания идут в статистику
+                    closed = list(queryset.filter(status='abandoned').values_list(
+                        'user_id', 'start_time', 'local_date', 'session_type'))
+                else:
+                    closed = []
+                _record_abandoned(closed)
+                reaped += len(closed)
+
+        if len(batch) < batch_size:
+            return reaped
+        time.sleep(pause)
+
+
+def _record_abandoned(closed):
+    """
+    Учитывает закрытые сессии в дневной статистике пользователей - как прерывания.
+    Время брошенной сессии неизвестно, поэтому во время по квадрантам оно не идет.
+    """
+    by_user = {}
+    for user_id, start_time, local_date, session_type in closed:
+        day = local_date or session_local_date(start_time, user_tzinfo(user_id))
+        by_user.setdefault(user_id, []).append((day, session_type, 'abandoned', None, None))
+    for user_id, sessions in by_user.items():
+        record_sessions(user_id, sessions)
+
@@ -105,6 +105,18 @@ function showNotification(message, type = 'success') {
     }
 }
 
+// Задачу изменили в другой вкладке: берем ее текущее состояние и просим повторить действие
+function applyConflict(data) {
+    if (data.task && taskData) {
+        taskData.version = data.task.version;
+        taskData.title = data.task.title;
+        taskData.estimated_pomodoros = data.task.estimated_pomodoros;
+        taskData.completed_pomodoros = data.task.completed_pomodoros;
+        updateTaskProgressDisplay();
+    }
+    showNotification(data.error + '. Данные обновлены, повторите действие', 'error');
+}
+
 // Функция обновления оценки Pomodoro
 function updateEstimation() {
     const estimatedInput = document.getElementById('estimated-pomodoros');
@@ -129,8 +141,8 @@ function updateEstimation() {
     // Создаем FormData для отправки
     const formData = new FormData();
     formData.append('title', taskData ? taskData.title : document.querySelector('.task-title').textContent);
-    formData.append('description', '');
     formData.append('estimated_pomodoros', estimatedPomodoros);
+    formData.append('version', taskData?.version ?? '');
     formData.append('csrfmiddlewaretoken', csrfToken);
 
     // Получаем ID задачи из URL или данных
@@ -160,16 +172,20 @@ function updateEstimation() {
         body: formData
     })
     .then(response => {
-        if (!response.ok) {
+        // 409 - задачу изменили в другой вкладке, в ответе ее текущее состояние
+        if (!response.ok && response.status !== 409) {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
         return response.json();
     })
     .then(data => {
-        if (data.success) {
+        if (data.conflict) {
+            applyConflict(data);
+        } else if (data.success) {
             // Обновляем данные задачи
             if (taskData) {
                 taskData.estimated_pomodoros = estimatedPomodoros;
+                taskData.version = data.task.version;
             }
 
             // Обновляем отображение прогресса
@@ -227,13 +243,15 @@ function completeTask() {
         // Используем AJAX запрос вместо скрытой формы
         const formData = new FormData();
         formData.append('csrfmiddlewaretoken', csrfToken);
+        formData.append('version', taskData?.version ?? '');
 
         fetch(`/pomodoro/task/${taskId}/complete/`, {
             method: 'POST',
             body: formData
         })
         .then(response => {
-            if (!response.ok) {
+            // 409 - задачу изменили в другой вкладке, в ответе ее текущее состояние
+            if (!response.ok && response.status !== 409) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
             return response.json();
@@ -241,7 +259,11 @@ function completeTask() {
         .then(data => {
             console.log('Response data:', data);
 
-            if (data.success) {
+            if (data.conflict) {
+                applyConflict(data);
+                completeBtn.innerHTML = originalText;
+                completeBtn.disabled = false;
+            } else if (data.success) {
                 // Показываем уведомление об успехе
                 showNotification(data.message || 'Задача успешно завершена!', 'success');
 
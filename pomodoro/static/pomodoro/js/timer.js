@@ -26,6 +26,17 @@ class PomodoroTimer {
         this.timerInterval = null;
         this.completedCycles = 0;
 
+        // Состояние таймера хранит сервер (ActiveTimer): здесь - момент окончания фазы
+        // по часам браузера и начало фазы (ее идентификатор для завершения)
+        this.deadline = null;
+        this.startedAt = null;
+        this.phaseDuration = null;
+
+        // События сессий копятся в localStorage и уходят на сервер пакетами:
+        // так они переживают обрыв сети и перезагрузку страницы
+        this.flushTimeout = null;
+        this.flushing = false;
+
         this.init();
     }
 
@@ -33,9 +44,250 @@ class PomodoroTimer {
         console.log('Initializing timer...');
         this.updateDisplay();
         this.setupEventListeners();
+
+        // Продолжаем таймер, запущенный раньше (в том числе на другом устройстве)
+        const stateElement = document.getElementById('timer-state');
+        this.applyServerState(stateElement ? JSON.parse(stateElement.textContent) : null);
+
+        // Фоновая вкладка могла пропустить окончание фазы или изменения с другого устройства
+        document.addEventListener('visibilitychange', () => {
+            if (!document.hidden) this.syncTimer();
+        });
+
+        // Изменения таймера и сессий с других вкладок и устройств приходят потоком событий
+        if (window.EventSource) {
+            const events = new EventSource('/events/');
+            events.addEventListener('timer', (e) => this.applyServerState(JSON.parse(e.data).timer));
+            events.addEventListener('session', (e) => this.applySessionEvent(JSON.parse(e.data)));
+            events.addEventListener('resync', () => this.syncTimer());
+        }
+
+        // Отправляем события, накопленные офлайн, как только сеть вернулась;
+        // при уходе со страницы - через sendBeacon, чтобы не потерять последние
+        window.addEventListener('online', () => this.flushSessionEvents());
+        document.addEventListener('visibilitychange', () => {
+            if (document.hidden) this.beaconSessionEvents();
+        });
+        this.flushSessionEvents();
         console.log('Timer initialized successfully!');
     }
 
+    // Запрос к API таймера; null - если сервер недоступен
+    async timerRequest(action, payload = null) {
+        try {
+            const url = action ? `/pomodoro/api/timer/${action}/` : '/pomodoro/api/timer/';
+            const options = action ? {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': window.getCSRFToken()
+                },
+                body: JSON.stringify(payload || {})
+            } : {};
+            const response = await fetch(url, options);
+            const data = await response.json();
+            if (!data.success) {
+                console.warn('⚠️ Ошибка API таймера:', data.error);
+                return null;
+            }
+            return data;
+        } catch (error) {
+            console.error('❌ Сервер таймера недоступен:', error);
+            return null;
+        }
+    }
+
+    async syncTimer() {
+        const data = await this.timerRequest(null);
+        if (data) {
+            this.applyServerState(data.timer);
+        } else if (this.isRunning) {
+            this.tick();
+        }
+    }
+
+    // Завершенная где-то сессия этой задачи меняет ее прогресс
+    applySessionEvent(data) {
+        if (data.action !== 'ended' || !data.task_progress || data.task_id !== window.taskData?.id) return;
+        window.taskData.completed_pomodoros = data.task_progress.completed;
+        this.updateTaskProgress();
+    }
+
+    // Приводит таймер страницы к состоянию сервера (null - таймер не запущен)
+    applyServerState(state) {
+        clearInterval(this.timerInterval);
+
+        if (!state) {
+            this.isRunning = false;
+            this.deadline = null;
+            this.startedAt = null;
+            this.phaseDuration = null;
+            if (this.timeLeft <= 0) this.timeLeft = this.getCurrentPhaseDuration();
+            this.updateDisplay();
+            return;
+        }
+
+        if (state.task_id !== window.taskData?.id) {
+            // Таймер идет по другой задаче - не перехватываем его
+            this.showNotification('Таймер уже запущен для другой задачи', 'warning');
+            return;
+        }
+
+        this.currentPhase = state.phase;
+        this.completedCycles = state.completed_cycles;
+        this.startedAt = state.started_at;
+        this.phaseDuration = state.duration;
+
+        if (state.paused) {
+            this.isRunning = false;
+            this.deadline = null;
+            this.timeLeft = state.remaining;
+            this.updateDisplay();
+            return;
+        }
+
+        // Переводим момент окончания на часы браузера (они могут расходиться с серверными)
+        const clockOffset = Date.parse(state.server_time) - Date.now();
+        this.deadline = Date.parse(state.deadline) - clockOffset;
+        this.isRunning = true;
+        this.startTicking();
+    }
+
+    // Раз в секунду только перерисовываем остаток, вычисленный от момента окончания
+    startTicking() {
+        clearInterval(this.timerInterval);
+        this.tick();
+        if (this.isRunning) {
+            this.timerInterval = setInterval(() => this.tick(), 1000);
+        }
+    }
+
+    tick() {
+        if (!this.isRunning || this.deadline === null) return;
+
+        this.timeLeft = Math.max(0, Math.ceil((this.deadline - Date.now()) / 1000));
+        this.updateDisplay();
+
+        if (this.timeLeft <= 0) {
+            console.log('⏰ Таймер завершен!');
+            clearInterval(this.timerInterval);
+            this.isRunning = false;
+            this.finishPhase();
+        }
+    }
+
+    // Фаза закончилась: засчитываем ее, только если сервер подтвердил завершение именно здесь
+    async finishPhase() {
+        const startedAt = this.startedAt;
+        const phase = this.currentPhase;
+        this.deadline = null;
+        this.startedAt = null;
+
+        const data = startedAt ? await this.timerRequest('complete', {started_at: startedAt}) : null;
+        // Засчитываем фазу, только если сервер подтвердил, что завершили ее мы, а не другая вкладка.
+        // Без ответа сервера фазу засчитывает вкладка, застающая ключ текущей сессии браузера:
+        // первая завершившая вкладка удаляет его, и офлайн фаза не засчитывается дважды
+        const completed = data ? data.completed : localStorage.getItem('pomodoro:current-session') !== null;
+        this.endSession(completed ? 'completed' : 'cancelled', phase);
+        this.completePhase(completed);
+    }
+
+    // ===== ОЧЕРЕДЬ СОБЫТИЙ СЕССИЙ =====
+
+    readSessionEvents() {
+        try {
+            return JSON.parse(localStorage.getItem('pomodoro:session-events')) || [];
+        } catch (e) {
+            return [];
+        }
+    }
+
+    queueSessionEvent(event) {
+        const events = this.readSessionEvents();
+        events.push(event);
+        localStorage.setItem('pomodoro:session-events', JSON.stringify(events));
+
+        // Несколько событий подряд (конец фазы и начало следующей) уходят одним запросом
+        clearTimeout(this.flushTimeout);
+        this.flushTimeout = setTimeout(() => this.flushSessionEvents(), 2000);
+    }
+
+    newSessionKey() {
+        if (window.crypto?.randomUUID) return window.crypto.randomUUID();
+        return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+    }
+
+    // Начало фазы: ключ сессии создаем здесь, он же защищает от повторной записи на сервере
+    beginSession(startTime = new Date(), phase = this.currentPhase) {
+        const key = this.newSessionKey();
+        localStorage.setItem('pomodoro:current-session', key);
+        this.queueSessionEvent({
+            type: 'start',
+            key: key,
+            task_id: window.taskData?.id,
+            session_type: phase,
+            at: startTime.toISOString()
+        });
+        return key;
+    }
+
+    // Конец фазы со статусом completed / interrupted / cancelled
+    endSession(status, phase = this.currentPhase) {
+        let key = localStorage.getItem('pomodoro:current-session');
+        if (!key) {
+            if (status !== 'completed') return;
+            // Фазу начали на другом устройстве: засчитанную здесь записываем целиком
+            key = this.beginSession(new Date(Date.now() - this.getCurrentPhaseDuration() * 1000), phase);
+        }
+        localStorage.removeItem('pomodoro:current-session');
+        this.queueSessionEvent({type: 'end', key: key, status: status, at: new Date().toISOString()});
+    }
+
+    async flushSessionEvents() {
+        clearTimeout(this.flushTimeout);
+        const events = this.readSessionEvents().slice(0, 500);
+        if (this.flushing || events.length === 0 || !navigator.onLine) return;
+
+        this.flushing = true;
+        try {
+            const response = await fetch('/pomodoro/api/sessions/events/', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': window.getCSRFToken()
+                },
+                body: JSON.stringify({events: events})
+            });
+            const data = await response.json();
+            if (data.success) {
+                // Сервер ответил по каждому событию (в том числе duplicate и error) - повторять их не нужно;
+                // события, добавленные за время запроса, остаются в очереди
+                const rest = this.readSessionEvents().slice(events.length);
+                localStorage.setItem('pomodoro:session-events', JSON.stringify(rest));
+                data.results.filter(r => r.result === 'error')
+                    .forEach(r => console.warn('⚠️ Событие сессии отклонено:', r.key, r.error));
+                if (rest.length) this.flushTimeout = setTimeout(() => this.flushSessionEvents(), 0);
+            } else {
+                // Например, параллельная отправка того же пакета: повторим позже, дублей не будет
+                console.warn('⚠️ События сессий не приняты:', data.error);
+                this.flushTimeout = setTimeout(() => this.flushSessionEvents(), 10000);
+            }
+        } catch (error) {
+            console.warn('📴 Нет связи, события сессий отправим позже');
+        } finally {
+            this.flushing = false;
+        }
+    }
+
+    // Вкладка скрывается: ответа не ждем, события остаются в очереди до следующей отправки
+    beaconSessionEvents() {
+        const events = this.readSessionEvents().slice(0, 500);
+        if (events.length === 0 || !navigator.sendBeacon) return;
+        clearTimeout(this.flushTimeout);
+        navigator.sendBeacon('/pomodoro/api/sessions/events/',
+            new Blob([JSON.stringify({events: events})], {type: 'application/json'}));
+    }
+
     setupEventListeners() {
         console.log('Setting up event listeners...');
 
@@ -147,6 +399,9 @@ class PomodoroTimer {
     }
 
     getCurrentPhaseDuration() {
+        // Длительность запущенной фазы знает сервер; до запуска - из настроек
+        if (this.phaseDuration) return this.phaseDuration;
+
         const durations = {
             'work': this.workDuration,
             'short_break': this.shortBreak,
@@ -155,70 +410,85 @@ class PomodoroTimer {
         return durations[this.currentPhase] || this.workDuration;
     }
 
-    startTimer() {
+    async startTimer() {
         if (this.isRunning) {
             console.log('⚠️ Таймер уже запущен');
             return;
         }
 
         console.log('🚀 Запуск таймера...');
-        this.isRunning = true;
 
-        // Если таймер на нуле, сбрасываем его
+        // Сразу запускаем локально, затем сверяемся с сервером
+        const resuming = this.startedAt !== null && this.timeLeft > 0;
         if (this.timeLeft <= 0) {
             this.timeLeft = this.getCurrentPhaseDuration();
         }
-
-        this.updateButtonStates();
-
-        // Запускаем интервал
-        this.timerInterval = setInterval(() => {
-            this.timeLeft--;
-            this.updateDisplay();
-
-            if (this.timeLeft <= 0) {
-                console.log('⏰ Таймер завершен!');
-                clearInterval(this.timerInterval);
-                this.completePhase();
-            }
-        }, 1000);
-
+        this.deadline = Date.now() + this.timeLeft * 1000;
+        this.isRunning = true;
+        this.startTicking();
         this.showNotification('Таймер запущен!', 'success');
+        if (!resuming) this.beginSession();
+
+        const data = resuming ?
+            await this.timerRequest('resume') :
+            await this.timerRequest('start', {
+                task_id: window.taskData?.id,
+                phase: this.currentPhase,
+                completed_cycles: this.completedCycles
+            });
+        if (data) this.applyServerState(data.timer);
     }
 
-    pauseTimer() {
+    async pauseTimer() {
         if (!this.isRunning) return;
 
         console.log('⏸️ Пауза таймера');
+        this.tick();
         clearInterval(this.timerInterval);
         this.isRunning = false;
+        this.deadline = null;
         this.updateButtonStates();
         this.showNotification('Таймер на паузе', 'warning');
+
+        const data = await this.timerRequest('pause');
+        if (data) this.applyServerState(data.timer);
     }
 
     stopTimer() {
         console.log('⏹️ Остановка таймера');
+        this.endSession('interrupted');
         clearInterval(this.timerInterval);
         this.isRunning = false;
+        this.deadline = null;
+        this.startedAt = null;
+        this.phaseDuration = null;
         this.timeLeft = this.getCurrentPhaseDuration();
         this.updateDisplay();
         this.updateButtonStates();
         this.showNotification('Таймер остановлен', 'info');
+
+        this.timerRequest('stop');
     }
 
     skipPhase() {
         console.log('⏭️ Пропуск фазы');
+        this.endSession('interrupted');
         clearInterval(this.timerInterval);
         this.isRunning = false;
+        this.deadline = null;
+        this.startedAt = null;
+        this.timerRequest('stop');
         this.completePhase();
     }
 
-    completePhase() {
+    completePhase(countPomodoro = true) {
         console.log('✅ Завершение фазы:', this.currentPhase);
+        this.phaseDuration = null;
 
         // Если завершилась рабочая фаза - увеличиваем счетчик Pomodoro
+        // (не увеличиваем, если завершение уже засчитала другая вкладка)
         if (this.currentPhase === 'work') {
-            this.incrementCompletedPomodoros();
+            if (countPomodoro) this.incrementCompletedPomodoros();
             this.completedCycles++;
 
             if (this.completedCycles >= this.cyclesBeforeLongBreak) {
@@ -254,11 +524,9 @@ class PomodoroTimer {
 
         console.log('🍅 Увеличиваем счетчик Pomodoro:', window.taskData.completed_pomodoros);
 
-        // Обновляем отображение на странице
+        // Обновляем отображение на странице; на сервере счетчик увеличит событие
+        // завершения сессии (см. endSession), точное значение придет в событии 'session'
         this.updateTaskProgress();
-
-        // Отправляем данные на сервер (опционально)
-        this.sendProgressToServer();
     }
 
     // НОВЫЙ МЕТОД: обновление отображения прогресса
@@ -286,41 +554,6 @@ class PomodoroTimer {
         // НЕ обновляем прогресс в шапке - она удалена
     }
 
-    // НОВЫЙ МЕТОД: отправка прогресса на сервер
-    async sendProgressToServer() {
-        try {
-            const csrfToken = window.getCSRFToken();
-            if (!csrfToken) {
-                console.warn('CSRF токен не найден');
-                return;
-            }
-
-            const taskId = window.taskData?.id;
-            if (!taskId) {
-                console.warn('ID задачи не найден');
-                return;
-            }
-
-            const formData = new FormData();
-            formData.append('completed_pomodoros', window.taskData.completed_pomodoros);
-            formData.append('csrfmiddlewaretoken', csrfToken);
-
-            const response = await fetch(`/pomodoro/task/${taskId}/update_progress/`, {
-                method: 'POST',
-                body: formData
-            });
-
-            if (response.ok) {
-                const data = await response.json();
-                if (data.success) {
-                    console.log('✅ Прогресс сохранен на сервере');
-                }
-            }
-        } catch (error) {
-            console.error('❌ Ошибка сохранения прогресса:', error);
-        }
-    }
-
     updateButtonStates() {
         const startBtn = document.getElementById('start-timer');
         const pauseBtn = document.getElementById('pause-timer');
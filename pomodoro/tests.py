@@ -1,3 +1,489 @@
-from django.test import TestCase
+import json
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from analytics.models import ProductivityStats
+from tasks.archive import archive_finished_tasks
+from tasks.models import Task, EisenhowerQuadrant
+from . import reaper
+from .models import ActiveTimer, PomodoroSession, session_duration
+from .reaper import reap_abandoned_sessions
+
+
+def explain(sql, params=()):
+    """Возвращает план выполнения запроса SQLite (EXPLAIN QUERY PLAN) одной строкой"""
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return ' | '.join(row[-1] for row in cursor.fetchall())
+
+
+class SessionQueryPlanTests(TestCase):
+    """Проверяем, что запросы страницы таймера и истории идут по составным индексам"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('focused', password='secret-pass-123')
+        cls.task = Task.objects.create(user=cls.user, title='Задача')
+        for _ in range(10):
+            PomodoroSession.objects.create(user=cls.user, task=cls.task)
+        # Сессии давно завершенной задачи уходят в архив: история читает обе таблицы
+        done = Task.objects.create(user=cls.user, title='Готово', status='completed',
+                                   completed_at=timezone.now() - timedelta(days=60))
+        PomodoroSession.objects.bulk_create(
+            PomodoroSession(user=cls.user, task=done, start_time=timezone.now() - timedelta(days=61, hours=hours))
+            for hours in range(45)
+        )
+        archive_finished_tasks(days=30)
+
+    def test_task_detail_uses_session_index(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('pomodoro:task_detail', args=[self.task.id]))
+        self.assertEqual(response.status_code, 200)
+
+        session_queries = [q['sql'] for q in ctx.captured_queries
+                           if q['sql'].startswith('SELECT') and 'FROM "pomodoro_pomodorosession"' in q['sql']]
+        self.assertTrue(session_queries)
+        for sql in session_queries:
+            plan = explain(sql)
+            self.assertNotIn('SCAN pomodoro_pomodorosession', plan, sql)
+            # Сессии за сегодня - по дню пользователя (local_date), остальные - по задаче и времени
+            index = 'session_user_date_idx' if '"local_date" =' in sql else 'session_user_task_start_idx'
+            self.assertIn(index, plan, sql)
+
+        # Последние сессии задачи шаблон не выводит, поэтому проверяем запрос напрямую
+        recent = PomodoroSession.objects.filter(user=self.user, task=self.task).order_by('-start_time')[:5]
+        plan = explain(*recent.query.sql_with_params())
+        self.assertNotIn('TEMP B-TREE', plan)
+        self.assertIn('session_user_task_start_idx', plan)
+
+    def test_session_history_uses_session_index(self):
+        # Запрос страницы session_history (UNION ALL рабочей таблицы и архива), в том числе по ключу
+        self.client.force_login(self.user)
+        pages, params = 0, {}
+        with CaptureQueriesContext(connection) as ctx:
+            while True:
+                response = self.client.get(reverse('pomodoro:session_history'), params)
+                pages += 1
+                if not response.context['next_cursor']:
+                    break
+                params['before'] = response.context['next_cursor']
+        self.assertEqual(pages, 2)
+
+        union_queries = [q['sql'] for q in ctx.captured_queries if 'UNION ALL' in q['sql']]
+        self.assertEqual(len(union_queries), 2)
+        for sql in union_queries:
+            plan = explain(sql)
+            self.assertIn('MERGE (UNION ALL)', plan, sql)
+            self.assertIn('session_user_start_id_idx', plan, sql)
+            self.assertIn('archived_session_start_id_idx', plan, sql)
+            self.assertNotIn('SCAN pomodoro_', plan, sql)
+            self.assertNotIn('TEMP B-TREE', plan, sql)
+
+
+class EndSessionConcurrencyTests(TransactionTestCase):
+    """Параллельное завершение сессий одной задачи не должно терять инкременты счетчика"""
+
+    SESSIONS = 100
+
+    def test_parallel_end_session_counts_every_pomodoro(self):
+        user = User.objects.create_user('parallel', password='secret-pass-123')
+        task = Task.objects.create(user=user, title='Задача', estimated_pomodoros=self.SESSIONS)
+        session_ids = [
+            PomodoroSession.objects.create(user=user, task=task, session_type='work').id
+            for _ in range(self.SESSIONS)
+        ]
+
+        # Сессию входа создаем заранее: потоки только завершают Pomodoro-сессии
+        login = Client()
+        login.force_login(user)
+
+        barrier = threading.Barrier(self.SESSIONS)
+        results, errors = [], []
+
+        def end_session(session_id):
+            client = Client()
+            client.cookies = login.cookies
+            try:
+                barrier.wait(timeout=30)
+                response = client.post(
+                    reverse('pomodoro:end_session'),
+                    json.dumps({'session_id': session_id, 'status': 'completed'}),
+                    content_type='application/json'
+                )
+                results.append(response.json())
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=end_session, args=(session_id,)) for session_id in session_ids]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertTrue(all(result['success'] for result in results), results)
+
+        task.refresh_from_db()
+        self.assertEqual(task.completed_pomodoros, self.SESSIONS)
+        self.assertFalse(PomodoroSession.objects.filter(task=task, end_time__isnull=True).exists())
+        # Каждый ответ вернул свое значение счетчика - значения не повторяются
+        self.assertEqual(
+            sorted(result['task_progress']['completed'] for result in results),
+            list(range(1, self.SESSIONS + 1))
+        )
+
+        # Повторное завершение сессии счетчик не меняет
+        login.post(reverse('pomodoro:end_session'), json.dumps({'session_id': session_ids[0]}),
+                    content_type='application/json')
+        task.refresh_from_db()
+        self.assertEqual(task.completed_pomodoros, self.SESSIONS)
+
+
+class EndSessionTests(TestCase):
+    """Завершение сессии: один условный UPDATE, длительность как в session_duration, проверка статуса"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('ender', password='secret-pass-123')
+        cls.quadrant = EisenhowerQuadrant.objects.get(priority_order=2)
+        cls.task = Task.objects.create(user=cls.user, title='Задача', quadrant=cls.quadrant, estimated_pomodoros=4)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def start(self, microsecond):
+        start_time = (timezone.now() - timedelta(minutes=25)).replace(microsecond=microsecond)
+        return PomodoroSession.objects.create(user=self.user, task=self.task, start_time=start_time)
+
+    def end(self, session, status='completed'):
+        return self.client.post(reverse('pomodoro:end_session'),
+                                json.dumps({'session_id': session.id, 'status': status}),
+                                content_type='application/json').json()
+
+    def test_one_update_closes_session(self):
+        session = self.start(0)
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.end(session)
+        self.assertTrue(data['success'], data)
+        self.assertEqual(data['task_progress']['completed'], 1)
+
+        session_writes = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "pomodoro_pomodorosession"')]
+        self.assertEqual(len(session_writes), 1)
+        # Длительность пишет тот же условный UPDATE, что закрывает сессию
+        self.assertIn('"duration_seconds" =', session_writes[0])
+        self.assertIn('"end_time" IS NULL', session_writes[0])
+        # Счетчик задачи увеличивается в SQL, а не записью прочитанного значения
+        task_writes = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "tasks_task"')]
+        self.assertEqual(len(task_writes), 1)
+        self.assertIn('"completed_pomodoros" = ("tasks_task"."completed_pomodoros" + 1)', task_writes[0])
+
+        stats = ProductivityStats.objects.get(user=self.user)
+        session.refresh_from_db()
+        self.assertEqual(stats.quadrant_2_time, session.duration_seconds)
+        self.assertEqual(stats.total_pomodoros_completed, 1)
+
+    def test_duration_matches_python(self):
+        # Микросекунды начала больше или меньше, чем у конца, и ровная секунда
+        for microsecond in (0, 999999, 1):
+            session = self.start(microsecond)
+            self.assertTrue(self.end(session, 'interrupted')['success'])
+            session.refresh_from_db()
+            self.assertEqual(session.duration_seconds, session_duration(session.start_time, session.end_time))
+
+    def test_unknown_status_rejected(self):
+        session = self.start(0)
+        # 'abandoned' ставит только reaper, 'active' - не завершение
+        for status in ('active', 'abandoned', 'done'):
+            self.assertFalse(self.end(session, status)['success'])
+        session.refresh_from_db()
+        self.assertIsNone(session.end_time)
+
+
+class IngestSessionEventsTests(TestCase):
+    """Пакет событий сессий: идемпотентность по ключу, время клиента, чужие задачи"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('offline', password='secret-pass-123')
+        cls.task = Task.objects.create(user=cls.user, title='Задача', estimated_pomodoros=4)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def ingest(self, events):
+        response = self.client.post(reverse('pomodoro:session_events'), json.dumps({'events': events}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data['success'], data)
+        return [result['result'] for result in data['results']]
+
+    def test_times_with_and_without_timezone(self):
+        results = self.ingest([
+            # Время без часового пояса считается UTC
+            {'type': 'start', 'key': 'naive', 'task_id': self.task.id, 'at': '2025-03-01T10:00:00'},
+            {'type': 'end', 'key': 'naive', 'status': 'completed', 'at': '2025-03-01T10:25:00'},
+            {'type': 'start', 'key': 'aware', 'task_id': self.task.id, 'at': '2025-03-01T12:00:00+03:00'},
+        ])
+        self.assertEqual(results, ['created', 'ended', 'created'])
+
+        naive = PomodoroSession.objects.get(client_key='naive')
+        self.assertEqual(naive.start_time, datetime(2025, 3, 1, 10, tzinfo=dt_timezone.utc))
+        self.assertEqual(naive.duration_seconds, 25 * 60)
+        self.assertEqual(naive.status, 'completed')
+        aware = PomodoroSession.objects.get(client_key='aware')
+        self.assertEqual(aware.start_time, datetime(2025, 3, 1, 9, tzinfo=dt_timezone.utc))
+        self.assertIsNone(aware.end_time)
+
+    def test_end_statuses_reserved_for_server_rejected(self):
+        results = self.ingest([
+            {'type': 'start', 'key': 'open', 'task_id': self.task.id, 'at': '2025-03-01T10:00:00Z'},
+            {'type': 'end', 'key': 'open', 'status': 'active', 'at': '2025-03-01T10:25:00Z'},
+            {'type': 'end', 'key': 'open', 'status': 'abandoned', 'at': '2025-03-01T10:25:00Z'},
+        ])
+        self.assertEqual(results, ['created', 'error', 'error'])
+        session = PomodoroSession.objects.get(client_key='open')
+        self.assertEqual((session.status, session.end_time, session.duration_seconds), ('active', None, None))
+        self.assertFalse(ProductivityStats.objects.filter(user=self.user).exists())
+
+    def test_duplicate_keys_and_unknown_task(self):
+        other = Task.objects.create(user=User.objects.create_user('stranger'), title='Чужая')
+        results = self.ingest([
+            {'type': 'start', 'key': 'same', 'task_id': self.task.id, 'at': '2025-03-01T10:00:00Z'},
+            {'type': 'start', 'key': 'same', 'task_id': self.task.id, 'at': '2025-03-01T11:00:00Z'},
+            {'type': 'start', 'key': 'foreign', 'task_id': other.id, 'at': '2025-03-01T10:00:00Z'},
+            {'type': 'start', 'key': 'missing', 'task_id': 10 ** 9, 'at': '2025-03-01T10:00:00Z'},
+            {'type': 'start', 'key': 'bad-time', 'task_id': self.task.id, 'at': 'вчера'},
+        ])
+        self.assertEqual(results, ['created', 'duplicate', 'error', 'error', 'error'])
+        self.assertEqual(list(PomodoroSession.objects.values_list('client_key', flat=True)), ['same'])
+
+    def test_replayed_batch_changes_nothing(self):
+        batch = [
+            {'type': 'start', 'key': 'replay', 'task_id': self.task.id, 'at': '2025-03-01T10:00:00Z'},
+            {'type': 'end', 'key': 'replay', 'status': 'completed', 'at': '2025-03-01T10:25:00Z'},
+        ]
+        self.assertEqual(self.ingest(batch), ['created', 'ended'])
+        self.assertEqual(self.ingest(batch), ['duplicate', 'duplicate'])
+
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.completed_pomodoros, 1)
+        self.assertEqual(PomodoroSession.objects.filter(client_key='replay').count(), 1)
+
+
+class TimerApiTests(TestCase):
+    """Серверный таймер: момент окончания фазы, условные пауза и продолжение, одно завершение"""
+
+    START = datetime(2025, 3, 1, 9, 0, tzinfo=dt_timezone.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('timekeeper', password='secret-pass-123')
+        cls.task = Task.objects.create(user=cls.user, title='Задача')
+        # Настройки меняем в закэшированном объекте: сигнал сохраняет его при каждом сохранении пользователя
+        settings = cls.user.usersettings
+        settings.pomodoro_duration, settings.short_break_duration = 30, 7
+        settings.save()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def post(self, action, payload=None, at=None):
+        with mock.patch('django.utils.timezone.now', return_value=at or self.START):
+            return self.client.post(reverse(f'pomodoro:timer_{action}'), json.dumps(payload or {}),
+                                    content_type='application/json').json()
+
+    def start(self, phase='work'):
+        return self.post('start', {'task_id': self.task.id, 'phase': phase})['timer']
+
+    def concurrent(self, **changes):
+        """Меняет таймер "с другого устройства" сразу после того, как view прочитал его"""
+        changed = []
+        is_paused = ActiveTimer.is_paused.fget
+
+        def hook(timer):
+            if not changed:
+                changed.append(ActiveTimer.objects.filter(user=self.user).update(**changes))
+            return is_paused(timer)
+        return mock.patch.object(ActiveTimer, 'is_paused', property(hook))
+
+    def test_deadline_from_user_settings(self):
+        for phase, minutes in (('work', 30), ('short_break', 7)):
+            state = self.start(phase)
+            self.assertEqual((state['phase'], state['duration'], state['remaining']), (phase, minutes * 60, minutes * 60))
+            self.assertEqual(state['deadline'], (self.START + timedelta(minutes=minutes)).isoformat())
+        self.assertFalse(self.post('start', {'task_id': self.task.id, 'phase': 'nap'})['success'])
+
+    def test_pause_and_resume_keep_remaining(self):
+        self.start()
+        paused = self.post('pause', at=self.START + timedelta(minutes=10))['timer']
+        self.assertEqual((paused['paused'], paused['remaining'], paused['deadline']), (True, 20 * 60, None))
+        # Повторная пауза ничего не меняет
+        self.assertEqual(self.post('pause', at=self.START + timedelta(minutes=15))['timer']['remaining'], 20 * 60)
+
+        resumed = self.post('resume', at=self.START + timedelta(hours=1))['timer']
+        self.assertFalse(resumed['paused'])
+        self.assertEqual(resumed['deadline'], (self.START + timedelta(hours=1, minutes=20)).isoformat())
+        # Повторное продолжение не сдвигает момент окончания
+        again = self.post('resume', at=self.START + timedelta(hours=1, minutes=5))['timer']
+        self.assertEqual(again['deadline'], resumed['deadline'])
+
+    def test_pause_loses_to_concurrent_change(self):
+        self.start()
+        # Другое устройство перезапустило фазу: пауза не пишет и отдает его состояние
+        other_deadline = self.START + timedelta(minutes=50)
+        with self.concurrent(deadline=other_deadline):
+            state = self.client.post(reverse('pomodoro:timer_pause')).json()['timer']
+        self.assertFalse(state['paused'])
+        self.assertEqual(state['deadline'], other_deadline.isoformat())
+        self.assertEqual(ActiveTimer.objects.get(user=self.user).deadline, other_deadline)
+
+    def test_resume_loses_to_concurrent_change(self):
+        self.start()
+        self.post('pause', at=self.START + timedelta(minutes=10))
+        # Другое устройство уже продолжило таймер
+        other_deadline = self.START + timedelta(minutes=40)
+        with self.concurrent(deadline=other_deadline, paused_remaining=None):
+            state = self.client.post(reverse('pomodoro:timer_resume')).json()['timer']
+        self.assertEqual(state['deadline'], other_deadline.isoformat())
+        self.assertEqual(ActiveTimer.objects.get(user=self.user).deadline, other_deadline)
+
+    def test_completion_counted_once(self):
+        started_at = self.start()['started_at']
+        self.assertFalse(self.post('complete', {'started_at': '2025-03-01T08:00:00+00:00'})['completed'])
+        self.assertTrue(ActiveTimer.objects.filter(user=self.user).exists())
+
+        # Две вкладки присылают завершение одной и той же фазы
+        first = self.post('complete', {'started_at': started_at})
+        second = self.post('complete', {'started_at': started_at})
+        self.assertEqual((first['completed'], second['completed']), (True, False))
+        self.assertFalse(ActiveTimer.objects.filter(user=self.user).exists())
+        self.assertIsNone(self.client.get(reverse('pomodoro:timer_state')).json()['timer'])
+
+
+class ReaperTests(TestCase):
+    """Закрытие брошенных сессий: критерии, пакеты ограниченного размера, повторная проверка в UPDATE"""
+
+    NOW = datetime(2025, 3, 1, 12, 0, tzinfo=dt_timezone.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('wanderer')
+        cls.task = Task.objects.create(user=cls.user, title='Задача', quadrant=EisenhowerQuadrant.objects.get(priority_order=2))
+
+    def open_session(self, minutes_ago, session_type='work', task=None, user=None):
+        return PomodoroSession.objects.create(user=user or self.user, task=task or self.task, session_type=session_type,
+                                              start_time=self.NOW - timedelta(minutes=minutes_ago))
+
+    def reap(self, **kwargs):
+        return reap_abandoned_sessions(now=self.NOW, pause=0, **kwargs)
+
+    def test_reaps_only_sessions_past_phase_and_grace(self):
+        abandoned = self.open_session(120)
+        short_break = self.open_session(20, 'short_break')
+        in_grace = self.open_session(30)
+        finished = self.open_session(200)
+        PomodoroSession.objects.filter(pk=finished.pk).update(end_time=self.NOW, status='completed')
+        # Таймер другой задачи на паузе не защищает эту сессию
+        paused_task = Task.objects.create(user=self.user, title='На паузе')
+        ActiveTimer.objects.create(user=self.user, task=paused_task, duration=timedelta(minutes=25),
+                                   started_at=self.NOW - timedelta(hours=2), paused_remaining=timedelta(minutes=3))
+        protected = self.open_session(120, task=paused_task)
+
+        self.assertEqual(self.reap(), 2)
+        abandoned.refresh_from_db()
+        self.assertEqual((abandoned.status, abandoned.end_time, abandoned.duration_seconds),
+                         ('abandoned', abandoned.start_time + timedelta(minutes=25), 25 * 60))
+        short_break.refresh_from_db()
+        self.assertEqual((short_break.status, short_break.duration_seconds), ('abandoned', 5 * 60))
+        for session in (in_grace, protected):
+            session.refresh_from_db()
+            self.assertIsNone(session.end_time)
+        finished.refresh_from_db()
+        self.assertEqual(finished.status, 'completed')
+
+        # Брошенная рабочая сессия - прерывание без времени по квадрантам; перерыв не считается
+        stats = ProductivityStats.objects.get(user=self.user)
+        self.assertEqual((stats.interruptions_count, stats.quadrant_2_time), (1, 0))
+        self.assertEqual(self.reap(), 0)
+
+    def test_batches_are_limited(self):
+        sessions = [self.open_session(120 + number) for number in range(7)]
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.reap(batch_size=3), 7)
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "pomodoro_pomodorosession"')]
+        self.assertEqual(len(updates), 3)
+        for sql in updates:
+            self.assertLessEqual(sql.count(' WHEN '), 2 * 3)
+        self.assertFalse(PomodoroSession.objects.filter(pk__in=[s.pk for s in sessions], end_time__isnull=True).exists())
+
+    def test_update_rechecks_session_and_timer(self):
+        ended_by_client = self.open_session(120)
+        timer_started = self.open_session(130)
+        reaped = self.open_session(140)
+        phase_durations = reaper._phase_durations
+
+        def race(user_ids):
+            # Между выборкой и UPDATE клиент завершил одну сессию и запустил таймер задачи другой
+            PomodoroSession.objects.filter(pk=ended_by_client.pk).update(end_time=self.NOW, status='completed')
+            other_task = Task.objects.create(user=self.user, title='Другая')
+            PomodoroSession.objects.filter(pk=timer_started.pk).update(task=other_task)
+            ActiveTimer.objects.create(user=self.user, task=other_task, duration=timedelta(minutes=25),
+                                       started_at=self.NOW, deadline=self.NOW + timedelta(minutes=25))
+            return phase_durations(user_ids)
+
+        with mock.patch.object(reaper, '_phase_durations', side_effect=race):
+            self.assertEqual(self.reap(), 1)
+        statuses = dict(PomodoroSession.objects.values_list('id', 'status'))
+        self.assertEqual((statuses[ended_by_client.pk], statuses[timer_started.pk], statuses[reaped.pk]),
+                         ('completed', 'active', 'abandoned'))
+
+    def test_command(self):
+        self.open_session(120)
+        out = StringIO()
+        with mock.patch('django.utils.timezone.now', return_value=self.NOW):
+            call_command('reap_sessions', batch_size=10, stdout=out)
+        self.assertIn('Закрыто брошенных сессий: 1', out.getvalue())
+
+
+class TaskConflictResponseTests(TestCase):
+    """Завершение задачи и правка прогресса с устаревшей версией - 409 без записи"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('finisher', password='secret-pass-123')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.task = Task.objects.create(user=self.user, title='Задача', estimated_pomodoros=4)
+        self.stale = self.task.change_version
+        Task.objects.filter(pk=self.task.pk).update(completed_pomodoros=2, change_version=self.stale + 1)
+
+    def assert_conflict(self, response):
+        self.assertEqual(response.status_code, 409)
+        data = response.json()
+        self.assertTrue(data['conflict'])
+        self.assertEqual((data['task']['completed_pomodoros'], data['task']['version']), (2, self.stale + 1))
+        self.task.refresh_from_db()
+        self.assertEqual((self.task.status, self.task.completed_pomodoros), ('active', 2))
+
+    def test_complete_task(self):
+        self.assert_conflict(self.client.post(reverse('pomodoro:complete_task', args=[self.task.id]),
+                                              {'version': self.stale}))
+
+    def test_update_progress(self):
+        self.assert_conflict(self.client.post(reverse('pomodoro:update_progress', args=[self.task.id]),
+                                              {'completed_pomodoros': 3, 'version': self.stale}))
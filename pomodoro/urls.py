@@ -8,7 +8,17 @@ urlpatterns = [
     path('task/<int:task_id>/', views.task_detail, name='task_detail'),
     path('api/start_session/', views.start_session, name='start_session'),
     path('api/end_session/', views.end_session, name='end_session'),
+    # Пакет событий сессий (офлайн-очередь клиента), идемпотентно
+    path('api/sessions/events/', views.ingest_session_events, name='session_events'),
     path('task/<int:task_id>/update_progress/', views.update_task_progress, name='update_progress'),
     path('sessions/', views.session_history, name='session_history'),
+    path('sessions/export/', views.export_sessions, name='export_sessions'),
     path('task/<int:task_id>/complete/', views.complete_task, name='complete_task'),
+    # Серверный таймер: состояние и управление (см. ActiveTimer)
+    path('api/timer/', views.timer_state, name='timer_state'),
+    path('api/timer/start/', views.timer_start, name='timer_start'),
+    path('api/timer/pause/', views.timer_pause, name='timer_pause'),
+    path('api/timer/resume/', views.timer_resume, name='timer_resume'),
+    path('api/timer/complete/', views.timer_complete, name='timer_complete'),
+    path('api/timer/stop/', views.timer_stop, name='timer_stop'),
 ]
\ No newline at end of file
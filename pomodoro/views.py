@@ -2,14 +2,30 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.db import IntegrityError, transaction
 from django.utils import timezone
+from datetime import timedelta
 import json
+import logging
 
+from analytics.aggregator import record_session, record_task_completed
+from core.events import publish_event
+from tasks.concurrency import (
+    TaskConflict, conflict_response, increment_completed_pomodoros, parse_version, save_task_fields,
+)
 from tasks.models import Task
+from tasks.quadrants import get_quadrant
 from users.models import UserSettings
-from .models import PomodoroSession
+from .history import history_page, decode_cursor, export_rows, EXPORT_FORMATS
+from .ingest import ingest_session_events as ingest, MAX_EVENTS_PER_BATCH
+from .models import (
+    PomodoroSession, ActiveTimer, CLIENT_END_STATUSES, PHASE_DURATION_SETTINGS,
+    session_duration, session_local_date, user_tzinfo,
+)
+
+logger = logging.getLogger(__name__)
 
 
 @login_required
@@ -18,6 +34,9 @@ def task_detail(request, task_id):
     Страница с Pomodoro-таймером для конкретной задачи
     """
     task = get_object_or_404(Task, id=task_id, user=request.user)
+    # Квадрант берем из кэша, а не отдельным запросом при рендере шаблона
+    if task.quadrant_id:
+        task.quadrant = get_quadrant(task.quadrant_id)
 
     try:
         settings = UserSettings.objects.get(user=request.user)
@@ -25,12 +44,12 @@ def task_detail(request, task_id):
         # Создаем настройки по умолчанию, если их нет
         settings = UserSettings.objects.create(user=request.user)
 
-    # Получаем сегодняшние сессии для этой задачи
-    today = timezone.now().date()
+    # Получаем сегодняшние сессии для этой задачи ("сегодня" - в часовом поясе пользователя)
+    today = timezone.localdate(timezone=settings.tzinfo)
     today_sessions = PomodoroSession.objects.filter(
         user=request.user,
         task=task,
-        start_time__date=today
+        local_date=today
     ).count()
 
     # Последние 5 сессий
@@ -45,12 +64,16 @@ def task_detail(request, task_id):
     else:
         progress_percentage = 0
 
+    # Запущенный таймер пользователя (с любого устройства) - поиск по первичному ключу
+    active_timer = ActiveTimer.objects.filter(user=request.user).first()
+
     context = {
         'task': task,
         'settings': settings,
         'today_sessions': today_sessions,
         'recent_sessions': recent_sessions,
         'progress_percentage': progress_percentage,
+        'timer_state': active_timer.state() if active_timer else None,
     }
 
     return render(request, 'pomodoro/task_detail.html', context)
@@ -67,15 +90,36 @@ def start_session(request):
             data = json.loads(request.body)
             task_id = data.get('task_id')
             session_type = data.get('session_type', 'work')
+            # Ключ идемпотентности от клиента: повтор запроса вернет ту же сессию
+            client_key = data.get('client_key') or None
 
             task = Task.objects.get(id=task_id, user=request.user)
 
+            if client_key:
+                session = PomodoroSession.objects.filter(user=request.user, client_key=client_key).first()
+                if session is not None:
+                    return JsonResponse({
+                        'success': True,
+                        'session_id': session.id,
+                        'message': f'{session.get_session_type_display()} сессия уже начата'
+                    })
+
+            start_time = timezone.now()
             session = PomodoroSession.objects.create(
                 user=request.user,
                 task=task,
                 session_type=session_type,
-                status='completed'
+                start_time=start_time,
+                local_date=session_local_date(start_time, user_tzinfo(request.user.id)),
+                status='active',
+                client_key=client_key
             )
+            publish_event(request.user.id, 'session', {
+                'action': 'started',
+                'session_id': session.id,
+                'task_id': task.id,
+                'session_type': session.session_type,
+            })
 
             return JsonResponse({
                 'success': True,
@@ -104,41 +148,73 @@ def start_session(request):
 @csrf_exempt
 def end_session(request):
     """
-    API: Завершить Pomodoro сессию
+    API: Завершить Pomodoro сессию.
+    Сессия закрывается и счетчик задачи увеличивается в одной транзакции, без
+    чтения-изменения-записи в Python: условный UPDATE закрывает сессию, только если
+    она еще открыта (статус, конец, длительность), счетчик - UPDATE с F().
+    Повторное завершение сессии счетчик не меняет.
     """
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
             session_id = data.get('session_id')
             status = data.get('status', 'completed')
+            if status not in CLIENT_END_STATUSES:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Неверный статус сессии'
+                })
+
+            # Данные сессии вместе с квадрантом задачи - одним запросом. Читаем до
+            # транзакции: в SQLite она должна начинаться с записи, иначе параллельное
+            # завершение не сможет поднять блокировку чтения до записи
+            sessions = PomodoroSession.objects.filter(id=session_id, user=request.user)
+            task_id, session_type, start_time, local_date, quadrant_id = sessions.values_list(
+                'task_id', 'session_type', 'start_time', 'local_date', 'task__quadrant_id').get()
 
-            session = PomodoroSession.objects.get(
-                id=session_id,
-                user=request.user
-            )
-
-            session.status = status
-            session.end_time = timezone.now()
-            session.save()
-
-            # Обновляем счётчик Pomodoro в задаче
             task_progress = None
-            if session.session_type == 'work' and status == 'completed':
-                task = session.task
-                task.completed_pomodoros += 1
-                task.save()
-
-                # Вычисляем новый процент выполнения
-                if task.estimated_pomodoros > 0:
-                    progress_percentage = (task.completed_pomodoros / task.estimated_pomodoros) * 100
-                else:
-                    progress_percentage = 0
-
-                task_progress = {
-                    'completed': task.completed_pomodoros,
-                    'total': task.estimated_pomodoros,
-                    'percentage': progress_percentage
-                }
+            with transaction.atomic():
+                # Закрываем сессию, только если она еще открыта
+                end_time = timezone.now()
+                duration_seconds = session_duration(start_time, end_time)
+                if not sessions.filter(end_time__isnull=True).update(
+                        status=status, end_time=end_time, duration_seconds=duration_seconds):
+                    return JsonResponse({
+                        'success': True,
+                        'message': 'Сессия уже завершена',
+                        'task_progress': None
+                    })
+
+                # Дневная статистика - приращением в той же транзакции
+                record_session(
+                    request.user.id,
+                    local_date or session_local_date(start_time, user_tzinfo(request.user.id)),
+                    session_type, status, duration_seconds, quadrant_id,
+                )
+
+                # Обновляем счётчик Pomodoro в задаче
+                if session_type == 'work' and status == 'completed':
+                    completed, estimated = increment_completed_pomodoros(task_id, request.user.id)
+
+                    # Вычисляем новый процент выполнения
+                    if estimated > 0:
+                        progress_percentage = (completed / estimated) * 100
+                    else:
+                        progress_percentage = 0
+
+                    task_progress = {
+                        'completed': completed,
+                        'total': estimated,
+                        'percentage': progress_percentage
+                    }
+
+                publish_event(request.user.id, 'session', {
+                    'action': 'ended',
+                    'session_id': session_id,
+                    'task_id': task_id,
+                    'status': status,
+                    'task_progress': task_progress,
+                })
 
             return JsonResponse({
                 'success': True,
@@ -163,22 +239,83 @@ def end_session(request):
     })
 
 
+@login_required
+@csrf_exempt
+def ingest_session_events(request):
+    """
+    API: пакет событий сессий от клиента (начало и завершение, с временем клиента
+    и ключами идемпотентности - см. pomodoro/ingest.py). Повторная отправка того же
+    пакета безопасна. В ответе - результат по каждому событию.
+    """
+    if request.method == 'POST':
+        try:
+            events = json.loads(request.body).get('events')
+            if not isinstance(events, list) or len(events) > MAX_EVENTS_PER_BATCH:
+                return JsonResponse({
+                    'success': False,
+                    'error': f'Ожидается список до {MAX_EVENTS_PER_BATCH} событий'
+                })
+
+            return JsonResponse({
+                'success': True,
+                'results': ingest(request.user, events)
+            })
+
+        except IntegrityError:
+            # Параллельный запрос с теми же ключами успел раньше - клиенту нужно повторить пакет
+            return JsonResponse({
+                'success': False,
+                'retry': True,
+                'error': 'Пакет обрабатывается параллельно, повторите запрос'
+            }, status=409)
+        except Exception as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            })
+
+    return JsonResponse({
+        'success': False,
+        'error': 'Неверный метод запроса'
+    })
+
+
 @login_required
 def session_history(request):
     """
-    История всех Pomodoro сессий
+    История всех Pomodoro сессий (вместе с архивными), по страницам.
+    Следующая страница - параметр before с ключом последней показанной сессии.
     """
-    sessions = PomodoroSession.objects.filter(
-        user=request.user
-    ).order_by('-start_time')[:50]
+    sessions, next_cursor = history_page(request.user, decode_cursor(request.GET.get('before')))
 
     context = {
-        'sessions': sessions
+        'sessions': sessions,
+        'next_cursor': next_cursor,
+        'export_formats': EXPORT_FORMATS,
     }
 
     return render(request, 'pomodoro/session_history.html', context)
 
 
+@login_required
+def export_sessions(request):
+    """
+    Выгрузка всей истории сессий пользователя файлом CSV или JSONL (?format=...).
+    Ответ формируется потоком, без загрузки всей истории в память.
+    """
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return JsonResponse({
+            'success': False,
+            'error': 'Неизвестный формат выгрузки'
+        }, status=400)
+
+    content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(export_rows(request.user, fmt), content_type=f'{content_type}; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="pomodoro_sessions.{fmt}"'
+    return response
+
+
 @login_required
 @csrf_exempt
 def complete_task(request, task_id):
@@ -187,16 +324,20 @@ def complete_task(request, task_id):
     """
     if request.method == 'POST':
         try:
-            print(f"Completing task {task_id} for user {request.user}")  # Отладка
-
             task = Task.objects.get(id=task_id, user=request.user)
+            expected_version = parse_version(request.POST.get('version'))
+            already_completed = task.status == 'completed'
 
-            # Меняем статус на выполненный
+            # Меняем статус на выполненный - условной записью только этих полей
             task.status = 'completed'
             task.completed_at = timezone.now()
-            task.save()
+            with transaction.atomic():
+                save_task_fields(task, ['status', 'completed_at'], expected_version)
+                # Повторное завершение уже выполненной задачи статистику не меняет
+                if not already_completed:
+                    record_task_completed(task)
 
-            print(f"Task completed successfully: {task.id} - {task.title}")  # Отладка
+            logger.debug('Задача %s завершена', task.id)
 
             return JsonResponse({
                 'success': True,
@@ -204,16 +345,15 @@ def complete_task(request, task_id):
                 'redirect_url': '/tasks/matrix/'  # Добавляем URL для редиректа
             })
 
+        except TaskConflict as conflict:
+            return conflict_response(conflict)
         except Task.DoesNotExist:
-            print(f"Task {task_id} not found for user {request.user}")  # Отладка
             return JsonResponse({
                 'success': False,
                 'error': 'Задача не найдена'
             })
         except Exception as e:
-            print(f"Error completing task: {e}")  # Отладка
-            import traceback
-            traceback.print_exc()  # Полный traceback
+            logger.exception('Ошибка завершения задачи %s', task_id)
             return JsonResponse({
                 'success': False,
                 'error': str(e)
@@ -231,19 +371,19 @@ def update_task_progress(request, task_id):
     """Обновление прогресса выполнения задачи (количество выполненных Pomodoro)"""
     if request.method == 'POST':
         try:
-            print(f"Updating progress for task {task_id}")  # Для отладки
-
             task = Task.objects.get(id=task_id, user=request.user)
             completed_pomodoros = request.POST.get('completed_pomodoros')
+            expected_version = parse_version(request.POST.get('version'))
 
-            if completed_pomodoros:
+            if completed_pomodoros and task.completed_pomodoros != int(completed_pomodoros):
                 task.completed_pomodoros = int(completed_pomodoros)
-                task.save()
-                print(f"Task {task_id} progress updated to {task.completed_pomodoros}")
+                save_task_fields(task, ['completed_pomodoros'], expected_version)
+                logger.debug('Прогресс задачи %s: %s Pomodoro', task_id, task.completed_pomodoros)
 
             return JsonResponse({
                 'success': True,
                 'message': 'Прогресс обновлен',
+                'version': task.change_version,
                 'progress': {
                     'completed': task.completed_pomodoros,
                     'estimated': task.estimated_pomodoros,
@@ -252,13 +392,15 @@ def update_task_progress(request, task_id):
                 }
             })
 
+        except TaskConflict as conflict:
+            return conflict_response(conflict)
         except Task.DoesNotExist:
             return JsonResponse({
                 'success': False,
                 'error': 'Задача не найдена'
             })
         except Exception as e:
-            print(f"Error updating progress: {e}")
+            logger.exception('Ошибка обновления прогресса задачи %s', task_id)
             return JsonResponse({
                 'success': False,
                 'error': str(e)
@@ -267,4 +409,196 @@ def update_task_progress(request, task_id):
     return JsonResponse({
         'success': False,
         'error': 'Неверный метод запроса'
-    })
\ No newline at end of file
+    })
+
+
+def _timer_response(request, timer, changed=False):
+    """
+    Ответ API таймера: текущее состояние (None - таймер не запущен).
+    changed - состояние изменилось: оно же рассылается остальным вкладкам пользователя.
+    """
+    state = timer.state() if timer else None
+    if changed:
+        publish_event(request.user.id, 'timer', {'timer': state})
+    return JsonResponse({
+        'success': True,
+        'timer': state
+    })
+
+
+@login_required
+def timer_state(request):
+    """
+    API: текущее состояние таймера пользователя.
+    Клиент вызывает его при открытии страницы и возвращении на вкладку, а не каждую секунду.
+    """
+    return _timer_response(request, ActiveTimer.objects.filter(user=request.user).first())
+
+
+@login_required
+@csrf_exempt
+def timer_start(request):
+    """
+    API: запустить фазу таймера для задачи (заменяет текущий таймер пользователя).
+    Длительность фазы берется из настроек пользователя, момент окончания считает сервер.
+    """
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            phase = data.get('phase', 'work')
+            if phase not in PHASE_DURATION_SETTINGS:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Неверная фаза таймера'
+                })
+
+            task = Task.objects.only('id').get(id=data.get('task_id'), user=request.user)
+            settings, _ = UserSettings.objects.get_or_create(user=request.user)
+            duration = timedelta(minutes=getattr(settings, PHASE_DURATION_SETTINGS[phase]))
+
+            now = timezone.now()
+            timer, _ = ActiveTimer.objects.update_or_create(
+                user=request.user,
+                defaults={
+                    'task': task,
+                    'phase': phase,
+                    'duration': duration,
+                    'started_at': now,
+                    'deadline': now + duration,
+                    'paused_remaining': None,
+                    'completed_cycles': max(int(data.get('completed_cycles') or 0), 0),
+                }
+            )
+            return _timer_response(request, timer, changed=True)
+
+        except Task.DoesNotExist:
+            return JsonResponse({
+                'success': False,
+                'error': 'Задача не найдена'
+            })
+        except Exception as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            })
+
+    return JsonResponse({
+        'success': False,
+        'error': 'Неверный метод запроса'
+    })
+
+
+@login_required
+@csrf_exempt
+def timer_pause(request):
+    """API: поставить таймер на паузу - остаток фазы запоминается на сервере"""
+    if request.method == 'POST':
+        timer = ActiveTimer.objects.filter(user=request.user).first()
+        if timer is None:
+            return JsonResponse({
+                'success': False,
+                'error': 'Таймер не запущен'
+            })
+
+        changed = False
+        if not timer.is_paused:
+            now = timezone.now()
+            remaining = timer.remaining(now)
+            # Условная запись: если таймер успели изменить с другого устройства, отдаем его состояние
+            changed = bool(ActiveTimer.objects.filter(pk=timer.pk, deadline=timer.deadline).update(
+                deadline=None, paused_remaining=remaining, updated_at=now))
+            if changed:
+                timer.deadline, timer.paused_remaining = None, remaining
+            else:
+                timer = ActiveTimer.objects.filter(user=request.user).first()
+
+        return _timer_response(request, timer, changed)
+
+    return JsonResponse({
+        'success': False,
+        'error': 'Неверный метод запроса'
+    })
+
+
+@login_required
+@csrf_exempt
+def timer_resume(request):
+    """API: продолжить таймер после паузы - новый момент окончания считается от остатка"""
+    if request.method == 'POST':
+        timer = ActiveTimer.objects.filter(user=request.user).first()
+        if timer is None:
+            return JsonResponse({
+                'success': False,
+                'error': 'Таймер не запущен'
+            })
+
+        changed = False
+        if timer.is_paused:
+            now = timezone.now()
+            deadline = now + timer.paused_remaining
+            changed = bool(ActiveTimer.objects.filter(pk=timer.pk, deadline__isnull=True,
+                                                      paused_remaining=timer.paused_remaining).update(
+                deadline=deadline, paused_remaining=None, updated_at=now))
+            if changed:
+                timer.deadline, timer.paused_remaining = deadline, None
+            else:
+                timer = ActiveTimer.objects.filter(user=request.user).first()
+
+        return _timer_response(request, timer, changed)
+
+    return JsonResponse({
+        'success': False,
+        'error': 'Неверный метод запроса'
+    })
+
+
+@login_required
+@csrf_exempt
+def timer_complete(request):
+    """
+    API: фаза закончилась. Таймер удаляется, только если это та же фаза
+    (started_at из состояния клиента) - из нескольких вкладок завершение
+    засчитывается одной: остальные получают completed=false.
+    """
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            started_at = data.get('started_at')
+            deleted = 0
+            if started_at:
+                deleted, _ = ActiveTimer.objects.filter(
+                    user=request.user,
+                    started_at=started_at
+                ).delete()
+            if deleted:
+                publish_event(request.user.id, 'timer', {'timer': None})
+
+            return JsonResponse({
+                'success': True,
+                'completed': bool(deleted)
+            })
+
+        except Exception as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            })
+
+    return JsonResponse({
+        'success': False,
+        'error': 'Неверный метод запроса'
+    })
+
+
+@login_required
+@csrf_exempt
+def timer_stop(request):
+    """API: остановить таймер"""
+    if request.method == 'POST':
+        ActiveTimer.objects.filter(user=request.user).delete()
+        return _timer_response(request, None, changed=True)
+
+    return JsonResponse({
+        'success': False,
+        'error': 'Неверный метод запроса'
+    })
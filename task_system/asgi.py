@@ -5,6 +5,9 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Поток событий /events/ (Server-Sent Events) рассчитан на ASGI-сервер,
+например: uvicorn task_system.asgi:application
 """
 
 import os
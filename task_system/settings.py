@@ -81,6 +81,25 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Тестовая база - файл, а не общая память: параллельные записи в тестах
+        # ждут блокировку (busy timeout), а не падают с "database table is locked"
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    }
+}
+
+
+# Кэш фрагментов матрицы (tasks/fragments.py) и ответов аналитики (analytics/dashboard.py).
+# Сброс кэша после изменения задачи виден только процессам, которые делят этот кэш:
+# LocMemCache работает в пределах одного процесса (runserver, один воркер). Для
+# нескольких воркеров укажите общий кэш, например
+# 'django.core.cache.backends.redis.RedisCache' или
+# 'django.core.cache.backends.memcached.PyMemcacheCache' с LOCATION сервера,
+# иначе другие воркеры будут отдавать устаревшие колонки и ряды
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
@@ -136,3 +155,16 @@ LOGOUT_REDIRECT_URL = '/'
 
 # URL для входа (если требуется аутентификация)
 LOGIN_URL = '/users/login/'
+
+# Брокер событий для потока Server-Sent Events (core/events.py).
+# Сам поток /events/ работает только под ASGI (task_system/asgi.py, например uvicorn);
+# под WSGI и runserver он отвечает 501, и страницы проверяют изменения периодически.
+# InProcessBroker работает в пределах одного процесса; для нескольких воркеров
+# укажите брокер с общим каналом (интерфейс core.events.EventBroker)
+EVENTS_BROKER = 'core.events.InProcessBroker'
+
+# Фоновые задачи запускает не процесс сервера, а планировщик (cron, systemd timer):
+# reap_sessions закрывает брошенные Pomodoro-сессии (pomodoro/reaper.py),
+# refresh_rollups обновляет недельные и месячные сводки (analytics/rollups.py)
+#   */5 * * * * python manage.py reap_sessions
+#   */5 * * * * python manage.py refresh_rollups
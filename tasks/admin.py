@@ -5,7 +5,10 @@ from django.contrib import admin
 from django.contrib.auth.models import User
 
 # Импортируем наши модели из текущего приложения
-from .models import EisenhowerQuadrant, Task
+from .models import ArchivedTask, EisenhowerQuadrant, Task
+
+# Полнотекстовый индекс задач (FTS5) для поиска в админке
+from .search import build_match, fts_available, matching_ids
 
 
 # Класс для настройки отображения модели EisenhowerQuadrant в админке
@@ -52,6 +55,7 @@ class TaskAdmin(admin.ModelAdmin):
     list_filter = ('quadrant', 'status', 'created_at')
 
     # Поля для поиска - можно искать по заголовку и описанию задачи
+    # (при наличии FTS5 поиск идет по полнотекстовому индексу, см. get_search_results)
     search_fields = ('title', 'description')
 
     # readonly_fields - поля, которые можно только просматривать, но нельзя редактировать
@@ -69,6 +73,13 @@ class TaskAdmin(admin.ModelAdmin):
         # select_related оптимизирует запросы, загружая связанные объекты user и quadrant одним запросом
         return qs.select_related('user', 'quadrant')
 
+    # Поиск через полнотекстовый индекс вместо LIKE '%...%' по всей таблице задач
+    def get_search_results(self, request, queryset, search_term):
+        if search_term and fts_available() and build_match(search_term):
+            return queryset.filter(id__in=matching_ids(search_term)), False
+        # Без FTS5 - стандартный поиск Django по search_fields
+        return super().get_search_results(request, queryset, search_term)
+
     # Запрещаем редактирование задач - возвращает False чтобы убрать кнопки "Сохранить" и "Редактировать"
     def has_change_permission(self, request, obj=None):
         return False  # Админ не может изменять задачи
@@ -103,8 +114,30 @@ class TaskAdmin(admin.ModelAdmin):
     )
 
 
+# Архивные задачи - только просмотр: в архив они попадают командой archive_tasks
+class ArchivedTaskAdmin(admin.ModelAdmin):
+    list_display = ('title', 'user', 'quadrant', 'status', 'completed_at', 'archived_at')
+    list_filter = ('status', 'archived_at')
+    search_fields = ('title', 'description')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user', 'quadrant')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 # Регистрируем модель EisenhowerQuadrant с настройками EisenhowerQuadrantAdmin
 admin.site.register(EisenhowerQuadrant, EisenhowerQuadrantAdmin)
 
 # Регистрируем модель Task с настройками TaskAdmin
-admin.site.register(Task, TaskAdmin)
\ No newline at end of file
+admin.site.register(Task, TaskAdmin)
+
+# Регистрируем архив задач (только просмотр)
+admin.site.register(ArchivedTask, ArchivedTaskAdmin)
\ No newline at end of file
@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class TasksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tasks'
+
+    def ready(self):
+        # Подключаем сигналы сброса кэша квадрантов и фрагментов матрицы
+        from . import fragments, quadrants  # noqa: F401
+        from .search import ensure_fts_schema
+
+        # Индекс полнотекстового поиска создается (и чинится) после каждого migrate
+        post_migrate.connect(ensure_fts_schema, sender=self)
@@ -0,0 +1,115 @@
+# tasks/archive.py
+"""
+Холодный архив завершенных и отмененных задач.
+
+Задачи, завершенные больше N дней назад (по completed_at; у отмененных задач
+времени выполнения нет - по updated_at), вместе с их Pomodoro-сессиями
+переносятся из рабочих таблиц в tasks_archivedtask и
+pomodoro_archivedpomodorosession. Перенос идет пакетами, каждый пакет - в своей
+короткой транзакции: задача либо целиком в рабочих таблицах, либо целиком в архиве.
+id задач и сессий сохраняются.
+
+Для синхронизации "с версии N" (task_changes) перенос выглядит как удаление:
+каждая перенесенная задача оставляет надгробие TaskTombstone с новой версией
+матрицы владельца, и клиенты, которые еще показывают задачу, убирают ее.
+
+Матрица и таймер работают только с рабочими таблицами. История и аналитика
+читают обе таблицы через tasks_with_archive / sessions_with_archive.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from pomodoro.models import PomodoroSession, ArchivedPomodoroSession, ActiveTimer
+from .models import Task, ArchivedTask
+
+ARCHIVE_AFTER_DAYS = 30
+ARCHIVE_BATCH_SIZE = 500
+ARCHIVED_STATUSES = ('completed', 'cancelled')
+
+# Поля, переносимые из задачи в архив без изменений
+TASK_FIELDS = (
+    'id', 'user_id', 'quadrant_id', 'title', 'description', 'status', 'display_order',
+    'priority', 'due_date', 'estimated_pomodoros', 'completed_pomodoros',
+    'created_at', 'updated_at', 'completed_at', 'change_version',
+)
+SESSION_FIELDS = ('id', 'task_id', 'user_id', 'session_type', 'start_time', 'end_time', 'status',
+                  'duration_seconds', 'local_date')
+
+
+def _archive_batch(task_ids):
+    """Переносит пакет задач и их сессий в архив одной транзакцией. Возвращает (задач, сессий)"""
+    with transaction.atomic():
+        # Перечитываем внутри транзакции: задачу могли вернуть в работу после выборки
+        tasks = list(
+            Task.objects.select_for_update()
+            .filter(id__in=task_ids, status__in=ARCHIVED_STATUSES)
+            .values(*TASK_FIELDS)
+        )
+        ids = [task['id'] for task in tasks]
+        if not ids:
+            return 0, 0
+
+        sessions = list(PomodoroSession.objects.filter(task_id__in=ids).values(*SESSION_FIELDS))
+
+        ArchivedTask.objects.bulk_create([ArchivedTask(**task) for task in tasks])
+        ArchivedPomodoroSession.objects.bulk_create([ArchivedPomodoroSession(**session) for session in sessions])
+
+        # Таймер, забытый на давно завершенной задаче, в архив не переносим
+        ActiveTimer.objects.filter(task_id__in=ids).delete()
+        PomodoroSession.objects.filter(task_id__in=ids).delete()
+        # Для синхронизации перенос - то же удаление: сигналы post_delete задачи оставляют
+        # надгробие с новой версией матрицы и сбрасывают кэш колонки
+        Task.objects.filter(id__in=ids).delete()
+
+    return len(tasks), len(sessions)
+
+
+def archive_finished_tasks(days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Переносит в архив задачи, завершенные больше days дней назад, и отмененные
+    задачи, не менявшиеся больше days дней (времени выполнения у них нет).
+    Возвращает {'tasks', 'sessions'} - сколько перенесено.
+    """
+    cutoff = timezone.now() - timedelta(days=days)
+    candidates = Task.objects.filter(
+        Q(completed_at__lt=cutoff) | Q(completed_at__isnull=True, updated_at__lt=cutoff),
+        status__in=ARCHIVED_STATUSES,
+    )
+
+    archived_tasks = archived_sessions = 0
+    last_id = 0
+    while True:
+        # Каждый пакет выбирается заново по id: перенесенных задач в таблице уже нет
+        task_ids = list(
+            candidates.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not task_ids:
+            break
+        last_id = task_ids[-1]
+
+        tasks_count, sessions_count = _archive_batch(task_ids)
+        archived_tasks += tasks_count
+        archived_sessions += sessions_count
+
+    return {'tasks': archived_tasks, 'sessions': archived_sessions}
+
+
+def tasks_with_archive(user, fields, *conditions, **filters):
+    """
+    Задачи пользователя из рабочей таблицы и архива одним запросом (UNION ALL)
+    в виде словарей с полями fields. Условия (Q) и фильтры применяются к обеим
+    частям; сортировку и срез делает вызывающий код.
+    """
+    live = Task.objects.filter(*conditions, user=user, **filters).order_by().values(*fields)
+    archived = ArchivedTask.objects.filter(*conditions, user=user, **filters).order_by().values(*fields)
+    return live.union(archived, all=True)
+
+
+def sessions_with_archive(user, fields, *conditions, **filters):
+    """Pomodoro-сессии пользователя из рабочей таблицы и архива одним запросом (UNION ALL)"""
+    live = PomodoroSession.objects.filter(*conditions, user=user, **filters).order_by().values(*fields)
+    archived = ArchivedPomodoroSession.objects.filter(*conditions, user=user, **filters).order_by().values(*fields)
+    return live.union(archived, all=True)
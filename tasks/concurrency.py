@@ -0,0 +1,147 @@
+# tasks/concurrency.py
+"""
+Оптимистичная блокировка задач.
+
+Версией строки служит Task.change_version: каждое изменение задачи получает
+новую версию матрицы пользователя, поэтому версия однозначно определяет
+состояние строки. Клиент присылает версию, которую видел; запись делается
+условным UPDATE ... WHERE id = ? AND change_version = ? и только по
+изменившимся полям. Если строку успели изменить (или удалить) в другой
+вкладке, UPDATE не находит ее и клиент получает 409 с текущим состоянием.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.http import JsonResponse
+from django.utils import timezone
+
+from .fragments import invalidate_columns, UNASSIGNED
+from .models import Task, MatrixVersion
+
+
+class TaskConflict(Exception):
+    """Задачу изменили или удалили после того, как клиент прочитал ее версию"""
+
+    def __init__(self, task_id):
+        super().__init__(f'Задача {task_id} изменена другим клиентом')
+        self.task_id = task_id
+
+    def current(self):
+        """Текущее состояние задачи (None - задача удалена)"""
+        return Task.objects.filter(pk=self.task_id).first()
+
+
+class TasksConflict(Exception):
+    """Пакетное изменение: часть задач изменили, удалили или добавили в другой вкладке"""
+
+    def __init__(self, task_ids):
+        super().__init__(f'Задачи {", ".join(map(str, task_ids))} изменены другим клиентом')
+        self.task_ids = list(task_ids)
+
+    def current(self):
+        """Текущее состояние задач: (список задач, id удаленных)"""
+        tasks = list(Task.objects.filter(pk__in=self.task_ids))
+        found = {task.id for task in tasks}
+        return tasks, [task_id for task_id in self.task_ids if task_id not in found]
+
+
+def parse_version(value):
+    """Ожидаемая версия из запроса: None - клиент версию не прислал. Неверное значение - ValueError"""
+    if value in (None, ''):
+        return None
+    version = int(value)
+    if version < 0:
+        raise ValueError('Неверная версия задачи')
+    return version
+
+
+def task_state(task):
+    """Состояние задачи для ответа клиенту (с версией для следующего изменения)"""
+    return {
+        'id': task.id,
+        'title': task.title,
+        'description': task.description,
+        'quadrant_id': task.quadrant_id,
+        'status': task.status,
+        'display_order': task.display_order,
+        'estimated_pomodoros': task.estimated_pomodoros,
+        'completed_pomodoros': task.completed_pomodoros,
+        'completed_at': task.completed_at,
+        'version': task.change_version,
+    }
+
+
+def save_task_fields(task, fields, expected_version=None):
+    """
+    Записывает поля fields задачи task условным UPDATE, если версия строки в базе
+    равна expected_version (None - без проверки). Иначе бросает TaskConflict.
+    UPDATE не шлет post_save, поэтому кэш колонок матрицы сбрасываем здесь же.
+    """
+    values = {}
+    for name in fields:
+        attname = Task._meta.get_field(name).attname
+        values[attname] = getattr(task, attname)
+
+    now = timezone.now()
+    with transaction.atomic():
+        version = MatrixVersion.bump(task.user_id)
+        queryset = Task.objects.filter(pk=task.pk)
+        if expected_version is not None:
+            queryset = queryset.filter(change_version=expected_version)
+        if not queryset.update(change_version=version, updated_at=now, **values):
+            # Исключение внутри atomic откатывает и увеличение версии матрицы
+            raise TaskConflict(task.pk)
+
+    task.change_version = version
+    task.updated_at = now
+
+    columns = {task.quadrant_id or UNASSIGNED}
+    if hasattr(task, '_loaded_quadrant_id'):
+        columns.add(task._loaded_quadrant_id or UNASSIGNED)
+    task._loaded_quadrant_id = task.quadrant_id
+    invalidate_columns(task.user_id, columns)
+    return task
+
+
+def conflict_response(conflict):
+    """Ответ 409 с текущим состоянием задачи - клиент показывает его вместо своих данных"""
+    current = conflict.current()
+    return JsonResponse({
+        'success': False,
+        'conflict': True,
+        'error': 'Задача была изменена в другой вкладке или на другом устройстве'
+                 if current else 'Задача была удалена',
+        'task': task_state(current) if current else None,
+    }, status=409)
+
+
+def tasks_conflict_response(conflict):
+    """Ответ 409 пакетного изменения: текущее состояние конфликтующих задач и id удаленных"""
+    tasks, deleted = conflict.current()
+    return JsonResponse({
+        'success': False,
+        'conflict': True,
+        'error': 'Задачи были изменены в другой вкладке или на другом устройстве',
+        'tasks': [task_state(task) for task in tasks],
+        'deleted': deleted,
+    }, status=409)
+
+
+def increment_completed_pomodoros(task_id, user_id, count=1):
+    """
+    Атомарно увеличивает счетчик выполненных Pomodoro задачи на count одним UPDATE
+    с F() (параллельные завершения сессий не теряют инкременты). Возвращает новые
+    (completed_pomodoros, estimated_pomodoros); Task.DoesNotExist - задачи нет.
+    """
+    with transaction.atomic():
+        version = MatrixVersion.bump(user_id)
+        queryset = Task.objects.filter(pk=task_id, user_id=user_id)
+        if not queryset.update(completed_pomodoros=F('completed_pomodoros') + count,
+                               change_version=version, updated_at=timezone.now()):
+            raise Task.DoesNotExist
+        # Строка заблокирована нашим UPDATE до конца транзакции - читаем свое значение
+        completed, estimated, quadrant_id = queryset.values_list(
+            'completed_pomodoros', 'estimated_pomodoros', 'quadrant_id').get()
+
+    # Карточка задачи хранит ее версию - сбрасываем фрагмент колонки
+    invalidate_columns(user_id, [quadrant_id or UNASSIGNED])
+    return completed, estimated
@@ -0,0 +1,163 @@
+# tasks/fragments.py
+"""
+Кэш отрендеренных списков задач на странице матрицы.
+
+Каждая колонка матрицы (нераспределенные задачи и четыре квадранта) кэшируется
+отдельно для каждого пользователя. Ключ фрагмента содержит токен колонки:
+при изменении задачи токены ее старой и новой колонки удаляются, и следующий
+рендер создаст новые - перенос задачи между двумя квадрантами перерисует
+только эти два фрагмента. Счетчики попаданий и промахов лежат в том же кэше
+(см. fragment_cache_stats).
+
+Токены, фрагменты и счетчики общие ровно настолько, насколько общий кэш
+(настройка CACHES): с LocMemCache сброс и счетчики видны только своему
+процессу, поэтому при нескольких процессах сервера нужен общий кэш.
+"""
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import Task
+from .quadrants import get_quadrants
+
+# Колонка нераспределенных задач (у квадрантов - их id)
+UNASSIGNED = 0
+
+# Меняется вместе с разметкой карточек в tasks/task_cards.html
+FRAGMENT_VERSION = 2
+FRAGMENT_TIMEOUT = 60 * 60 * 24
+
+HITS_KEY = 'matrix:fragments:hits'
+MISSES_KEY = 'matrix:fragments:misses'
+
+
+def _token_key(user_id, column):
+    return f'matrix:token:{user_id}:{column}'
+
+
+def _fragment_key(user_id, column, token):
+    return f'matrix:fragment:v{FRAGMENT_VERSION}:{user_id}:{column}:{token}'
+
+
+def all_columns():
+    """Все колонки матрицы: нераспределенные задачи и квадранты"""
+    return [UNASSIGNED] + [quadrant.id for quadrant in get_quadrants()]
+
+
+def _column_tokens(user_id, columns):
+    """Текущие токены колонок; для колонок без токена создаются новые"""
+    keys = {column: _token_key(user_id, column) for column in columns}
+    found = cache.get_many(keys.values())
+
+    tokens, created = {}, {}
+    for column, key in keys.items():
+        if key in found:
+            tokens[column] = found[key]
+        else:
+            tokens[column] = created[key] = uuid.uuid4().hex
+    if created:
+        cache.set_many(created, None)
+    return tokens
+
+
+def _count(key, delta):
+    if not delta:
+        return
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # Счетчика еще нет (или его вытеснили из кэша)
+        if not cache.add(key, delta, None):
+            cache.incr(key, delta)
+
+
+def render_task_columns(user):
+    """
+    Возвращает {колонка: HTML списка карточек} для матрицы пользователя.
+    Из базы читаются только задачи колонок, которых нет в кэше, - одним запросом.
+    """
+    columns = all_columns()
+    tokens = _column_tokens(user.id, columns)
+    keys = {column: _fragment_key(user.id, column, tokens[column]) for column in columns}
+
+    found = cache.get_many(keys.values())
+    fragments = {column: found[key] for column, key in keys.items() if key in found}
+    missing = [column for column in columns if column not in fragments]
+
+    _count(HITS_KEY, len(fragments))
+    _count(MISSES_KEY, len(missing))
+
+    if missing:
+        # Все недостающие колонки - одним запросом, раскладываем по колонкам за один проход
+        column_filter = Q(quadrant_id__in=[column for column in missing if column != UNASSIGNED])
+        if UNASSIGNED in missing:
+            column_filter |= Q(quadrant__isnull=True)
+
+        tasks_by_column = {column: [] for column in missing}
+        # Нераспределенные задачи тоже идут по display_order: колонку можно упорядочить
+        # перетаскиванием (reorder_columns). Порядок непереставленных задач не изменился -
+        # ключ новой задачи растет со временем создания, а при равных ключах
+        # (задачи до разреженных ключей) порядок задает created_at
+        active_tasks = Task.objects.filter(
+            column_filter,
+            user=user,
+            status='active'
+        ).order_by('display_order', 'created_at')
+
+        for task in active_tasks:
+            tasks_by_column[task.quadrant_id or UNASSIGNED].append(task)
+
+        rendered = {}
+        for column, tasks in tasks_by_column.items():
+            fragments[column] = render_to_string('tasks/task_cards.html', {'tasks': tasks})
+            rendered[keys[column]] = fragments[column]
+        cache.set_many(rendered, FRAGMENT_TIMEOUT)
+
+    return {column: mark_safe(html) for column, html in fragments.items()}
+
+
+def invalidate_columns(user_id, columns=None):
+    """
+    Сбрасывает кэш фрагментов колонок пользователя (None - всех колонок).
+    Сбрасываем сразу и после коммита: рендер, прочитавший задачи до коммита,
+    мог успеть сохранить фрагмент со старыми данными.
+    """
+    keys = [_token_key(user_id, column) for column in (all_columns() if columns is None else set(columns))]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def fragment_cache_stats():
+    """Счетчики попаданий и промахов кэша фрагментов"""
+    values = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = values.get(HITS_KEY, 0), values.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else None,
+    }
+
+
+@receiver(post_save, sender=Task)
+def invalidate_saved_task_columns(sender, instance, created, **kwargs):
+    columns = {instance.quadrant_id or UNASSIGNED}
+    if not created:
+        if hasattr(instance, '_loaded_quadrant_id'):
+            columns.add(instance._loaded_quadrant_id or UNASSIGNED)
+        else:
+            # Исходный квадрант неизвестен - сбрасываем все колонки пользователя
+            columns = None
+    instance._loaded_quadrant_id = instance.quadrant_id
+    invalidate_columns(instance.user_id, columns)
+
+
+@receiver(post_delete, sender=Task)
+def invalidate_deleted_task_columns(sender, instance, **kwargs):
+    invalidate_columns(instance.user_id, [instance.quadrant_id or UNASSIGNED])
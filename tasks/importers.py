@@ -0,0 +1,162 @@
+# tasks/importers.py
+"""
+Массовый импорт задач из CSV или JSONL.
+
+Строки читаются потоком (файл, stdin или тело HTTP-запроса) и проверяются
+по одной правилами TaskForm. Корректные задачи копятся в пакеты и пишутся
+через bulk_create - каждый пакет в своей короткой транзакции, с заранее
+вычисленными ключами порядка (без запроса MAX на каждую задачу).
+Ошибочные строки попадают в отчет и не прерывают импорт.
+
+Колонки: title (обязательно), description, quadrant (id квадранта,
+пусто - нераспределенные), estimated_pomodoros.
+"""
+import csv
+import json
+
+from django.db import transaction
+
+from .forms import TaskForm
+from .fragments import invalidate_columns, UNASSIGNED
+from .models import Task, MatrixVersion
+from .ordering import append_key
+from .quadrants import get_quadrant
+
+IMPORT_FORMATS = ('csv', 'jsonl')
+IMPORT_BATCH_SIZE = 500
+# Сколько ошибок строк возвращать в отчете (всего ошибок считаем все)
+MAX_REPORTED_ERRORS = 1000
+
+
+def iter_rows(lines, fmt):
+    """
+    Разбирает поток строк текста в пары (номер строки, данные).
+    Вместо данных может прийти текст ошибки разбора - импорт продолжается.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            yield number, 'Строка не является корректным JSON'
+            continue
+        yield number, data if isinstance(data, dict) else 'Ожидался JSON-объект'
+
+
+def _text(data, field, errors):
+    """Текстовое поле строки: строка или пусто. Значение другого типа - ошибка строки"""
+    value = data.get(field)
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        errors[field] = ['Ожидается строка']
+        return ''
+    return value.strip()
+
+
+def _estimated_pomodoros(value):
+    """
+    Оценка в Pomodoro: целое число не меньше 1 (в CSV - строка с целым числом).
+    Пусто - 1. Дробные, нулевые и отрицательные значения - ValueError.
+    """
+    if value is None or value == '':
+        return 1
+    # bool - подкласс int, но true/false оценкой не считаем
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError
+    value = int(value)
+    if value < 1:
+        raise ValueError
+    return value
+
+
+def build_task(user, data):
+    """Проверяет строку правилами TaskForm и собирает несохраненную задачу. Возвращает (task, errors)"""
+    if not isinstance(data, dict):
+        return None, {'__all__': [data]}
+
+    errors = {}
+    form = TaskForm(data={
+        'title': _text(data, 'title', errors),
+        'description': _text(data, 'description', errors),
+    })
+    if not form.is_valid():
+        for field, messages in form.errors.items():
+            errors.setdefault(field, list(messages))
+
+    quadrant = None
+    if data.get('quadrant') not in (None, '', 0, '0'):
+        value = data['quadrant']
+        # Как и оценка, id квадранта - только целое (дробное int() молча обрезал бы)
+        valid = isinstance(value, (int, str)) and not isinstance(value, bool)
+        quadrant = get_quadrant(value) if valid else None
+        if quadrant is None:
+            errors['quadrant'] = ['Квадрант не найден']
+
+    try:
+        estimated_pomodoros = _estimated_pomodoros(data.get('estimated_pomodoros'))
+    except ValueError:
+        errors['estimated_pomodoros'] = ['Должно быть целым положительным числом']
+
+    if errors:
+        return None, errors
+
+    task = form.save(commit=False)
+    task.user = user
+    task.quadrant = quadrant
+    task.status = 'active'
+    task.estimated_pomodoros = estimated_pomodoros
+    return task, {}
+
+
+def _write_batch(user, tasks):
+    """Пишет пакет задач одной транзакцией; сигналов bulk_create не шлет - версию и кэш обновляем сами"""
+    if not tasks:
+        return 0
+
+    with transaction.atomic():
+        version = MatrixVersion.bump(user.id)
+        for task in tasks:
+            task.change_version = version
+        Task.objects.bulk_create(tasks)
+        invalidate_columns(user.id, {task.quadrant_id or UNASSIGNED for task in tasks})
+    return len(tasks)
+
+
+def import_tasks(user, lines, fmt='csv', batch_size=IMPORT_BATCH_SIZE):
+    """
+    Импортирует задачи пользователя из потока строк lines в формате fmt.
+    Возвращает отчет {'created', 'error_count', 'errors': [{'row', 'errors'}]}.
+    """
+    created, error_count, errors, batch = 0, 0, [], []
+    for number, data in iter_rows(lines, fmt):
+        task, row_errors = build_task(user, data)
+        if row_errors:
+            error_count += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({'row': number, 'errors': row_errors})
+            continue
+
+        # Ключ порядка - как у обычной новой задачи: в конец колонки, по порядку строк
+        task.display_order = append_key()
+        batch.append(task)
+
+        if len(batch) >= batch_size:
+            created += _write_batch(user, batch)
+            batch = []
+
+    created += _write_batch(user, batch)
+
+    return {
+        'created': created,
+        'error_count': error_count,
+        'errors': errors,
+    }
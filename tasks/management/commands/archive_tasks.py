@@ -0,0 +1,20 @@
+# tasks/management/commands/archive_tasks.py
+from django.core.management.base import BaseCommand
+
+from tasks.archive import archive_finished_tasks, ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Переносит давно завершенные и отмененные задачи вместе с их сессиями в архив'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS,
+                            help='Сколько дней задача должна пробыть завершенной до переноса')
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE,
+                            help='Сколько задач переносить одной транзакцией')
+
+    def handle(self, *args, **options):
+        report = archive_finished_tasks(options['days'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Перенесено в архив задач: {report['tasks']}, сессий: {report['sessions']}"
+        ))
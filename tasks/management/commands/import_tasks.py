@@ -0,0 +1,41 @@
+# tasks/management/commands/import_tasks.py
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.importers import import_tasks, IMPORT_BATCH_SIZE, IMPORT_FORMATS
+
+
+class Command(BaseCommand):
+    help = 'Массовый импорт задач пользователя из CSV или JSONL (файл или "-" для stdin)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='Пользователь, которому создаются задачи')
+        parser.add_argument('path', help='Путь к файлу или "-" для чтения из stdin')
+        parser.add_argument('--format', choices=IMPORT_FORMATS,
+                            help='Формат данных (по умолчанию - по расширению файла, иначе csv)')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+                            help='Сколько задач писать одним bulk_create')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"Пользователь {options['username']} не найден")
+
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+
+        if path == '-':
+            report = import_tasks(user, sys.stdin, fmt, options['batch_size'])
+        else:
+            with open(path, encoding='utf-8-sig', newline='') as stream:
+                report = import_tasks(user, stream, fmt, options['batch_size'])
+
+        for error in report['errors']:
+            self.stderr.write(f"Строка {error['row']}: {error['errors']}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано задач: {report['created']}, строк с ошибками: {report['error_count']}"
+        ))
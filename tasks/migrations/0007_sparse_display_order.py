@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:20
+
+from django.db import migrations, models
+
+# Значение tasks.ordering.ORDER_STEP на момент миграции. Копия, а не импорт:
+# миграция не должна меняться вместе с кодом приложения
+ORDER_STEP = 1 << 16
+
+
+def spread_display_order(apps, schema_editor):
+    """Раздвигаем существующие плотные ключи 1, 2, 3... до шага ORDER_STEP внутри каждой колонки"""
+    Task = apps.get_model('tasks', 'Task')
+
+    rows = Task.objects.order_by(
+        'user_id', 'quadrant_id', 'display_order', 'created_at', 'id'
+    ).values_list('id', 'user_id', 'quadrant_id')
+
+    changed = []
+    column, position = None, 0
+    for task_id, user_id, quadrant_id in rows:
+        if (user_id, quadrant_id) != column:
+            column, position = (user_id, quadrant_id), 0
+        position += 1
+        changed.append(Task(id=task_id, display_order=position * ORDER_STEP))
+
+        if len(changed) >= 500:
+            Task.objects.bulk_update(changed, ['display_order'])
+            changed = []
+
+    Task.objects.bulk_update(changed, ['display_order'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0006_add_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='task',
+            name='display_order',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='Порядок отображения'),
+        ),
+        migrations.RunPython(spread_display_order, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('tasks', '0007_sparse_display_order'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MatrixVersion',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='Версия матрицы')),
+            ],
+            options={
+                'verbose_name': 'Версия матрицы',
+                'verbose_name_plural': 'Версии матриц',
+            },
+        ),
+    ]
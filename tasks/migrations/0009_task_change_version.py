@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0008_matrix_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_id', models.BigIntegerField(verbose_name='ID удаленной задачи')),
+                ('change_version', models.PositiveBigIntegerField(verbose_name='Версия изменения')),
+            ],
+            options={
+                'verbose_name': 'Удаленная задача',
+                'verbose_name_plural': 'Удаленные задачи',
+            },
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='change_version',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='Версия изменения'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['user', 'change_version'], name='task_user_change_idx'),
+        ),
+        migrations.AddField(
+            model_name='tasktombstone',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AddIndex(
+            model_name='tasktombstone',
+            index=models.Index(fields=['user', 'change_version'], name='tombstone_user_change_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0009_task_change_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTask',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=200, verbose_name='Заголовок')),
+                ('description', models.TextField(blank=True, verbose_name='Описание')),
+                ('status', models.CharField(choices=[('active', 'Активная'), ('completed', 'Завершена'), ('cancelled', 'Отменена')], max_length=10, verbose_name='Статус')),
+                ('display_order', models.PositiveBigIntegerField(default=0, verbose_name='Порядок отображения')),
+                ('priority', models.PositiveIntegerField(default=1, verbose_name='Приоритет (1-10)')),
+                ('due_date', models.DateTimeField(blank=True, null=True, verbose_name='Срок выполнения')),
+                ('estimated_pomodoros', models.PositiveIntegerField(default=1, verbose_name='Планируемое количество Pomodoro')),
+                ('completed_pomodoros', models.PositiveIntegerField(default=0, verbose_name='Выполнено Pomodoro')),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('completed_at', models.DateTimeField(blank=True, null=True, verbose_name='Фактическое время выполнения')),
+                ('change_version', models.PositiveBigIntegerField(default=0, verbose_name='Версия изменения')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Перенесена в архив')),
+            ],
+            options={
+                'verbose_name': 'Архивная задача',
+                'verbose_name_plural': 'Архивные задачи',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['status', 'updated_at'], name='task_status_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedtask',
+            name='quadrant',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='tasks.eisenhowerquadrant', verbose_name='Квадрант'),
+        ),
+        migrations.AddField(
+            model_name='archivedtask',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtask',
+            index=models.Index(fields=['user', 'status', 'quadrant', 'display_order', 'created_at'], name='archived_user_status_quad_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtask',
+            index=models.Index(fields=['user', 'completed_at'], name='archived_user_completed_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0010_archived_task'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='archivedtask',
+            name='archived_user_status_quad_idx',
+        ),
+        migrations.AddIndex(
+            model_name='archivedtask',
+            index=models.Index(fields=['user', 'status', 'quadrant', 'display_order', 'created_at', 'id'], name='archived_user_status_quad_idx'),
+        ),
+    ]
@@ -1,8 +1,13 @@
 # tasks/models.py
-from django.db import models  # Импортируем models ДО использования!
+from django.db import models, transaction  # Импортируем models ДО использования!
 from django.contrib.auth.models import User
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.utils import timezone
 
+from core.events import publish_event
+from .ordering import append_key
+
 
 # Сначала должны быть импорты, затем объявления моделей
 
@@ -47,8 +52,8 @@ class Task(models.Model):
     description = models.TextField(blank=True, verbose_name="Описание")
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active', verbose_name="Статус")
 
-    # Порядок отображения ВНУТРИ квадранта
-    display_order = models.PositiveIntegerField(default=0, verbose_name="Порядок отображения")
+    # Порядок отображения ВНУТРИ квадранта - разреженный ключ (см. tasks/ordering.py)
+    display_order = models.PositiveBigIntegerField(default=0, verbose_name="Порядок отображения")
 
     # Поля для 5-го модуля (выполнение) - можно оставить
     priority = models.PositiveIntegerField(default=1, verbose_name="Приоритет (1-10)")
@@ -60,20 +65,161 @@ class Task(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     completed_at = models.DateTimeField(null=True, blank=True, verbose_name="Фактическое время выполнения")
 
+    # Версия матрицы пользователя (MatrixVersion) на момент последнего изменения задачи.
+    # По ней клиенты получают только изменения "с версии N" (см. task_changes)
+    change_version = models.PositiveBigIntegerField(default=0, verbose_name="Версия изменения")
+
     class Meta:
         verbose_name = "Задача"
         verbose_name_plural = "Задачи"
         ordering = ['quadrant__priority_order', 'display_order', 'created_at']
+        indexes = [
+            # matrix_view: user + status + (quadrant IS NULL / NOT NULL), сортировка по порядку внутри квадранта
+            models.Index(fields=['user', 'status', 'quadrant', 'display_order', 'created_at'],
+                         name='task_user_status_quad_idx'),
+            # task_changes: изменения задач пользователя после версии N
+            models.Index(fields=['user', 'change_version'], name='task_user_change_idx'),
+            # archive_tasks: давно завершенные задачи (completed_at) и отмененные без него (updated_at)
+            models.Index(fields=['status', 'completed_at', 'updated_at'], name='task_status_completed_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем исходный квадрант: при переносе задачи сбрасывается кэш обеих колонок
+        if 'quadrant_id' in instance.__dict__:
+            instance._loaded_quadrant_id = instance.quadrant_id
+        return instance
+
     def save(self, *args, **kwargs):
-        # Автоматически устанавливаем порядок отображения при создании
-        if not self.pk:
-            max_order = Task.objects.filter(
-                user=self.user,
-                quadrant=self.quadrant
-            ).aggregate(models.Max('display_order'))['display_order__max'] or 0
-            self.display_order = max_order + 1
-        super().save(*args, **kwargs)
\ No newline at end of file
+        # Автоматически ставим новую задачу в конец колонки (ключ из времени, без запроса MAX)
+        if not self.pk and not self.display_order:
+            self.display_order = append_key()
+
+        # Каждое сохранение получает новую версию матрицы - в одной транзакции с записью,
+        # чтобы клиент, увидевший версию, увидел и саму задачу
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'change_version'}
+
+        with transaction.atomic():
+            self.change_version = MatrixVersion.bump(self.user_id)
+            super().save(*args, **kwargs)
+
+
+class ArchivedTask(models.Model):
+    """
+    Завершенная или отмененная задача, перенесенная из tasks_task в архив
+    (см. tasks/archive.py). id сохраняется прежним, поэтому ссылки и курсоры
+    на задачу остаются действительными. В архиве задачи только читаются.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Пользователь")
+    quadrant = models.ForeignKey(EisenhowerQuadrant, on_delete=models.PROTECT,
+                                 verbose_name="Квадрант", null=True, blank=True)
+
+    title = models.CharField(max_length=200, verbose_name="Заголовок")
+    description = models.TextField(blank=True, verbose_name="Описание")
+    status = models.CharField(max_length=10, choices=Task.STATUS_CHOICES, verbose_name="Статус")
+    display_order = models.PositiveBigIntegerField(default=0, verbose_name="Порядок отображения")
+
+    priority = models.PositiveIntegerField(default=1, verbose_name="Приоритет (1-10)")
+    due_date = models.DateTimeField(null=True, blank=True, verbose_name="Срок выполнения")
+    estimated_pomodoros = models.PositiveIntegerField(default=1, verbose_name="Планируемое количество Pomodoro")
+    completed_pomodoros = models.PositiveIntegerField(default=0, verbose_name="Выполнено Pomodoro")
+
+    # Времена переносятся из задачи как есть (без auto_now)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    completed_at = models.DateTimeField(null=True, blank=True, verbose_name="Фактическое время выполнения")
+    change_version = models.PositiveBigIntegerField(default=0, verbose_name="Версия изменения")
+
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name="Перенесена в архив")
+
+    class Meta:
+        verbose_name = "Архивная задача"
+        verbose_name_plural = "Архивные задачи"
+        indexes = [
+            # Тот же порядок, что и у живых задач, - для списка задач с курсором. id здесь
+            # обычная колонка (не rowid, как у tasks_task), поэтому входит в индекс явно:
+            # иначе ORDER BY ... id архивной части UNION сортируется во временном B-дереве
+            models.Index(fields=['user', 'status', 'quadrant', 'display_order', 'created_at', 'id'],
+                         name='archived_user_status_quad_idx'),
+            # История и аналитика: задачи пользователя по времени выполнения
+            models.Index(fields=['user', 'completed_at'], name='archived_user_completed_idx'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class MatrixVersion(models.Model):
+    """
+    Монотонный счетчик изменений задач пользователя.
+    Увеличивается при любом изменении задач и служит ETag для страницы матрицы:
+    пока версия не изменилась, браузер получает 304 без повторного рендера.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, verbose_name="Пользователь")
+    version = models.PositiveBigIntegerField(default=0, verbose_name="Версия матрицы")
+
+    class Meta:
+        verbose_name = "Версия матрицы"
+        verbose_name_plural = "Версии матриц"
+
+    def __str__(self):
+        return f"Матрица {self.user_id}: v{self.version}"
+
+    @classmethod
+    def bump(cls, user_id):
+        """Увеличивает версию матрицы пользователя атомарным UPDATE и возвращает новое значение"""
+        if not cls.objects.filter(user_id=user_id).update(version=models.F('version') + 1):
+            # Первое изменение пользователя - создаем счетчик
+            cls.objects.get_or_create(user_id=user_id)
+            cls.objects.filter(user_id=user_id).update(version=models.F('version') + 1)
+        version = cls.current(user_id)
+        # Открытые вкладки пользователя догрузят изменения "с версии N" (см. core/events.py)
+        publish_event(user_id, 'tasks', {'version': version})
+        return version
+
+    @classmethod
+    def current(cls, user_id):
+        """Текущая версия матрицы пользователя (0, если задач еще не было)"""
+        return cls.objects.filter(user_id=user_id).values_list('version', flat=True).first() or 0
+
+
+class TaskTombstone(models.Model):
+    """
+    Отметка об удаленной задаче: нужна, чтобы синхронизация "с версии N"
+    сообщила клиентам об удалении, которого в таблице задач уже не видно.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Пользователь")
+    task_id = models.BigIntegerField(verbose_name="ID удаленной задачи")
+    change_version = models.PositiveBigIntegerField(verbose_name="Версия изменения")
+
+    class Meta:
+        verbose_name = "Удаленная задача"
+        verbose_name_plural = "Удаленные задачи"
+        indexes = [
+            models.Index(fields=['user', 'change_version'], name='tombstone_user_change_idx'),
+        ]
+
+    def __str__(self):
+        return f"Задача {self.task_id} удалена (v{self.change_version})"
+
+
+# Удаление задачи меняет версию матрицы ее владельца и оставляет "надгробие" для синхронизации
+# (сохранение задачи получает версию прямо в Task.save)
+@receiver(post_delete, sender=Task)
+def record_task_deletion(sender, instance, origin=None, **kwargs):
+    # Пользователь удаляется целиком вместе с задачами - синхронизировать уже некого
+    if isinstance(origin, User) or getattr(origin, 'model', None) is User:
+        return
+
+    TaskTombstone.objects.create(
+        user_id=instance.user_id,
+        task_id=instance.pk,
+        change_version=MatrixVersion.bump(instance.user_id)
+    )
\ No newline at end of file
@@ -0,0 +1,256 @@
+# tasks/ordering.py
+"""
+Разреженные ключи порядка задач внутри квадранта (Task.display_order).
+
+Ключи - целые числа с большими промежутками между соседями, поэтому вставка
+или перемещение задачи меняет ровно одну строку: новой позиции достается
+середина промежутка между соседями. Новые задачи получают ключ из текущего
+времени в микросекундах и без запроса MAX оказываются в конце списка;
+в пределах процесса ключи строго возрастают, поэтому задачи, созданные
+в одну и ту же микросекунду (например, при импорте), не получают одинаковых
+ключей и не уходят "в будущее". Когда промежуток исчерпан, колонка
+перенумеровывается (rebalance_column) с шагом ORDER_STEP - ключи после
+перенумерации всегда меньше временных.
+
+Полный порядок колонок (reorder_columns, пакет перетаскиваний из браузера)
+сохраняется так же экономно: ключи самой длинной уже упорядоченной части
+колонки остаются на месте, новые ключи получают только переставленные задачи.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from django.db import transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.utils import timezone
+
+# Шаг между соседними ключами после перенумерации колонки
+ORDER_STEP = 1 << 16
+# Задач в одном условном UPDATE пакетной перестановки (ограничение числа параметров SQLite)
+REORDER_WRITE_BATCH = 500
+
+
+_last_key = 0
+_key_lock = threading.Lock()
+
+
+def append_key():
+    """Ключ для задачи в конце колонки - текущее время в микросекундах, строго возрастающее в процессе"""
+    global _last_key
+    with _key_lock:
+        _last_key = max(time.time_ns() // 1000, _last_key + 1)
+        return _last_key
+
+
+def key_between(before, after):
+    """
+    Ключ между соседями before и after (None - нет соседа с этой стороны).
+    Возвращает None, если свободного ключа между ними нет и нужна перенумерация.
+    """
+    if after is None:
+        # В конец колонки: не раньше последней задачи и не раньше "сейчас"
+        return append_key() if before is None else max(before + 1, append_key())
+
+    low = before if before is not None else 0
+    if after - low > 1:
+        return (low + after) // 2
+    return None
+
+
+def rebalance_column(queryset, change_version):
+    """
+    Перенумеровывает задачи колонки с шагом ORDER_STEP, сохраняя текущий порядок.
+    Пишет одним bulk_update только задачи, чей ключ изменился, и помечает их
+    версией change_version. Возвращает словарь {task_id: новый ключ}.
+    """
+    tasks = list(queryset.order_by('display_order', 'created_at', 'id').only('id', 'display_order'))
+
+    changed = []
+    for position, task in enumerate(tasks, start=1):
+        key = position * ORDER_STEP
+        if task.display_order != key:
+            task.display_order = key
+            task.change_version = change_version
+            changed.append(task)
+
+    queryset.model.objects.bulk_update(changed, ['display_order', 'change_version'], batch_size=500)
+    return {task.id: task.display_order for task in tasks}
+
+
+def move_task(task, quadrant_id, before_id=None, after_id=None, expected_version=None):
+    """
+    Перемещает задачу в колонку quadrant_id (None - нераспределенные) между
+    задачами before_id и after_id. Обычно обновляет только саму задачу;
+    соседей трогает лишь перенумерация при исчерпании промежутка.
+    Если задачу изменили после версии expected_version - TaskConflict.
+    """
+    # tasks.models сам импортирует этот модуль
+    from .concurrency import save_task_fields
+    from .models import MatrixVersion
+
+    column = task.__class__.objects.filter(
+        user_id=task.user_id,
+        quadrant_id=quadrant_id,
+        status='active'
+    ).exclude(pk=task.pk)
+
+    with transaction.atomic():
+        neighbour_ids = [pk for pk in (before_id, after_id) if pk]
+        keys = dict(column.filter(pk__in=neighbour_ids).values_list('id', 'display_order'))
+
+        key = key_between(keys.get(before_id), keys.get(after_id))
+        if key is None:
+            keys = rebalance_column(column, MatrixVersion.bump(task.user_id))
+            key = key_between(keys.get(before_id), keys.get(after_id))
+            if key is None:
+                # Соседи переданы в неверном порядке - ставим задачу сразу после before
+                key = keys.get(before_id, 0) + 1
+
+        task.quadrant_id = quadrant_id
+        task.display_order = key
+        save_task_fields(task, ['quadrant', 'display_order'], expected_version)
+
+    return task
+
+
+def _increasing_positions(keys):
+    """Позиции самой длинной строго возрастающей подпоследовательности keys (None пропускаются)"""
+    tails, tail_positions, parents = [], [], {}
+    for position, key in enumerate(keys):
+        if key is None:
+            continue
+        index = bisect_left(tails, key)
+        parents[position] = tail_positions[index - 1] if index else None
+        if index == len(tails):
+            tails.append(key)
+            tail_positions.append(position)
+        else:
+            tails[index] = key
+            tail_positions[index] = position
+
+    result = set()
+    position = tail_positions[-1] if tail_positions else None
+    while position is not None:
+        result.add(position)
+        position = parents[position]
+    return result
+
+
+def column_keys(keys):
+    """
+    Ключи колонки в новом порядке. keys - текущие ключи задач в желаемом порядке
+    (None - задача переходит из другой колонки). Ключи самой длинной уже
+    упорядоченной подпоследовательности сохраняются, остальные задачи получают
+    ключи из промежутков между ними. Возвращает None, если промежутков не хватило
+    и колонку нужно перенумеровать.
+    """
+    kept = _increasing_positions(keys)
+    result = list(keys)
+    previous = None
+    position = 0
+    while position < len(keys):
+        if position in kept:
+            previous = keys[position]
+            position += 1
+            continue
+
+        # Серия задач без ключа до следующей сохраняемой задачи (или до конца колонки)
+        end = position
+        while end < len(keys) and end not in kept:
+            end += 1
+        if end < len(keys):
+            low = previous if previous is not None else 0
+            step = (keys[end] - low) // (end - position + 1)
+            if step < 1:
+                return None
+            for offset, index in enumerate(range(position, end), start=1):
+                result[index] = low + step * offset
+        else:
+            for index in range(position, end):
+                result[index] = previous = key_between(previous, None)
+        position = end
+    return result
+
+
+def reorder_columns(user_id, columns):
+    """
+    Сохраняет полный порядок колонок пользователя. columns - список пар
+    (quadrant_id или None, [(task_id, ожидаемая версия), ...]) в нужном порядке.
+
+    Записываются только задачи, у которых изменились колонка или ключ, условным
+    UPDATE: строка меняется, только если ее версия равна ожидаемой. Если какую-то
+    задачу изменили, удалили или завершили в другой вкладке либо в колонке есть
+    задачи, которых клиент не видел, - TasksConflict, и ничего не записывается.
+    Возвращает (версия, {task_id: (quadrant_id, ключ)} измененных задач).
+    """
+    # tasks.models сам импортирует этот модуль
+    from .concurrency import TasksConflict
+    from .fragments import invalidate_columns, UNASSIGNED
+    from .models import MatrixVersion, Task
+
+    expected = {task_id: version for _, tasks in columns for task_id, version in tasks}
+    tasks = Task.objects.filter(user_id=user_id, status='active')
+
+    with transaction.atomic():
+        current = {
+            task_id: (quadrant_id, key)
+            for task_id, quadrant_id, key in tasks.filter(pk__in=expected).values_list(
+                'id', 'quadrant_id', 'display_order')
+        }
+        missing = [task_id for task_id in expected if task_id not in current]
+        if missing:
+            raise TasksConflict(missing)
+
+        # Колонка должна быть передана целиком: задача, которой клиент не видел, - конфликт
+        quadrant_ids = [quadrant_id for quadrant_id, _ in columns]
+        in_columns = tasks.filter(quadrant_id__in=[pk for pk in quadrant_ids if pk is not None])
+        if None in quadrant_ids:
+            in_columns = in_columns | tasks.filter(quadrant__isnull=True)
+        unseen = list(in_columns.exclude(pk__in=expected).values_list('id', flat=True))
+        if unseen:
+            raise TasksConflict(unseen)
+
+        changes = {}
+        for quadrant_id, column in columns:
+            task_ids = [task_id for task_id, _ in column]
+            keys = [current[task_id][1] if current[task_id][0] == quadrant_id else None for task_id in task_ids]
+            new_keys = column_keys(keys)
+            if new_keys is None:
+                new_keys = [position * ORDER_STEP for position in range(1, len(task_ids) + 1)]
+            for task_id, key in zip(task_ids, new_keys):
+                if current[task_id] != (quadrant_id, key):
+                    changes[task_id] = (quadrant_id, key)
+        if not changes:
+            return None, {}
+
+        version = MatrixVersion.bump(user_id)
+        now = timezone.now()
+        changed_ids = list(changes)
+        for start in range(0, len(changed_ids), REORDER_WRITE_BATCH):
+            batch = changed_ids[start:start + REORDER_WRITE_BATCH]
+
+            def case(values):
+                return Case(*(When(pk=task_id, then=Value(value)) for task_id, value in values),
+                            output_field=IntegerField())
+
+            updated = Task.objects.filter(
+                user_id=user_id, pk__in=batch,
+                # Версия сверяется в том же UPDATE, что и запись
+                change_version=case((task_id, expected[task_id]) for task_id in batch),
+            ).update(
+                quadrant_id=case((task_id, changes[task_id][0]) for task_id in batch),
+                display_order=case((task_id, changes[task_id][1]) for task_id in batch),
+                change_version=version,
+                updated_at=now,
+            )
+            if updated != len(batch):
+                # Исключение внутри atomic откатывает уже записанные части пакета и версию матрицы
+                # Конфликтуют задачи, которых этот UPDATE не записал
+                written = set(Task.objects.filter(pk__in=batch, change_version=version).values_list('id', flat=True))
+                raise TasksConflict([task_id for task_id in batch if task_id not in written])
+
+    # UPDATE не шлет post_save: сбрасываем фрагменты колонок, откуда и куда ушли задачи
+    touched = {current[task_id][0] or UNASSIGNED for task_id in changes}
+    touched.update(quadrant_id or UNASSIGNED for quadrant_id, _ in changes.values())
+    invalidate_columns(user_id, touched)
+    return version, changes
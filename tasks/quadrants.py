@@ -0,0 +1,77 @@
+# tasks/quadrants.py
+"""
+Кэш квадрантов матрицы в памяти процесса.
+
+Квадрантов всего четыре, они создаются миграцией и почти никогда не меняются,
+поэтому читаем их из базы не чаще раза в QUADRANTS_TTL секунд на процесс.
+Редактирование в админке сразу сбрасывает кэш своего процесса через сигналы
+post_save / post_delete; остальные процессы сервера увидят изменение, когда
+истечет их QUADRANTS_TTL.
+Объекты из кэша общие для всех запросов - изменять их нельзя.
+"""
+import hashlib
+import threading
+import time
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import EisenhowerQuadrant
+
+# Сколько секунд процесс использует прочитанные квадранты без обращения к базе
+QUADRANTS_TTL = 60
+
+_lock = threading.Lock()
+_cache = None  # (квадранты по порядку, словарь по id, подпись содержимого, когда прочитаны)
+
+
+def _fresh(cache):
+    return cache is not None and time.monotonic() - cache[3] < QUADRANTS_TTL
+
+
+def _load():
+    global _cache
+    cache = _cache
+    if not _fresh(cache):
+        with _lock:
+            if not _fresh(_cache):
+                quadrants = tuple(EisenhowerQuadrant.objects.order_by('priority_order'))
+                raw = repr([(q.id, q.name, q.description, q.priority_order, q.color_code, q.icon)
+                            for q in quadrants])
+                _cache = (quadrants, {q.id: q for q in quadrants}, hashlib.md5(raw.encode('utf-8')).hexdigest(),
+                          time.monotonic())
+            cache = _cache
+    return cache
+
+
+def get_quadrants():
+    """Все квадранты в порядке отображения"""
+    return list(_load()[0])
+
+
+def get_quadrant(quadrant_id):
+    """Квадрант по id или None, если такого нет"""
+    try:
+        return _load()[1].get(int(quadrant_id))
+    except (TypeError, ValueError):
+        return None
+
+
+def quadrants_signature():
+    """Хэш содержимого квадрантов - меняется при любом их редактировании"""
+    return _load()[2]
+
+
+def invalidate_quadrants():
+    """Сбрасывает кэш процесса - следующее обращение перечитает квадранты из базы"""
+    global _cache
+    _cache = None
+
+
+@receiver(post_save, sender=EisenhowerQuadrant)
+@receiver(post_delete, sender=EisenhowerQuadrant)
+def reset_quadrants_cache(sender, **kwargs):
+    # Сбрасываем сразу и еще раз после коммита, чтобы не закэшировать незакоммиченные данные
+    invalidate_quadrants()
+    transaction.on_commit(invalidate_quadrants)
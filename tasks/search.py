@@ -0,0 +1,129 @@
+# tasks/search.py
+"""
+Полнотекстовый поиск по задачам через индекс SQLite FTS5.
+
+Индекс tasks_task_fts - внешняя таблица FTS5 поверх tasks_task (хранит только
+индекс, текст берется из самой таблицы задач). Синхронизацию ведут триггеры,
+поэтому в индекс попадают и bulk_create / bulk_update / update().
+Схема создается после migrate (сигнал post_migrate): пересоздание таблицы
+задач в миграциях SQLite удаляет триггеры, и они создаются заново.
+
+В индекс входит и user_id, поэтому поиск пользователя - это пересечение
+списков в самом FTS (user_id : 42 AND ...), а не фильтр по всем совпадениям.
+Если FTS5 недоступен (другая СУБД или SQLite без FTS5), поиск работает
+через icontains.
+"""
+import re
+
+from django.db import connection, OperationalError
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Task
+
+FTS_TABLE = 'tasks_task_fts'
+
+FTS_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, description, user_id,
+        content='tasks_task', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS tasks_task_fts_insert AFTER INSERT ON tasks_task BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, description, user_id)
+        VALUES (new.id, new.title, new.description, new.user_id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS tasks_task_fts_delete AFTER DELETE ON tasks_task BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description, user_id)
+        VALUES ('delete', old.id, old.title, old.description, old.user_id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS tasks_task_fts_update AFTER UPDATE OF title, description ON tasks_task BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description, user_id)
+        VALUES ('delete', old.id, old.title, old.description, old.user_id);
+        INSERT INTO {FTS_TABLE}(rowid, title, description, user_id)
+        VALUES (new.id, new.title, new.description, new.user_id);
+    END""",
+]
+
+# Вес совпадений в заголовке выше, чем в описании; user_id в ранжировании не участвует
+FTS_RANK = f'bm25({FTS_TABLE}, 10.0, 1.0, 0.0)'
+
+SEARCH_MAX_LIMIT = 100
+
+_fts_ready = False
+
+
+def fts_available():
+    """Есть ли в базе индекс FTS5 для задач (положительный ответ запоминаем на процесс)"""
+    global _fts_ready
+    if not _fts_ready and connection.vendor == 'sqlite':
+        _fts_ready = FTS_TABLE in connection.introspection.table_names()
+    return _fts_ready
+
+
+def ensure_fts_schema(using='default', **kwargs):
+    """
+    Создает индекс и триггеры, если их нет (обработчик post_migrate).
+    Только что созданный индекс заполняется из существующих задач.
+    """
+    from django.db import connections
+
+    conn = connections[using]
+    if conn.vendor != 'sqlite':
+        return
+
+    created = FTS_TABLE not in conn.introspection.table_names()
+    try:
+        with conn.cursor() as cursor:
+            for statement in FTS_SCHEMA:
+                cursor.execute(statement)
+            if created:
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    except OperationalError:
+        # SQLite собран без FTS5 - остаемся на поиске через icontains
+        pass
+
+
+def build_match(query):
+    """
+    Превращает пользовательский запрос в выражение MATCH: каждое слово ищется
+    как префикс ("слово"*), все слова должны встретиться. None - если слов нет.
+    """
+    words = re.findall(r'\w+', query)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def matching_ids(query):
+    """Подзапрос id задач всех пользователей, подходящих под запрос (для админки)"""
+    match = build_match(query)
+    return RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        [f'{{title description}} : ({match})']
+    )
+
+
+def search_tasks(user, query, limit=20):
+    """Задачи пользователя по запросу, лучшие совпадения первыми. Возвращает список задач"""
+    match = build_match(query)
+    if match is None:
+        return []
+
+    if not fts_available():
+        # Запасной вариант: каждое слово должно встретиться в заголовке или описании
+        queryset = Task.objects.filter(user=user)
+        for word in re.findall(r'\w+', query):
+            queryset = queryset.filter(Q(title__icontains=word) | Q(description__icontains=word))
+        return list(queryset.order_by('-updated_at')[:limit])
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY {FTS_RANK} LIMIT %s',
+            [f'user_id : "{int(user.id)}" AND {{title description}} : ({match})', limit]
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+
+    tasks = Task.objects.in_bulk(ids)
+    return [tasks[task_id] for task_id in ids if task_id in tasks]
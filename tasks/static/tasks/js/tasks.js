@@ -1,4 +1,8 @@
 // tasks/static/tasks/js/tasks.js - УПРОЩЕННАЯ ВЕРСИЯ
+
+// Задержка перед отправкой накопленных перетаскиваний (мс)
+const REORDER_DELAY = 800;
+
 class TaskManager {
     constructor() {
         this.init();
@@ -9,6 +13,7 @@ class TaskManager {
         this.setupEventListeners();
         this.setupDragAndDrop();
         this.setupModal();
+        this.setupSync();
     }
 
     setupEventListeners() {
@@ -69,6 +74,113 @@ class TaskManager {
             container.addEventListener('dragover', (e) => this.handleDragOver(e));
             container.addEventListener('drop', (e) => this.handleDrop(e));
         });
+
+        // Несохраненные перетаскивания: карточка -> исходная колонка, измененные колонки
+        this.pendingOrigins = new Map();
+        this.pendingColumns = new Set();
+        this.reorderTimer = null;
+        this.reordering = false;
+        // Уходя со страницы, отправляем накопленное сразу
+        window.addEventListener('pagehide', () => this.flushReorder(true));
+    }
+
+    // Синхронизация с другими вкладками и устройствами: догружаем только изменения
+    setupSync() {
+        const container = document.getElementById('matrix-container');
+        if (!container) return;
+
+        this.version = parseInt(container.dataset.version) || 0;
+        this.syncing = false;
+
+        // Сервер сообщает о новой версии матрицы через поток событий (core/events.py)
+        if (window.EventSource) {
+            this.events = new EventSource('/events/');
+            this.events.addEventListener('tasks', (e) => {
+                if (JSON.parse(e.data).version > this.version) this.syncChanges();
+            });
+            this.events.addEventListener('resync', () => this.syncChanges());
+        }
+
+        // Проверяем изменения при возвращении на вкладку; периодически - только без потока событий
+        document.addEventListener('visibilitychange', () => {
+            if (!document.hidden) this.syncChanges();
+        });
+        setInterval(() => {
+            const streaming = this.events && this.events.readyState === EventSource.OPEN;
+            if (!document.hidden && !streaming) this.syncChanges();
+        }, 30000);
+    }
+
+    async syncChanges() {
+        if (this.syncing) return;
+        this.syncing = true;
+
+        try {
+            const response = await fetch(`/tasks/api/changes/?since=${this.version}`);
+            const result = await response.json();
+            if (!result.success) return;
+
+            let needsReload = false;
+            result.tasks.forEach(task => {
+                if (!this.applyTaskChange(task)) needsReload = true;
+            });
+            result.deleted.forEach(taskId => {
+                document.querySelector(`.task-card[data-task-id="${taskId}"]`)?.remove();
+            });
+
+            this.version = result.version;
+
+            // Карточки новых задач рендерит сервер - проще перезагрузить страницу
+            if (needsReload) location.reload();
+
+        } catch (error) {
+            console.error('Error syncing tasks:', error);
+        } finally {
+            this.syncing = false;
+        }
+    }
+
+    // Применяет изменение задачи к странице; false - если карточки на странице нет
+    applyTaskChange(task) {
+        const card = document.querySelector(`.task-card[data-task-id="${task.id}"]`);
+
+        if (task.status !== 'active') {
+            if (card) card.remove();
+            return true;
+        }
+        if (!card) return false;
+
+        card.querySelector('.task-title').textContent = task.title;
+        this.setCardDescription(card, task.description);
+        card.dataset.version = task.change_version ?? task.version;
+
+        const container = task.quadrant_id ?
+                          document.getElementById(`quadrant-${task.quadrant_id}`) :
+                          document.getElementById('tasks-list');
+        if (!container) return false;
+
+        // Ставим карточку по ключу порядка среди соседей
+        card.dataset.order = task.display_order;
+        const nextCard = Array.from(container.querySelectorAll('.task-card'))
+            .find(other => other !== card && Number(other.dataset.order) > task.display_order);
+        container.insertBefore(card, nextCard || null);
+        return true;
+    }
+
+    setCardDescription(card, description) {
+        const descElement = card.querySelector('.task-description');
+        if (description) {
+            if (descElement) {
+                descElement.textContent = description;
+            } else {
+                const newDesc = document.createElement('p');
+                newDesc.className = 'task-description';
+                newDesc.textContent = description;
+                card.appendChild(newDesc);
+            }
+        } else if (descElement) {
+            descElement.remove();
+        }
     }
 
     async handleCreateTask(e) {
@@ -135,6 +247,8 @@ class TaskManager {
             const title = taskElement.querySelector('.task-title').textContent;
             const description = taskElement.querySelector('.task-description')?.textContent || '';
 
+            // Запоминаем версию, которую видит пользователь: если задачу изменят в другой вкладке, сервер вернет 409
+            this.editingVersion = taskElement.dataset.version;
             document.getElementById('edit-task-id').value = taskId;
             document.getElementById('edit-task-title').value = title;
             document.getElementById('edit-task-description').value = description;
@@ -173,7 +287,8 @@ class TaskManager {
                 },
                 body: new URLSearchParams({
                     'title': title,
-                    'description': description
+                    'description': description,
+                    'version': this.editingVersion || ''
                 })
             });
 
@@ -183,25 +298,16 @@ class TaskManager {
                 const taskElement = document.querySelector(`[data-task-id="${taskId}"]`);
                 if (taskElement) {
                     taskElement.querySelector('.task-title').textContent = title;
-
-                    const descElement = taskElement.querySelector('.task-description');
-                    if (description) {
-                        if (descElement) {
-                            descElement.textContent = description;
-                        } else {
-                            const newDesc = document.createElement('p');
-                            newDesc.className = 'task-description';
-                            newDesc.textContent = description;
-                            taskElement.appendChild(newDesc);
-                        }
-                    } else if (descElement) {
-                        descElement.remove();
-                    }
+                    this.setCardDescription(taskElement, description);
+                    taskElement.dataset.version = result.task.version;
                 }
 
                 this.closeModal();
                 this.showNotification('Задача обновлена', 'success');
 
+            } else if (result.conflict) {
+                this.handleConflict(taskId, result);
+                this.closeModal();
             } else {
                 this.showNotification('Ошибка обновления задачи', 'error');
             }
@@ -259,7 +365,7 @@ class TaskManager {
         e.dataTransfer.dropEffect = 'move';
     }
 
-    async handleDrop(e) {
+    handleDrop(e) {
         e.preventDefault();
 
         const taskId = e.dataTransfer.getData('text/plain');
@@ -269,41 +375,145 @@ class TaskManager {
 
         if (!targetContainer || !draggedTask) return;
 
-        let quadrantId = 0;
-        if (targetContainer.classList.contains('tasks-container')) {
-            quadrantId = targetContainer.dataset.quadrantId;
+        // Запоминаем исходную колонку карточки, чтобы вернуть её при ошибке
+        const sourceContainer = draggedTask.parentElement;
+
+        // Вставляем карточку в место падения (перед карточкой под курсором)
+        const afterElement = this.getCardAfterPointer(targetContainer, e.clientY);
+        if (afterElement) {
+            targetContainer.insertBefore(draggedTask, afterElement);
+        } else {
+            targetContainer.appendChild(draggedTask);
         }
 
-        const tasksInTarget = targetContainer.querySelectorAll('.task-card');
-        const newOrder = tasksInTarget.length;
+        // Порядок сохраняем пакетом: перетаскивания за REORDER_DELAY уходят одним запросом
+        this.queueReorder(draggedTask, sourceContainer, targetContainer);
+    }
+
+    queueReorder(card, sourceContainer, targetContainer) {
+        // Исходная колонка нужна, чтобы вернуть карточку, если пакет не сохранится
+        if (!this.pendingOrigins.has(card)) {
+            this.pendingOrigins.set(card, sourceContainer);
+        }
+        this.pendingColumns.add(sourceContainer);
+        this.pendingColumns.add(targetContainer);
+
+        clearTimeout(this.reorderTimer);
+        this.reorderTimer = setTimeout(() => this.flushReorder(), REORDER_DELAY);
+    }
+
+    columnQuadrantId(container) {
+        return container.classList.contains('tasks-container') ?
+               parseInt(container.dataset.quadrantId) : 0;
+    }
+
+    // Отправляет полный порядок измененных колонок с версиями задач, которые видел клиент
+    async flushReorder(keepalive = false) {
+        clearTimeout(this.reorderTimer);
+        if (!this.pendingColumns.size) return;
+
+        // Один запрос за раз: перетаскивания во время запроса уйдут следующим пакетом
+        if (this.reordering) {
+            this.reorderTimer = setTimeout(() => this.flushReorder(), REORDER_DELAY);
+            return;
+        }
+
+        const origins = this.pendingOrigins;
+        const containers = this.pendingColumns;
+        this.pendingOrigins = new Map();
+        this.pendingColumns = new Set();
+
+        const columns = Array.from(containers, container => ({
+            quadrant_id: this.columnQuadrantId(container),
+            tasks: Array.from(container.querySelectorAll('.task-card'), card => ({
+                id: parseInt(card.dataset.taskId),
+                version: parseInt(card.dataset.version)
+            }))
+        }));
 
+        this.reordering = true;
         try {
-            const response = await fetch('/tasks/tasks/reorder/', {
+            const response = await fetch('/tasks/tasks/reorder/batch/', {
                 method: 'POST',
+                keepalive: keepalive,
                 headers: {
                     'Content-Type': 'application/json',
                     'X-CSRFToken': this.getCSRFToken()
                 },
-                body: JSON.stringify({
-                    task_id: parseInt(taskId),
-                    new_quadrant_id: parseInt(quadrantId),
-                    new_order: newOrder
-                })
+                body: JSON.stringify({ columns: columns })
             });
 
             const result = await response.json();
 
             if (result.success) {
-                targetContainer.appendChild(draggedTask);
-                this.showNotification('Задача перемещена', 'success');
+                result.tasks.forEach(task => {
+                    const card = document.querySelector(`.task-card[data-task-id="${task.id}"]`);
+                    if (card) {
+                        card.dataset.order = task.display_order;
+                        card.dataset.version = task.version;
+                    }
+                });
+                if (result.updated) this.showNotification('Задача перемещена', 'success');
+            } else if (result.conflict) {
+                // Пакет не сохранен целиком: возвращаем карточки и показываем актуальное состояние
+                this.restoreOrder(origins, containers);
+                this.handleBatchConflict(result);
             } else {
                 throw new Error(result.error || 'Ошибка перемещения задачи');
             }
 
         } catch (error) {
-            console.error('Error moving task:', error);
+            console.error('Error moving tasks:', error);
+            this.restoreOrder(origins, containers);
             this.showNotification(error.message, 'error');
+        } finally {
+            this.reordering = false;
+        }
+    }
+
+    // Возвращает карточки несохраненных перетаскиваний на места по сохраненным ключам порядка
+    restoreOrder(origins, containers) {
+        origins.forEach((container, card) => container.appendChild(card));
+        new Set([...containers, ...origins.values()]).forEach(container => {
+            Array.from(container.querySelectorAll('.task-card'))
+                .sort((a, b) => Number(a.dataset.order) - Number(b.dataset.order))
+                .forEach(card => container.appendChild(card));
+        });
+    }
+
+    handleBatchConflict(result) {
+        let needsReload = false;
+        result.tasks.forEach(task => {
+            if (!this.applyTaskChange(task)) needsReload = true;
+        });
+        result.deleted.forEach(taskId => {
+            document.querySelector(`.task-card[data-task-id="${taskId}"]`)?.remove();
+        });
+        this.showNotification(result.error, 'error');
+        // Задачи, которых нет на странице, рендерит сервер
+        if (needsReload) location.reload();
+    }
+
+    // Задачу изменили в другой вкладке или на другом устройстве: показываем актуальное состояние
+    handleConflict(taskId, result) {
+        if (result.task) {
+            if (!this.applyTaskChange(result.task)) location.reload();
+        } else {
+            document.querySelector(`.task-card[data-task-id="${taskId}"]`)?.remove();
+        }
+        this.showNotification(result.error, 'error');
+    }
+
+    // Карточка, перед которой нужно вставить перетаскиваемую задачу (по вертикали курсора)
+    getCardAfterPointer(container, y) {
+        const cards = container.querySelectorAll('.task-card:not(.dragging)');
+        for (const card of cards) {
+            const box = card.getBoundingClientRect();
+            if (y < box.top + box.height / 2) {
+                return card;
+            }
         }
+        return null;
     }
 
     handleDragEnd(e) {
@@ -1,134 +1,770 @@
-# tasks/views.py
-from django.shortcuts import render, get_object_or_404, redirect
-from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
-from django.views.decorators.http import require_http_methods
-from .models import Task, EisenhowerQuadrant
-from .forms import TaskForm, TaskReorderForm
-
-
-@login_required
-def matrix_view(request):
-    """
-    Основное представление матрицы Эйзенхауэра
-    """
-    # Получаем все квадранты
-    quadrants = EisenhowerQuadrant.objects.all().order_by('priority_order')
-
-    # Получаем задачи пользователя, сгруппированные по квадрантам
-    tasks_by_quadrant = {}
-    for quadrant in quadrants:
-        tasks = Task.objects.filter(
-            user=request.user,
-            quadrant=quadrant,
-            status='active'
-        ).order_by('display_order', 'priority', 'created_at')
-        tasks_by_quadrant[quadrant.id] = tasks
-
-    # Форма для создания новой задачи
-    task_form = TaskForm()
-
-    context = {
-        'quadrants': quadrants,
-        'tasks_by_quadrant': tasks_by_quadrant,
-        'task_form': task_form,
-    }
-
-    return render(request, 'tasks/eisenhower_matrix.html', context)
-
-
-@login_required
-@require_http_methods(["POST"])
-def create_task(request):
-    """
-    Создание новой задачи
-    """
-    form = TaskForm(request.POST)
-    if form.is_valid():
-        task = form.save(commit=False)
-        task.user = request.user
-        task.save()
-        return JsonResponse({
-            'success': True,
-            'task_id': task.id,
-            'quadrant_id': task.quadrant.id
-        })
-    else:
-        return JsonResponse({
-            'success': False,
-            'errors': form.errors
-        })
-
-
-@login_required
-@require_http_methods(["POST"])
-def update_task(request, task_id):
-    """
-    Обновление задачи
-    """
-    task = get_object_or_404(Task, id=task_id, user=request.user)
-    form = TaskForm(request.POST, instance=task)
-    if form.is_valid():
-        form.save()
-        return JsonResponse({'success': True})
-    else:
-        return JsonResponse({
-            'success': False,
-            'errors': form.errors
-        })
-
-
-@login_required
-@require_http_methods(["POST"])
-def delete_task(request, task_id):
-    """
-    Удаление задачи
-    """
-    task = get_object_or_404(Task, id=task_id, user=request.user)
-    task.delete()
-    return JsonResponse({'success': True})
-
-
-@login_required
-@require_http_methods(["POST"])
-def reorder_tasks(request):
-    """
-    Перемещение задачи между квадрантами и изменение порядка
-    """
-    form = TaskReorderForm(request.POST)
-    if form.is_valid():
-        task_id = form.cleaned_data['task_id']
-        new_quadrant_id = form.cleaned_data['new_quadrant_id']
-        new_order = form.cleaned_data['new_order']
-
-        task = get_object_or_404(Task, id=task_id, user=request.user)
-        new_quadrant = get_object_or_404(EisenhowerQuadrant, id=new_quadrant_id)
-
-        # Обновляем квадрант и порядок
-        task.quadrant = new_quadrant
-        task.display_order = new_order
-        task.save()
-
-        return JsonResponse({'success': True})
-    else:
-        return JsonResponse({
-            'success': False,
-            'errors': form.errors
-        })
-
-
-@login_required
-@require_http_methods(["POST"])
-def complete_task(request, task_id):
-    """
-    Отметка задачи как выполненной
-    """
-    task = get_object_or_404(Task, id=task_id, user=request.user)
-    task.status = 'completed'
-    task.save()
-    return JsonResponse({'success': True})
-
-
-from django.test import TestCase
-
-# Create your tests here.
+import base64
+import json
+import re
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from pomodoro.models import PomodoroSession, ArchivedPomodoroSession
+from .archive import TASK_FIELDS, archive_finished_tasks
+from .concurrency import TaskConflict, task_state
+from .fragments import UNASSIGNED, fragment_cache_stats, render_task_columns
+from .importers import import_tasks
+from .models import Task, ArchivedTask, EisenhowerQuadrant, MatrixVersion, TaskTombstone
+from . import quadrants
+from .ordering import ORDER_STEP, append_key, column_keys, key_between, move_task, rebalance_column
+from .search import FTS_TABLE, fts_available, search_tasks
+from .views import matrix_etag
+
+
+def explain(sql):
+    """Возвращает план выполнения запроса SQLite (EXPLAIN QUERY PLAN) одной строкой"""
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+        return ' | '.join(row[-1] for row in cursor.fetchall())
+
+
+class MatrixQueryPlanTests(TestCase):
+    """Проверяем, что запросы матрицы к таблице задач идут по индексу, а не полным сканированием"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('planner', password='secret-pass-123')
+        quadrant = EisenhowerQuadrant.objects.order_by('priority_order').first()
+        for i in range(20):
+            Task.objects.create(user=cls.user, title=f'Задача {i}', quadrant=quadrant if i % 2 else None)
+
+    def test_matrix_view_uses_task_index(self):
+        cache.clear()  # Иначе колонки могут отдаться из кэша фрагментов без запроса к задачам
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('tasks:matrix'))
+        self.assertEqual(response.status_code, 200)
+
+        task_queries = [q['sql'] for q in ctx.captured_queries
+                        if q['sql'].startswith('SELECT') and 'FROM "tasks_task"' in q['sql']]
+        self.assertTrue(task_queries)
+        for sql in task_queries:
+            plan = explain(sql)
+            self.assertNotIn('SCAN tasks_task', plan, sql)
+            self.assertIn('task_user_status_quad_idx', plan, sql)
+
+
+class TaskListArchiveQueryPlanTests(TestCase):
+    """Список завершенных задач читает рабочую таблицу и архив (UNION ALL) по индексам без сортировки"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('archivist', password='secret-pass-123')
+        now = timezone.now()
+        for i in range(6):
+            task = Task.objects.create(user=cls.user, title=f'Задача {i}', status='completed', completed_at=now)
+            if i % 2:
+                ArchivedTask.objects.create(**{field: getattr(task, field) for field in TASK_FIELDS})
+                task.delete()
+
+    def test_both_halves_use_index_with_cursor(self):
+        self.client.force_login(self.user)
+        params = {'status': 'completed', 'quadrant': 0, 'limit': 2}
+        seen = []
+        with CaptureQueriesContext(connection) as ctx:
+            while True:
+                data = self.client.get(reverse('tasks:task_list'), params).json()
+                seen.extend(task['id'] for task in data['tasks'])
+                if not data['next_cursor']:
+                    break
+                params['cursor'] = data['next_cursor']
+        # Курсор проходит обе таблицы целиком, без повторов
+        self.assertEqual(len(seen), 6)
+        self.assertEqual(len(set(seen)), 6)
+
+        union_queries = [q['sql'] for q in ctx.captured_queries if 'UNION ALL' in q['sql']]
+        self.assertTrue(union_queries)
+        for sql in union_queries:
+            plan = explain(sql)
+            self.assertIn('archived_user_status_quad_idx', plan, sql)
+            self.assertIn('task_user_status_quad_idx', plan, sql)
+            self.assertNotIn('TEMP B-TREE', plan, sql)
+
+
+class TaskListCursorTests(TestCase):
+    """Курсор списка задач: колонка курсора должна быть из списка колонок запроса"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('paginator', password='secret-pass-123')
+        cls.quadrant = EisenhowerQuadrant.objects.get(priority_order=4)
+        for i in range(3):
+            Task.objects.create(user=cls.user, title=f'Задача {i}', quadrant=cls.quadrant)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def get(self, column_index):
+        task = Task.objects.order_by('id').first()
+        cursor = base64.urlsafe_b64encode(json.dumps(
+            [column_index, task.display_order, task.created_at.isoformat(), task.id]).encode()).decode('ascii')
+        return self.client.get(reverse('tasks:task_list'), {'quadrant': self.quadrant.id, 'cursor': cursor}).json()
+
+    def test_column_index_out_of_range_rejected(self):
+        # В запросе одна колонка: -1 указал бы на нее же "с конца", 1 - за пределы списка
+        for column_index in (-1, 1):
+            self.assertEqual(self.get(column_index), {'success': False, 'error': 'Неверные параметры запроса'})
+        data = self.get(0)
+        self.assertTrue(data['success'])
+        self.assertEqual(len(data['tasks']), 2)
+
+
+class ArchiveFinishedTasksTests(TestCase):
+    """Перенос в архив: отбор по времени выполнения, перенос сессий, надгробия для синхронизации"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('archiver', password='secret-pass-123')
+
+    def make_task(self, title, status, completed_days_ago=None, updated_days_ago=0):
+        now = timezone.now()
+        task = Task.objects.create(user=self.user, title=title, status=status)
+        # update(), а не save(): иначе auto_now перезапишет updated_at
+        Task.objects.filter(pk=task.pk).update(
+            completed_at=None if completed_days_ago is None else now - timedelta(days=completed_days_ago),
+            updated_at=now - timedelta(days=updated_days_ago),
+        )
+        return task
+
+    def test_selects_by_completed_at_with_updated_at_fallback(self):
+        # Завершена давно, но недавно правилась - все равно в архив
+        old_edited = self.make_task('old edited', 'completed', completed_days_ago=40, updated_days_ago=1)
+        # Завершена недавно, updated_at старый - остается
+        self.make_task('recent', 'completed', completed_days_ago=5, updated_days_ago=40)
+        # Отмененная без времени выполнения - по updated_at
+        cancelled = self.make_task('cancelled', 'cancelled', updated_days_ago=40)
+        self.make_task('cancelled recently', 'cancelled', updated_days_ago=5)
+        self.make_task('active', 'active', updated_days_ago=40)
+
+        self.assertEqual(archive_finished_tasks(days=30)['tasks'], 2)
+        self.assertEqual(set(ArchivedTask.objects.values_list('id', flat=True)), {old_edited.id, cancelled.id})
+        self.assertEqual(set(Task.objects.values_list('title', flat=True)),
+                         {'recent', 'cancelled recently', 'active'})
+
+    def test_moves_sessions_and_leaves_tombstones(self):
+        task = self.make_task('done', 'completed', completed_days_ago=40)
+        session = PomodoroSession.objects.create(user=self.user, task=task)
+        since = MatrixVersion.current(self.user.id)
+
+        self.assertEqual(archive_finished_tasks(days=30), {'tasks': 1, 'sessions': 1})
+        self.assertFalse(PomodoroSession.objects.filter(pk=session.pk).exists())
+        self.assertTrue(ArchivedPomodoroSession.objects.filter(pk=session.pk, task_id=task.id).exists())
+
+        # Клиент, синхронизирующийся с версии до переноса, узнает, что задачи больше нет
+        self.assertGreater(MatrixVersion.current(self.user.id), since)
+        self.assertEqual(list(TaskTombstone.objects.values_list('task_id', flat=True)), [task.id])
+        self.client.force_login(self.user)
+        data = self.client.get(reverse('tasks:task_changes'), {'since': since}).json()
+        self.assertEqual((data['tasks'], data['deleted']), ([], [task.id]))
+
+
+class MatrixEtagTests(TestCase):
+    """Условный GET матрицы: 304 без чтения задач, пока не изменились задачи, квадранты или CSRF-cookie"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('etagged', password='secret-pass-123')
+        cls.quadrant = EisenhowerQuadrant.objects.get(priority_order=1)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.task = Task.objects.create(user=self.user, title='Карточка', quadrant=self.quadrant)
+        # Первая загрузка выдает CSRF-cookie; она входит в ETag, дальше браузер шлет ее всегда
+        self.client.get(reverse('tasks:matrix'))
+
+    def get(self, etag=None, url='tasks:matrix'):
+        headers = {'if_none_match': etag} if etag else {}
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(url), headers=headers)
+        return response, [q['sql'] for q in ctx.captured_queries if 'FROM "tasks_task"' in q['sql']]
+
+    def test_not_modified_without_reading_tasks(self):
+        response, _ = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('no-cache', response['Cache-Control'])
+        etag = response['ETag']
+
+        response, task_queries = self.get(etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(task_queries, [])
+        # Тот же ETag у синхронизации изменений
+        self.assertEqual(self.get(etag, 'tasks:task_changes')[0].status_code, 304)
+
+    def test_changes_produce_new_etag(self):
+        etag = self.get()[0]['ETag']
+        self.task.title = 'Изменена'
+        self.task.save()
+        response, _ = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Изменена')
+
+        # Правка квадранта тоже меняет страницу
+        etag = response['ETag']
+        self.quadrant.name = 'Срочно и важно!'
+        self.quadrant.save()
+        self.assertEqual(self.get(etag)[0].status_code, 200)
+
+    def test_etag_is_per_user(self):
+        other = User.objects.create_user('neighbour')
+        etags = []
+        for user in (self.user, other):
+            request = RequestFactory().get(reverse('tasks:matrix'), HTTP_COOKIE='csrftoken=same')
+            request.user, request.META['CSRF_COOKIE'] = user, 'same'
+            etags.append(matrix_etag(request))
+        self.assertNotEqual(*etags)
+        self.assertIsNone(matrix_etag(RequestFactory().post(reverse('tasks:matrix'))))
+
+
+class TaskChangesTests(TestCase):
+    """Синхронизация "с версии N": измененные задачи и надгробия удаленных, по индексам версии"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('syncer', password='secret-pass-123')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.kept, self.edited, self.deleted = (
+            Task.objects.create(user=self.user, title=title) for title in ('Без изменений', 'Правка', 'Удалить')
+        )
+
+    def changes(self, since):
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(reverse('tasks:task_changes'), {'since': since}).json()
+        self.assertTrue(data['success'], data)
+        return data, ctx
+
+    def test_changes_and_deletions_since_version(self):
+        since = MatrixVersion.current(self.user.id)
+        self.edited.title = 'Исправлено'
+        self.edited.save()
+        deleted_id = self.deleted.id
+        self.assertTrue(self.client.post(reverse('tasks:delete_task', args=[deleted_id])).json()['success'])
+
+        data, ctx = self.changes(since)
+        self.assertEqual(data['version'], MatrixVersion.current(self.user.id))
+        self.assertEqual([(task['id'], task['title']) for task in data['tasks']], [(self.edited.id, 'Исправлено')])
+        self.assertEqual(data['deleted'], [deleted_id])
+        self.assertEqual(TaskTombstone.objects.get(task_id=deleted_id).change_version, data['version'])
+
+        for table, index in (('tasks_task', 'task_user_change_idx'), ('tasks_tasktombstone', 'tombstone_user_change_idx')):
+            [sql] = [q['sql'] for q in ctx.captured_queries if f'FROM "{table}"' in q['sql']]
+            self.assertIn(index, explain(sql), sql)
+
+        # С новой версии изменений нет
+        data, _ = self.changes(data['version'])
+        self.assertEqual((data['tasks'], data['deleted']), ([], []))
+
+    def test_archived_tasks_reported_as_deleted(self):
+        since = MatrixVersion.current(self.user.id)
+        Task.objects.filter(pk=self.kept.pk).update(status='completed',
+                                                    completed_at=timezone.now() - timedelta(days=40))
+        archive_finished_tasks(days=30)
+
+        data, _ = self.changes(since)
+        self.assertEqual((data['tasks'], data['deleted']), ([], [self.kept.id]))
+        self.assertGreater(data['version'], since)
+
+    def test_user_deletion_leaves_no_tombstones(self):
+        other = User.objects.create_user('leaver')
+        Task.objects.create(user=other, title='Задача')
+        other.delete()
+        self.assertFalse(TaskTombstone.objects.filter(user_id=other.id).exists())
+
+    def test_invalid_version(self):
+        data = self.client.get(reverse('tasks:task_changes'), {'since': 'abc'}).json()
+        self.assertFalse(data['success'])
+
+
+class TaskSearchTests(TestCase):
+    """Поиск FTS5: ранжирование, префиксы, только свои задачи, индекс следует за изменениями через триггеры"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('seeker', password='secret-pass-123')
+        cls.other = User.objects.create_user('stranger')
+        cls.in_title = Task.objects.create(user=cls.user, title='Квартальный отчет', description='Сводка для банка')
+        cls.in_description = Task.objects.create(user=cls.user, title='Встреча', description='Обсудить отчет')
+        cls.accented = Task.objects.create(user=cls.user, title='Café menu')
+        Task.objects.create(user=cls.other, title='Чужой отчет')
+
+    def setUp(self):
+        self.assertTrue(fts_available())
+
+    def found(self, query, user=None):
+        return [task.id for task in search_tasks(user or self.user, query)]
+
+    def fts_rows(self, task_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+                           [f'user_id : "{self.user.id}"'])
+            total = cursor.fetchone()[0]
+            cursor.execute(f'SELECT title FROM {FTS_TABLE} WHERE rowid = %s', [task_id])
+            return total, [row[0] for row in cursor.fetchall()]
+
+    def test_ranking_prefix_and_user_isolation(self):
+        # Совпадение в заголовке выше совпадения в описании; чужая задача не находится
+        self.assertEqual(self.found('отчет'), [self.in_title.id, self.in_description.id])
+        self.assertEqual(self.found('отч'), [self.in_title.id, self.in_description.id])
+        # Все слова обязательны, регистр и диакритика не важны
+        self.assertEqual(self.found('ОТЧЕТ банка'), [self.in_title.id])
+        self.assertEqual(self.found('cafe'), [self.accented.id])
+        self.assertEqual(self.found('"*'), [])
+
+    def test_triggers_follow_writes(self):
+        created = Task.objects.bulk_create([Task(user=self.user, title='Годовой бюджет')])[0]
+        self.assertEqual(self.found('бюджет'), [created.id])
+
+        # update() минует save(), но индекс обновляют триггеры
+        Task.objects.filter(pk=self.in_title.pk).update(title='Квартальный план')
+        self.assertEqual(self.found('отчет'), [self.in_description.id])
+        self.assertEqual(self.found('план'), [self.in_title.id])
+
+        total, _ = self.fts_rows(self.in_description.id)
+        self.in_description.delete()
+        self.assertEqual(self.found('отчет'), [])
+        self.assertEqual(self.fts_rows(self.in_description.id), (total - 1, []))
+
+        # Перенос в архив удаляет задачи из tasks_task - триггер убирает их из индекса
+        Task.objects.filter(pk=created.pk).update(status='completed', completed_at=timezone.now() - timedelta(days=40))
+        archive_finished_tasks(days=30)
+        self.assertEqual(self.found('бюджет'), [])
+
+    def test_fallback_without_fts(self):
+        with mock.patch('tasks.search.fts_available', return_value=False):
+            self.assertEqual(set(self.found('отчет')), {self.in_title.id, self.in_description.id})
+            self.assertEqual(self.found('отчет банка'), [self.in_title.id])
+
+    def test_search_endpoint(self):
+        self.client.force_login(self.user)
+        url = reverse('tasks:task_search')
+        data = self.client.get(url, {'q': 'отчет', 'limit': 1}).json()
+        self.assertEqual([task['id'] for task in data['tasks']], [self.in_title.id])
+        self.assertEqual(self.client.get(url, {'q': ''}).json()['tasks'], [])
+        self.assertFalse(self.client.get(url, {'q': 'отчет', 'limit': 'x'}).json()['success'])
+
+
+class FragmentCacheTests(TestCase):
+    """Кэш колонок матрицы: попадания, промахи и сброс только затронутых колонок"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('cached', password='secret-pass-123')
+        cls.first, cls.second = EisenhowerQuadrant.objects.order_by('priority_order')[:2]
+
+    def setUp(self):
+        cache.clear()
+        self.task = Task.objects.create(user=self.user, title='Карточка', quadrant=self.first)
+
+    def render(self):
+        """Рендер колонок: (HTML по колонкам, сколько колонок пришлось рендерить, запросов к задачам)"""
+        misses = fragment_cache_stats()['misses']
+        with CaptureQueriesContext(connection) as ctx:
+            columns = render_task_columns(self.user)
+        task_queries = [q for q in ctx.captured_queries if 'FROM "tasks_task"' in q['sql']]
+        return columns, fragment_cache_stats()['misses'] - misses, len(task_queries)
+
+    def test_hit_after_miss(self):
+        columns, rendered, queries = self.render()
+        self.assertEqual((rendered, queries), (5, 1))
+        self.assertIn('Карточка', columns[self.first.id])
+
+        cached, rendered, queries = self.render()
+        self.assertEqual((rendered, queries), (0, 0))
+        self.assertEqual(cached, columns)
+        stats = fragment_cache_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_ratio']), (5, 5, 0.5))
+
+    def test_single_pass_matches_per_column_queries(self):
+        quadrants = list(EisenhowerQuadrant.objects.all())
+        for number in range(12):
+            Task.objects.create(user=self.user, title=f'Задача {number}',
+                                quadrant=quadrants[number % 5] if number % 5 < 4 else None)
+        # Задачи до разреженных ключей: одинаковый ключ, порядок по времени создания
+        for number in range(3):
+            Task.objects.create(user=self.user, title=f'Старая {number}', display_order=0)
+        Task.objects.create(user=User.objects.create_user('stranger'), title='Чужая', quadrant=quadrants[0])
+        Task.objects.create(user=self.user, title='Выполнена', quadrant=quadrants[0], status='completed')
+
+        columns, _, queries = self.render()
+        self.assertEqual(queries, 1)
+        active = Task.objects.filter(user=self.user, status='active')
+        # Запросы по колонкам, как было до однопроходной раскладки
+        expected = {UNASSIGNED: active.filter(quadrant__isnull=True).order_by('created_at')}
+        for quadrant in quadrants:
+            expected[quadrant.id] = active.filter(quadrant=quadrant).order_by('display_order', 'created_at')
+        for column, tasks in expected.items():
+            self.assertEqual([int(pk) for pk in re.findall(r'id="task-(\d+)"', columns[column])],
+                             [task.id for task in tasks], column)
+
+    def test_save_resets_old_and_new_column(self):
+        self.render()
+        self.task.quadrant = self.second
+        self.task.save()
+        columns, rendered, _ = self.render()
+        self.assertEqual(rendered, 2)
+        self.assertNotIn('Карточка', columns[self.first.id])
+        self.assertIn('Карточка', columns[self.second.id])
+
+        # Новая задача сбрасывает только свою колонку
+        Task.objects.create(user=self.user, title='Новая')
+        columns, rendered, _ = self.render()
+        self.assertEqual(rendered, 1)
+        self.assertIn('Новая', columns[UNASSIGNED])
+
+    def test_delete_resets_column(self):
+        self.render()
+        self.task.delete()
+        columns, rendered, _ = self.render()
+        self.assertEqual(rendered, 1)
+        self.assertNotIn('Карточка', columns[self.first.id])
+
+    def test_columns_are_per_user(self):
+        self.render()
+        other = User.objects.create_user('other-cached')
+        Task.objects.create(user=other, title='Чужая', quadrant=self.first)
+        _, rendered, _ = self.render()
+        self.assertEqual(rendered, 0)
+
+
+class QuadrantsCacheTests(TestCase):
+    """Квадранты читаются из базы один раз на QUADRANTS_TTL и сбрасываются при редактировании"""
+
+    def setUp(self):
+        quadrants.invalidate_quadrants()
+
+    def test_read_once(self):
+        with self.assertNumQueries(1):
+            ordered = quadrants.get_quadrants()
+            self.assertEqual(quadrants.get_quadrant(ordered[0].id), ordered[0])
+            self.assertIsNone(quadrants.get_quadrant('нет'))
+            quadrants.quadrants_signature()
+        self.assertEqual([q.priority_order for q in ordered], sorted(q.priority_order for q in ordered))
+
+    def test_edit_resets_cache_and_signature(self):
+        signature = quadrants.quadrants_signature()
+        quadrant = EisenhowerQuadrant.objects.order_by('priority_order').first()
+        quadrant.name = 'Переименован'
+        quadrant.save()
+        self.assertEqual(quadrants.get_quadrant(quadrant.id).name, 'Переименован')
+        self.assertNotEqual(quadrants.quadrants_signature(), signature)
+
+    def test_other_process_change_seen_after_ttl(self):
+        # Правка в другом процессе: сигнал сюда не приходит, только update в базе
+        quadrant = quadrants.get_quadrants()[0]
+        EisenhowerQuadrant.objects.filter(pk=quadrant.pk).update(name='Из другого процесса')
+        self.assertEqual(quadrants.get_quadrant(quadrant.id).name, quadrant.name)
+
+        later = quadrants.time.monotonic() + quadrants.QUADRANTS_TTL + 1
+        with mock.patch.object(quadrants.time, 'monotonic', return_value=later):
+            self.assertEqual(quadrants.get_quadrant(quadrant.id).name, 'Из другого процесса')
+
+
+class ImportTasksTests(TestCase):
+    """Импорт задач: неверные строки попадают в отчет и не прерывают импорт"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('importer', password='secret-pass-123')
+        cls.quadrant = EisenhowerQuadrant.objects.order_by('priority_order').first()
+
+    def import_jsonl(self, rows):
+        return import_tasks(self.user, [json.dumps(row) for row in rows], 'jsonl', batch_size=2)
+
+    def test_bad_rows_reported_good_rows_created(self):
+        report = self.import_jsonl([
+            {'title': 'Первая', 'quadrant': self.quadrant.id, 'estimated_pomodoros': 3},
+            {'title': 123},
+            {'title': 'Описание не строка', 'description': ['a']},
+            {'title': 'Дробная оценка', 'estimated_pomodoros': 2.7},
+            {'title': 'Нулевая оценка', 'estimated_pomodoros': 0},
+            {'title': 'Логическая оценка', 'estimated_pomodoros': True},
+            {'title': 'Дробный квадрант', 'quadrant': self.quadrant.id + 0.5},
+            {'title': '   '},
+            {'title': 'Вторая', 'estimated_pomodoros': '2'},
+            {'title': 'Третья'},
+        ])
+        self.assertEqual(report['created'], 3)
+        self.assertEqual(report['error_count'], 7)
+        self.assertEqual(
+            [(error['row'], sorted(error['errors'])) for error in report['errors']],
+            [(2, ['title']), (3, ['description']), (4, ['estimated_pomodoros']),
+             (5, ['estimated_pomodoros']), (6, ['estimated_pomodoros']), (7, ['quadrant']), (8, ['title'])],
+        )
+
+        tasks = list(Task.objects.filter(user=self.user).order_by('display_order'))
+        self.assertEqual([task.title for task in tasks], ['Первая', 'Вторая', 'Третья'])
+        self.assertEqual([task.estimated_pomodoros for task in tasks], [3, 2, 1])
+        self.assertEqual(tasks[0].quadrant_id, self.quadrant.id)
+
+    def test_csv_endpoint(self):
+        self.client.force_login(self.user)
+        body = 'title,description,quadrant,estimated_pomodoros\nКупить,молоко,,2\n,без названия,,\nПозвонить,,,1.5\n'
+        response = self.client.post(reverse('tasks:bulk_import_tasks') + '?format=csv', body,
+                                    content_type='text/csv')
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['created'], 1)
+        self.assertEqual([error['row'] for error in data['errors']], [3, 4])
+
+        # Строка, которая не является JSON, тоже только попадает в отчет
+        report = import_tasks(self.user, ['{"title": "Ок"}', '{oops', '[1]'], 'jsonl')
+        self.assertEqual((report['created'], report['error_count']), (1, 2))
+
+
+class OrderingTests(TestCase):
+    """Разреженные ключи порядка: перемещение меняет одну строку, перенумерация сохраняет порядок"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('sorter')
+        cls.quadrants = list(EisenhowerQuadrant.objects.order_by('priority_order'))
+
+    def column(self, quadrant=None):
+        return list(Task.objects.filter(user=self.user, quadrant=quadrant, status='active')
+                    .order_by('display_order', 'created_at', 'id').values_list('title', flat=True))
+
+    def make_tasks(self, titles, quadrant=None, keys=None):
+        tasks = [Task.objects.create(user=self.user, title=title, quadrant=quadrant) for title in titles]
+        for task, key in zip(tasks, keys or []):
+            Task.objects.filter(pk=task.pk).update(display_order=key)
+            task.display_order = key
+        return tasks
+
+    def test_key_between(self):
+        self.assertEqual(key_between(10, 20), 15)
+        self.assertEqual(key_between(None, 4), 2)
+        self.assertIsNone(key_between(10, 11))
+        self.assertIsNone(key_between(None, 1))
+        self.assertGreater(key_between(10 ** 18, None), 10 ** 18)
+        self.assertGreater(key_between(None, None), 10 ** 15)
+
+    def test_append_key_strictly_increasing(self):
+        keys = [append_key() for _ in range(10000)]
+        self.assertEqual(keys, sorted(set(keys)))
+        # Ключи из времени всегда больше ключей после перенумерации
+        self.assertGreater(keys[0], 10 ** 6 * ORDER_STEP)
+
+    def test_created_and_imported_tasks_keep_creation_order(self):
+        self.make_tasks(['первая'])
+        import_tasks(self.user, [json.dumps({'title': f'импорт {number}'}) for number in range(3)], 'jsonl')
+        self.make_tasks(['последняя'])
+        self.assertEqual(self.column(), ['первая', 'импорт 0', 'импорт 1', 'импорт 2', 'последняя'])
+
+    def test_rebalance_column(self):
+        self.make_tasks(['a', 'b', 'c'], keys=[3, 1, 2])
+        version = MatrixVersion.bump(self.user.id)
+        keys = rebalance_column(Task.objects.filter(user=self.user, quadrant=None, status='active'), version)
+
+        self.assertEqual(self.column(), ['b', 'c', 'a'])
+        self.assertEqual(sorted(keys.values()), [ORDER_STEP, 2 * ORDER_STEP, 3 * ORDER_STEP])
+        self.assertEqual(set(Task.objects.filter(user=self.user).values_list('change_version', flat=True)),
+                         {version})
+
+    def test_move_task_updates_one_row(self):
+        quadrant = self.quadrants[0]
+        a, b, c = self.make_tasks(['a', 'b', 'c'], quadrant, keys=[ORDER_STEP, 2 * ORDER_STEP, 3 * ORDER_STEP])
+        task = self.make_tasks(['new'])[0]
+
+        with CaptureQueriesContext(connection) as ctx:
+            move_task(task, quadrant.id, before_id=a.id, after_id=b.id)
+        task_updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "tasks_task"')]
+        self.assertEqual(len(task_updates), 1)
+        self.assertEqual(self.column(quadrant), ['a', 'new', 'b', 'c'])
+        self.assertEqual(self.column(), [])
+
+        # В конец колонки - без соседа справа
+        move_task(a, quadrant.id, before_id=c.id)
+        self.assertEqual(self.column(quadrant), ['new', 'b', 'c', 'a'])
+
+    def test_move_task_rebalances_exhausted_gap(self):
+        a, b = self.make_tasks(['a', 'b'], keys=[5, 6])
+        task = self.make_tasks(['middle'], keys=[7])[0]
+        move_task(task, None, before_id=a.id, after_id=b.id)
+        self.assertEqual(self.column(), ['a', 'middle', 'b'])
+        a.refresh_from_db()
+        self.assertEqual(a.display_order % ORDER_STEP, 0)
+
+    def test_column_keys_keep_ordered_tasks(self):
+        step = ORDER_STEP
+        # Задача 3*step переставлена в начало: остальные ключи остаются, она получает ключ перед 1*step
+        keys = column_keys([3 * step, step, 2 * step, 4 * step])
+        self.assertEqual(keys[1:], [step, 2 * step, 4 * step])
+        self.assertLess(keys[0], step)
+        # Задачи из другой колонки (None) встают в промежутки и в конец
+        keys = column_keys([None, step, None, None, 2 * step, None])
+        self.assertEqual(keys, sorted(set(keys)))
+        self.assertEqual((keys[1], keys[4]), (step, 2 * step))
+        # Промежутка не хватает - нужна перенумерация
+        self.assertIsNone(column_keys([1, None, None, 2]))
+
+    def test_move_task_with_stale_version(self):
+        task = self.make_tasks(['a'])[0]
+        stale = task.change_version
+        Task.objects.get(pk=task.pk).save()
+        with self.assertRaises(TaskConflict):
+            move_task(task, self.quadrants[1].id, expected_version=stale)
+        task.refresh_from_db()
+        self.assertIsNone(task.quadrant_id)
+
+
+class ReorderTasksBatchTests(TestCase):
+    """Пакетная перестановка: полный порядок колонок, запись только измененных задач, 409 при чужих изменениях"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('dragger', password='secret-pass-123')
+        cls.quadrant = EisenhowerQuadrant.objects.order_by('priority_order').first()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.tasks = [Task.objects.create(user=self.user, title=title) for title in 'abcd']
+
+    def column(self, quadrant=None):
+        return list(Task.objects.filter(user=self.user, quadrant=quadrant, status='active')
+                    .order_by('display_order').values_list('title', flat=True))
+
+    def items(self, *tasks):
+        return [{'id': task.id, 'version': task.change_version} for task in tasks]
+
+    def reorder(self, *columns):
+        return self.client.post(reverse('tasks:reorder_tasks_batch'), json.dumps({'columns': [
+            {'quadrant_id': quadrant_id, 'tasks': tasks} for quadrant_id, tasks in columns
+        ]}), content_type='application/json')
+
+    def test_writes_only_moved_tasks_in_one_update(self):
+        a, b, c, d = self.tasks
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.reorder((0, self.items(a, c, d)), (self.quadrant.id, self.items(b)))
+        data = response.json()
+        self.assertTrue(data['success'], data)
+        # b ушла в квадрант; порядок a, c, d не менялся - их строки не пишутся
+        self.assertEqual([task['id'] for task in data['tasks']], [b.id])
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "tasks_task"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.column(), ['a', 'c', 'd'])
+        self.assertEqual(self.column(self.quadrant), ['b'])
+
+        for task in self.tasks:
+            task.refresh_from_db()
+        self.reorder((0, self.items(d, a, c)))
+        self.assertEqual(self.column(), ['d', 'a', 'c'])
+
+    def test_stale_version_returns_409_and_writes_nothing(self):
+        a, b, c, d = self.tasks
+        items = self.items(d, c, b, a)
+        Task.objects.get(pk=c.pk).save()
+
+        response = self.reorder((0, items))
+        self.assertEqual(response.status_code, 409)
+        data = response.json()
+        self.assertTrue(data['conflict'])
+        c.refresh_from_db()
+        self.assertEqual(data['tasks'], [json.loads(json.dumps(task_state(c), default=str))])
+        self.assertEqual(data['deleted'], [])
+        self.assertEqual(self.column(), ['a', 'b', 'c', 'd'])
+        self.assertEqual(Task.objects.filter(user=self.user, change_version__gt=c.change_version).count(), 0)
+
+    def test_deleted_or_unseen_task_returns_409(self):
+        a, b, c, d = self.tasks
+        items = self.items(b, a, c, d)
+        deleted_id = d.id
+        d.delete()
+        response = self.reorder((0, items))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['deleted'], [deleted_id])
+
+        # В колонке есть задача, которой клиент не видел
+        new = Task.objects.create(user=self.user, title='new')
+        response = self.reorder((0, self.items(b, a, c)))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual([task['id'] for task in response.json()['tasks']], [new.id])
+        self.assertEqual(self.column(), ['a', 'b', 'c', 'new'])
+
+    def test_several_drops_in_one_request(self):
+        # Пакет перетаскиваний из матрицы: две колонки, ответ дает карточкам новые ключи и версии
+        a, b, c, d = self.tasks
+        response = self.reorder((0, self.items(d, b)), (self.quadrant.id, self.items(c, a)))
+        data = response.json()
+        self.assertTrue(data['success'], data)
+        self.assertEqual(self.column(), ['d', 'b'])
+        self.assertEqual(self.column(self.quadrant), ['c', 'a'])
+        for state in data['tasks']:
+            task = Task.objects.get(pk=state['id'])
+            self.assertEqual((state['display_order'], state['version']), (task.display_order, task.change_version))
+
+        # Следующий пакет с версиями из ответа проходит без конфликта
+        for task in self.tasks:
+            task.refresh_from_db()
+        response = self.reorder((self.quadrant.id, self.items(a, c)))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.column(self.quadrant), ['a', 'c'])
+
+    def test_matrix_cards_carry_order_and_version(self):
+        # Клиент собирает пакет из data-атрибутов карточек
+        response = self.client.get(reverse('tasks:matrix'))
+        task = self.tasks[0]
+        self.assertContains(response, f'data-order="{task.display_order}"')
+        self.assertContains(response, f'data-version="{task.change_version}"')
+
+    def test_version_required(self):
+        response = self.reorder((0, [{'id': task.id} for task in self.tasks]))
+        self.assertFalse(response.json()['success'])
+        self.assertEqual(self.column(), ['a', 'b', 'c', 'd'])
+
+
+class TaskConflictResponseTests(TestCase):
+    """Изменения задачи с устаревшей версией отвечают 409 с текущим состоянием и ничего не пишут"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('editor', password='secret-pass-123')
+        cls.quadrant = EisenhowerQuadrant.objects.order_by('priority_order').first()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.task = Task.objects.create(user=self.user, title='Исходная')
+        self.stale = self.task.change_version
+        Task.objects.filter(pk=self.task.pk).update(title='Из другой вкладки', change_version=self.stale + 1)
+
+    def assert_conflict(self, response):
+        self.assertEqual(response.status_code, 409)
+        data = response.json()
+        self.assertTrue(data['conflict'])
+        self.assertEqual(data['task']['title'], 'Из другой вкладки')
+        self.assertEqual(data['task']['version'], self.stale + 1)
+        self.task.refresh_from_db()
+        self.assertEqual((self.task.title, self.task.quadrant_id), ('Из другой вкладки', None))
+
+    def test_update_task(self):
+        self.assert_conflict(self.client.post(reverse('tasks:update_task', args=[self.task.id]),
+                                              {'title': 'Моя правка', 'version': self.stale}))
+
+    def test_reorder_task(self):
+        self.assert_conflict(self.client.post(reverse('tasks:reorder_tasks'), json.dumps({
+            'task_id': self.task.id, 'new_quadrant_id': self.quadrant.id, 'version': self.stale,
+        }), content_type='application/json'))
+
+    def test_deleted_task(self):
+        task_id = self.task.id
+        self.task.delete()
+        response = self.client.post(reverse('tasks:reorder_tasks'), json.dumps({
+            'task_id': task_id, 'new_quadrant_id': self.quadrant.id, 'version': self.stale,
+        }), content_type='application/json')
+        # Задачи нет - обычная ошибка "не найдена", не конфликт
+        self.assertFalse(response.json()['success'])
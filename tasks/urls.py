@@ -9,4 +9,10 @@ urlpatterns = [
     path('task/<int:task_id>/update/', views.update_task, name='update_task'),
     path('task/<int:task_id>/delete/', views.delete_task, name='delete_task'),
     path('tasks/reorder/', views.reorder_tasks, name='reorder_tasks'),
+    path('tasks/reorder/batch/', views.reorder_tasks_batch, name='reorder_tasks_batch'),
+    path('api/tasks/', views.task_list, name='task_list'),
+    path('api/changes/', views.task_changes, name='task_changes'),
+    path('api/search/', views.task_search, name='task_search'),
+    path('api/import/', views.bulk_import_tasks, name='bulk_import_tasks'),
+    path('api/cache-stats/', views.matrix_cache_stats, name='matrix_cache_stats'),
 ]
\ No newline at end of file
@@ -1,41 +1,62 @@
 # tasks/views.py
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.http import JsonResponse
+from django.views.decorators.cache import cache_control
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
+from django.db.models import Q
 from django.utils import timezone
+import base64
+import binascii
+import csv
+import hashlib
 import json
+import logging
+from datetime import datetime
 
-from .models import Task, EisenhowerQuadrant
+from .models import Task, EisenhowerQuadrant, MatrixVersion, TaskTombstone
 from .forms import TaskForm, TaskReorderForm
+from .archive import tasks_with_archive
+from .concurrency import (
+    TaskConflict, TasksConflict, conflict_response, tasks_conflict_response, parse_version,
+    save_task_fields, task_state,
+)
+from .importers import import_tasks, IMPORT_FORMATS
+from .search import search_tasks, SEARCH_MAX_LIMIT
+from .fragments import render_task_columns, invalidate_columns, fragment_cache_stats, all_columns, UNASSIGNED
+from .ordering import move_task, reorder_columns
+from .quadrants import get_quadrant, get_quadrants, quadrants_signature
 
+logger = logging.getLogger(__name__)
 
-@login_required
-def matrix_view(request):
-    """Страница с матрицей и списком нераспределенных задач"""
 
-    # Получаем все квадранты
-    quadrants = EisenhowerQuadrant.objects.all().order_by('priority_order')
+def matrix_etag(request, *args, **kwargs):
+    """
+    ETag для страниц и JSON с задачами пользователя.
+    Складывается из версии матрицы пользователя, данных квадрантов и CSRF-cookie
+    (страница содержит CSRF-токен, который меняется после повторного входа).
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return None
 
-    # Получаем задачи без квадранта (еще не распределенные)
-    unassigned_tasks = Task.objects.filter(
-        user=request.user,
-        quadrant__isnull=True,
-        status='active'
-    ).order_by('created_at')
+    # Запоминаем версию, чтобы представление не читало ее второй раз
+    version = request.matrix_version = MatrixVersion.current(request.user.id)
+    csrf_cookie = request.META.get('CSRF_COOKIE', '')
 
-    # Получаем все распределенные задачи (с квадрантами)
-    tasks_with_quadrants = Task.objects.filter(
-        user=request.user,
-        quadrant__isnull=False,
-        status='active'
-    ).order_by('quadrant__priority_order', 'display_order', 'created_at')
+    raw = f'{request.user.id}:{version}:{quadrants_signature()}:{csrf_cookie}'
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=matrix_etag)
+def matrix_view(request):
+    """Страница с матрицей и списком нераспределенных задач"""
 
     # Обработка POST запроса (создание задачи)
     if request.method == 'POST':
-        print("POST request received")  # Для отладки
-        print("POST data:", dict(request.POST))  # Для отладки
-
         # Используем нашу упрощенную форму
         form = TaskForm(request.POST)
         if form.is_valid():
@@ -48,10 +69,9 @@ def matrix_view(request):
                 task.priority = 1  # Значение по умолчанию
                 task.estimated_pomodoros = 1  # Значение по умолчанию
                 task.completed_pomodoros = 0  # Значение по умолчанию
-                task.display_order = 0  # Значение по умолчанию
                 task.save()
 
-                print(f"Task created: {task.id} - {task.title}")  # Для отладки
+                logger.debug('Задача %s создана пользователем %s', task.id, request.user.id)
 
                 return JsonResponse({
                     'success': True,
@@ -62,26 +82,36 @@ def matrix_view(request):
                 })
 
             except Exception as e:
-                print(f"Error creating task: {e}")  # Для отладки
-                import traceback
-                traceback.print_exc()  # Печатаем полный traceback
+                logger.exception('Ошибка создания задачи')
 
                 return JsonResponse({
                     'success': False,
                     'errors': {'__all__': [f'Ошибка создания задачи: {str(e)}']}
                 })
         else:
-            print("Form errors:", form.errors)  # Для отладки
+            logger.debug('Задача не создана, ошибки формы: %s', form.errors.as_json())
             return JsonResponse({
                 'success': False,
                 'errors': form.errors
             })
 
     # GET запрос - просто показываем страницу
+
+    # Версию читаем до задач: изменения после нее клиент догрузит через task_changes
+    matrix_version = getattr(request, 'matrix_version', None)
+    if matrix_version is None:
+        matrix_version = MatrixVersion.current(request.user.id)
+
+    # Получаем все квадранты (из кэша процесса, без запроса к базе)
+    quadrants = get_quadrants()
+
+    # Списки карточек по колонкам: из кэша фрагментов, недостающие - одним запросом к задачам
+    task_columns = render_task_columns(request.user)
+
     context = {
         'quadrants': quadrants,
-        'unassigned_tasks': unassigned_tasks,
-        'tasks': tasks_with_quadrants,
+        'task_columns': task_columns,
+        'matrix_version': matrix_version,
     }
 
     return render(request, 'tasks/eisenhower_matrix.html', context)
@@ -90,21 +120,22 @@ def matrix_view(request):
 @login_required
 @csrf_exempt
 def update_task(request, task_id):
-    """Обновление задачи (редактирование названия, описания и оценки Pomodoro)"""
+    """
+    Обновление задачи (редактирование названия, описания и оценки Pomodoro).
+    ?version - версия задачи, которую видел клиент: если задачу успели изменить,
+    возвращается 409 с текущим состоянием. Записываются только изменившиеся поля.
+    """
     if request.method == 'POST':
         try:
-            print(f"Updating task {task_id} for user {request.user}")  # Отладка
-
             # Получаем задачу
             task = Task.objects.get(id=task_id, user=request.user)
+            expected_version = parse_version(request.POST.get('version'))
 
             # Получаем данные из POST запроса
             title = request.POST.get('title', '').strip()
-            description = request.POST.get('description', '').strip()
+            description = request.POST.get('description')
             estimated_pomodoros = request.POST.get('estimated_pomodoros', '').strip()
 
-            print(f"Update data: title='{title}', estimated='{estimated_pomodoros}'")  # Отладка
-
             # Валидация
             if not title:
                 return JsonResponse({
@@ -112,44 +143,51 @@ def update_task(request, task_id):
                     'error': 'Название задачи обязательно'
                 })
 
-            # Обновляем данные задачи
-            task.title = title
+            # Обновляем данные задачи, запоминая изменившиеся поля
+            changed = []
+            if task.title != title:
+                task.title = title
+                changed.append('title')
 
-            if description is not None:
-                task.description = description
+            # Описание меняем, только если клиент его прислал
+            if description is not None and task.description != description.strip():
+                task.description = description.strip()
+                changed.append('description')
 
             # Обновляем оценку Pomodoro если передана
-            if estimated_pomodoros and estimated_pomodoros.isdigit():
+            if estimated_pomodoros and estimated_pomodoros.isdigit() \
+                    and task.estimated_pomodoros != int(estimated_pomodoros):
                 task.estimated_pomodoros = int(estimated_pomodoros)
-                print(f"Setting estimated_pomodoros to: {task.estimated_pomodoros}")  # Отладка
+                changed.append('estimated_pomodoros')
 
-            task.updated_at = timezone.now()
-            task.save()
+            if changed:
+                save_task_fields(task, changed, expected_version)
+            elif expected_version is not None and expected_version != task.change_version:
+                # Менять нечего, но клиент видел устаревшую версию - покажем ему актуальную
+                raise TaskConflict(task.id)
 
-            print(f"Task updated successfully: {task.id} - {task.title} - Pomodoros: {task.estimated_pomodoros}")
+            logger.debug('Задача %s обновлена, поля: %s', task.id, changed)
 
             return JsonResponse({
                 'success': True,
                 'message': 'Задача обновлена',
-                'task': {
-                    'id': task.id,
-                    'title': task.title,
-                    'description': task.description,
-                    'estimated_pomodoros': task.estimated_pomodoros,
-                    'completed_pomodoros': task.completed_pomodoros
-                }
+                'task': task_state(task)
             })
 
+        except TaskConflict as conflict:
+            return conflict_response(conflict)
         except Task.DoesNotExist:
-            print(f"Task {task_id} not found for user {request.user}")  # Отладка
             return JsonResponse({
                 'success': False,
                 'error': 'Задача не найдена'
             })
+        except ValueError:
+            return JsonResponse({
+                'success': False,
+                'error': 'Неверная версия задачи'
+            })
         except Exception as e:
-            print(f"Error updating task: {e}")  # Отладка
-            import traceback
-            traceback.print_exc()  # Полный traceback
+            logger.exception('Ошибка обновления задачи %s', task_id)
             return JsonResponse({
                 'success': False,
                 'error': f'Ошибка обновления задачи: {str(e)}'
@@ -170,7 +208,7 @@ def delete_task(request, task_id):
             task = Task.objects.get(id=task_id, user=request.user)
             task.delete()
 
-            print(f"Task deleted: {task_id}")  # Для отладки
+            logger.debug('Задача %s удалена', task_id)
 
             return JsonResponse({'success': True})
 
@@ -180,7 +218,7 @@ def delete_task(request, task_id):
                 'error': 'Задача не найдена'
             })
         except Exception as e:
-            print(f"Error deleting task: {e}")  # Для отладки
+            logger.exception('Ошибка удаления задачи %s', task_id)
             return JsonResponse({
                 'success': False,
                 'error': str(e)
@@ -202,29 +240,33 @@ def reorder_tasks(request):
             data = json.loads(request.body)
             task_id = data.get('task_id')
             new_quadrant_id = data.get('new_quadrant_id')
-            new_order = data.get('new_order')
-
-            print(
-                f"Reorder request: task_id={task_id}, quadrant_id={new_quadrant_id}, order={new_order}")  # Для отладки
+            # Соседи задачи на новом месте; если их нет - задача встает в конец колонки
+            before_task_id = data.get('before_task_id')
+            after_task_id = data.get('after_task_id')
+            # Версия задачи, которую видел клиент (см. tasks/concurrency.py)
+            expected_version = parse_version(data.get('version'))
 
             task = Task.objects.get(id=task_id, user=request.user)
 
             # Если квадрант 0 - значит задача возвращается в нераспределенные
-            if new_quadrant_id == 0:
-                task.quadrant = None
-                task.display_order = 0
-            else:
-                quadrant = EisenhowerQuadrant.objects.get(id=new_quadrant_id)
-                task.quadrant = quadrant
-                task.display_order = new_order
+            quadrant_id = None
+            if new_quadrant_id:
+                quadrant = get_quadrant(new_quadrant_id)
+                if quadrant is None:
+                    raise EisenhowerQuadrant.DoesNotExist
+                quadrant_id = quadrant.id
 
-            task.save()
+            # Меняется только строка самой задачи (соседи - лишь при перенумерации)
+            move_task(task, quadrant_id, before_task_id, after_task_id, expected_version)
 
-            print(
-                f"Task reordered: {task.id} to quadrant {task.quadrant_id if task.quadrant else 'None'}")  # Для отладки
-
-            return JsonResponse({'success': True})
+            return JsonResponse({
+                'success': True,
+                'display_order': task.display_order,
+                'version': task.change_version
+            })
 
+        except TaskConflict as conflict:
+            return conflict_response(conflict)
         except Task.DoesNotExist:
             return JsonResponse({
                 'success': False,
@@ -236,7 +278,7 @@ def reorder_tasks(request):
                 'error': 'Квадрант не найден'
             })
         except Exception as e:
-            print(f"Error reordering task: {e}")  # Для отладки
+            logger.exception('Ошибка перемещения задачи')
             return JsonResponse({
                 'success': False,
                 'error': str(e)
@@ -245,4 +287,294 @@ def reorder_tasks(request):
     return JsonResponse({
         'success': False,
         'error': 'Неверный запрос'
+    })
+
+
+@login_required
+@csrf_exempt
+def reorder_tasks_batch(request):
+    """
+    Сохранение полного порядка задач в одном или нескольких квадрантах
+    (и в списке нераспределенных) за один запрос и одну транзакцию.
+    Сюда матрица отправляет накопленные перетаскивания.
+
+    Формат JSON: {"columns": [{"quadrant_id": 0, "tasks": [{"id": 5, "version": 12}, ...]},
+                              {"quadrant_id": 2, "tasks": [{"id": 7, "version": 9}, ...]}]}
+    quadrant_id = 0 означает список нераспределенных задач; version - версия
+    задачи, которую видел клиент. Колонка передается целиком. Если задачу
+    изменили в другой вкладке (или в колонке есть задачи, которых клиент не видел),
+    ответ 409 с их текущим состоянием, и порядок не меняется.
+    """
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+
+            columns, seen = [], set()
+            for column in data.get('columns') or []:
+                quadrant_id = int(column.get('quadrant_id') or 0) or None
+                tasks = []
+                for item in column.get('tasks') or []:
+                    task_id = int(item['id'])
+                    version = parse_version(item.get('version'))
+                    if version is None:
+                        raise ValueError('Не указана версия задачи')
+                    if task_id in seen:
+                        return JsonResponse({
+                            'success': False,
+                            'error': f'Задача {task_id} указана несколько раз'
+                        })
+                    seen.add(task_id)
+                    tasks.append((task_id, version))
+                columns.append((quadrant_id, tasks))
+
+            # Проверяем квадранты по кэшу, без запроса к базе
+            if any(quadrant_id and get_quadrant(quadrant_id) is None for quadrant_id, _ in columns):
+                raise EisenhowerQuadrant.DoesNotExist
+
+            version, changes = reorder_columns(request.user.id, columns)
+
+            return JsonResponse({
+                'success': True,
+                'updated': len(changes),
+                'tasks': [
+                    {'id': task_id, 'quadrant_id': quadrant_id, 'display_order': key, 'version': version}
+                    for task_id, (quadrant_id, key) in changes.items()
+                ]
+            })
+
+        except TasksConflict as conflict:
+            return tasks_conflict_response(conflict)
+        except EisenhowerQuadrant.DoesNotExist:
+            return JsonResponse({
+                'success': False,
+                'error': 'Квадрант не найден'
+            })
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return JsonResponse({
+                'success': False,
+                'error': 'Неверный формат данных'
+            })
+
+    return JsonResponse({
+        'success': False,
+        'error': 'Неверный запрос'
+    })
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=matrix_etag)
+def task_changes(request):
+    """
+    API: задачи, созданные, измененные или удаленные после версии ?since=N.
+    Запрос идет по индексу (user, change_version), поэтому его стоимость
+    зависит от числа изменений, а не от размера списка задач.
+    """
+    try:
+        since = int(request.GET.get('since', 0))
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Неверная версия'
+        })
+
+    # Версию читаем первой: задача и ее версия пишутся одной транзакцией,
+    # поэтому всё, что не старше этой версии, уже попадет в выборку ниже
+    version = getattr(request, 'matrix_version', None)
+    if version is None:
+        version = MatrixVersion.current(request.user.id)
+
+    tasks = Task.objects.filter(
+        user=request.user,
+        change_version__gt=since
+    ).order_by('change_version').values(
+        'id', 'title', 'description', 'quadrant_id', 'status', 'display_order',
+        'estimated_pomodoros', 'completed_pomodoros', 'change_version'
+    )
+
+    deleted = TaskTombstone.objects.filter(
+        user=request.user,
+        change_version__gt=since
+    ).values_list('task_id', flat=True)
+
+    return JsonResponse({
+        'success': True,
+        'version': version,
+        'tasks': list(tasks),
+        'deleted': list(deleted),
+    })
+
+
+@staff_member_required
+def matrix_cache_stats(request):
+    """API для администраторов: эффективность кэша фрагментов матрицы"""
+    return JsonResponse({'success': True, **fragment_cache_stats()})
+
+
+# Поля задачи в компактном JSON-списке (без описания)
+TASK_LIST_FIELDS = (
+    'id', 'title', 'quadrant_id', 'status', 'display_order', 'estimated_pomodoros',
+    'completed_pomodoros', 'due_date', 'completed_at', 'created_at', 'change_version',
+)
+TASK_LIST_MAX_LIMIT = 200
+
+
+def encode_task_cursor(column_index, task):
+    """Курсор - позиция последней выданной задачи: (колонка, display_order, created_at, id)"""
+    raw = json.dumps([column_index, task['display_order'], task['created_at'].isoformat(), task['id']])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_task_cursor(cursor):
+    column_index, display_order, created_at, task_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    return int(column_index), int(display_order), datetime.fromisoformat(created_at), int(task_id)
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=matrix_etag)
+def task_list(request):
+    """
+    API: список задач с постраничной выдачей по курсору (keyset), без OFFSET.
+
+    Параметры: ?status=active|completed|cancelled, ?quadrant=<id> (0 - нераспределенные),
+    ?limit=N, ?cursor=<next_cursor из предыдущего ответа>.
+    Завершенные и отмененные задачи выдаются вместе с архивными (tasks/archive.py).
+    Порядок тот же, что на матрице: нераспределенные, затем квадранты по приоритету,
+    внутри колонки - display_order, created_at, id. Каждая колонка читается
+    по индексу (user, status, quadrant, display_order, created_at).
+    """
+    status = request.GET.get('status', 'active')
+    if status not in dict(Task.STATUS_CHOICES):
+        return JsonResponse({
+            'success': False,
+            'error': 'Неверный статус'
+        })
+
+    quadrant = request.GET.get('quadrant')
+    if quadrant is None:
+        columns = all_columns()
+    elif quadrant == str(UNASSIGNED):
+        columns = [UNASSIGNED]
+    elif get_quadrant(quadrant) is not None:
+        columns = [int(quadrant)]
+    else:
+        return JsonResponse({
+            'success': False,
+            'error': 'Квадрант не найден'
+        })
+
+    try:
+        limit = min(max(int(request.GET.get('limit', 50)), 1), TASK_LIST_MAX_LIMIT)
+        cursor = request.GET.get('cursor')
+        start_index, after = 0, None
+        if cursor:
+            start_index, *after = decode_task_cursor(cursor)
+            # Отрицательный индекс Python принял бы как колонку с конца списка
+            if not 0 <= start_index < len(columns):
+                raise ValueError('Неверная колонка курсора')
+    except (ValueError, TypeError, binascii.Error):
+        return JsonResponse({
+            'success': False,
+            'error': 'Неверные параметры запроса'
+        })
+
+    rows, next_cursor = [], None
+    for column_index in range(start_index, len(columns)):
+        column = columns[column_index]
+        conditions = [Q(quadrant__isnull=True) if column == UNASSIGNED else Q(quadrant_id=column)]
+
+        # Продолжаем колонку курсора строго после последней выданной задачи
+        if after and column_index == start_index:
+            display_order, created_at, task_id = after
+            conditions.append(
+                Q(display_order__gt=display_order) |
+                Q(display_order=display_order, created_at__gt=created_at) |
+                Q(display_order=display_order, created_at=created_at, id__gt=task_id)
+            )
+
+        if status == 'active':
+            queryset = Task.objects.filter(*conditions, user=request.user, status=status).values(*TASK_LIST_FIELDS)
+        else:
+            # Завершенные и отмененные задачи могли уехать в архив - читаем обе таблицы
+            queryset = tasks_with_archive(request.user, TASK_LIST_FIELDS, *conditions, status=status)
+
+        page = list(queryset.order_by('display_order', 'created_at', 'id')[:limit - len(rows)])
+        rows.extend(page)
+
+        if len(rows) >= limit:
+            next_cursor = encode_task_cursor(column_index, rows[-1])
+            break
+
+    return JsonResponse({
+        'success': True,
+        'tasks': rows,
+        'next_cursor': next_cursor,
+    })
+
+
+@login_required
+@csrf_exempt
+def bulk_import_tasks(request):
+    """
+    API: массовый импорт задач из тела запроса (CSV или JSONL, ?format=csv|jsonl).
+    Тело читается построчно, не загружаясь в память целиком; ошибки строк
+    возвращаются в отчете и не прерывают импорт остальных.
+    """
+    if request.method == 'POST':
+        fmt = request.GET.get('format', 'csv')
+        if fmt not in IMPORT_FORMATS:
+            return JsonResponse({
+                'success': False,
+                'error': 'Неверный формат: ожидается csv или jsonl'
+            })
+
+        try:
+            lines = (line.decode('utf-8-sig') for line in request)
+            report = import_tasks(request.user, lines, fmt)
+        except UnicodeDecodeError:
+            return JsonResponse({
+                'success': False,
+                'error': 'Файл должен быть в кодировке UTF-8'
+            })
+        except csv.Error as e:
+            return JsonResponse({
+                'success': False,
+                'error': f'Ошибка разбора CSV: {e}'
+            })
+
+        return JsonResponse({'success': True, **report})
+
+    return JsonResponse({
+        'success': False,
+        'error': 'Неверный метод запроса'
+    })
+
+
+@login_required
+def task_search(request):
+    """API: поиск по заголовкам и описаниям задач пользователя (?q=..., слова ищутся по префиксу)"""
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), SEARCH_MAX_LIMIT)
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Неверные параметры запроса'
+        })
+
+    tasks = search_tasks(request.user, query, limit) if query else []
+
+    return JsonResponse({
+        'success': True,
+        'tasks': [
+            {
+                'id': task.id,
+                'title': task.title,
+                'description': task.description,
+                'quadrant_id': task.quadrant_id,
+                'status': task.status,
+            }
+            for task in tasks
+        ],
     })
\ No newline at end of file
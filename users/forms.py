@@ -1,4 +1,6 @@
 # users/forms.py
+from zoneinfo import available_timezones
+
 from django import forms # Импорт модуля форм Django - основа для создания всех форм
 from django.contrib.auth.models import User # Импорт стандартной модели пользователя Django
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm # Импорт встроенных форм аутентификации Django
@@ -161,11 +163,20 @@ class UserSettingsForm(forms.ModelForm):
     Форма настройки параметров Pomodoro таймера
     """
 
+    # Часовой пояс выбирается из списка, чтобы в базу не попало неизвестное имя
+    time_zone = forms.ChoiceField(
+        choices=[(name, name) for name in sorted(available_timezones())],
+        label='Часовой пояс',
+        help_text='По нему считаются сессии и статистика за день',
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+
     class Meta:
         # Используем кастомную модель UserSettings
         model = UserSettings
         # Все поля модели включаются в форму
-        fields = ['pomodoro_duration', 'short_break_duration', 'long_break_duration', 'pomodoros_before_long_break']
+        fields = ['pomodoro_duration', 'short_break_duration', 'long_break_duration', 'pomodoros_before_long_break',
+                  'time_zone']
 
         # Настройка виджетов для числовых полей
         widgets = {
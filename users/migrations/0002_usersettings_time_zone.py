@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:25
+
+import users.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usersettings',
+            name='time_zone',
+            field=models.CharField(default=users.models.default_time_zone, max_length=64, verbose_name='Часовой пояс'),
+        ),
+    ]
@@ -1,10 +1,26 @@
 # users/models.py
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import User  # Импортируем встроенную модель пользователя
 from django.db.models.signals import post_save  # Импортируем сигнал, который срабатывает после сохранения объекта
 from django.dispatch import receiver  # Импортируем декоратор для подключения к сигналам
 
 
+def default_time_zone():
+    """Часовой пояс новых пользователей - часовой пояс проекта (TIME_ZONE)"""
+    return settings.TIME_ZONE
+
+
+def get_time_zone(name):
+    """Объект часового пояса по имени; неизвестное имя - часовой пояс проекта"""
+    try:
+        return ZoneInfo(name)
+    except (ValueError, LookupError):
+        return ZoneInfo(settings.TIME_ZONE)
+
+
 # Создаем модель для хранения персональных настроек пользователя
 class UserSettings(models.Model):
     """
@@ -35,6 +51,10 @@ class UserSettings(models.Model):
     # default=4 - стандартное значение по методике Pomodoro
     pomodoros_before_long_break = models.PositiveIntegerField(default=4, verbose_name="Pomodoro до длинного перерыва")
 
+    # Часовой пояс пользователя (имя из базы IANA, например Europe/Moscow)
+    # По нему считается "сегодня" для сессий и статистики
+    time_zone = models.CharField(max_length=64, default=default_time_zone, verbose_name="Часовой пояс")
+
     # Класс Meta для дополнительных настроек модели
     class Meta:
         # Название модели в единственном числе для отображения в админке
@@ -48,6 +68,11 @@ class UserSettings(models.Model):
         # Возвращаем строку с именем пользователя для удобного отображения
         return f"Настройки для {self.user.username}"
 
+    @property
+    def tzinfo(self):
+        """Часовой пояс пользователя как объект tzinfo"""
+        return get_time_zone(self.time_zone)
+
 
 # Создаем функции-обработчики сигналов для автоматического создания настроек
 # @receiver - декоратор, который подключает функцию к сигналу